@@ -0,0 +1,34 @@
+"""
+   Compare the number of inputs per second that can be checked by running plumed in a subprocess and in this process
+
+   All the inputs in tdata/tests.json are checked with test_plumed using each backend.  The in-process backend needs the 
+   plumed python module and is skipped if the module is not available.
+
+   Usage: python benchmarks/backends.py [number of repeats]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import PlumedToHTML
+from PlumedToHTML.PlumedToHTML import manage_incomplete_inputs
+
+def run( backend, inputs, nrepeats ) :
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as scratch :
+         for n in range(nrepeats) :
+             for i, inpt in enumerate(inputs) :
+                 filename = os.path.join( scratch, "backend" + str(i) + ".dat" )
+                 with open( filename, "w" ) as f : f.write( inpt + "\n" )
+                 PlumedToHTML.test_plumed( "plumed", filename, printjson=True, jsondir=scratch + "/", rundir=".", artifacts=False, backend=backend )
+    return nrepeats*len(inputs) / ( time.perf_counter() - start )
+
+if __name__ == "__main__" :
+    nrepeats = int(sys.argv[1]) if len(sys.argv)>1 else 3
+    with open("tdata/tests.json") as f : tests = json.load(f)
+    inputs = [ manage_incomplete_inputs( item["input"] )[0] for item in tests["regtests"] ]
+    backends = [ ("subprocess", PlumedToHTML.SubprocessBackend()) ]
+    try : backends.append( ("plumed module", PlumedToHTML.PlumedModuleBackend()) )
+    except ImportError : print("plumed python module is not available so the in-process backend is not tested")
+    for name, backend in backends : print( "%s: %.1f inputs per second" % ( name, run( backend, inputs, nrepeats ) ) )
@@ -0,0 +1,144 @@
+"""
+   Generators for the synthetic inputs that are used in the benchmarks
+
+   Each generator makes an input that stresses one part of PlumedToHTML.  The syntax dictionary that is returned by
+   make_syntax contains all the actions that are used in the inputs so the benchmarks do not need a PLUMED installation.
+"""
+import os
+import sys
+import stat
+import json
+
+def make_syntax() :
+    """
+       Create a syntax dictionary with the actions that are used in the synthetic inputs
+    """
+    keyword_dict = { "groups": {}, "cltools": {}, "vimlink": "https://www.plumed.org/vim", "replicalink": "https://www.plumed.org/replicas" }
+    actions = [ ("DISTANCE", ["ATOMS", "COMPONENTS"]), ("PRINT", ["ARG", "FILE", "STRIDE"]), ("RESTRAINT", ["ARG", "AT", "KAPPA", "SLOPE"]),
+                ("BIASVALUE", ["ARG"]), ("INCLUDE", ["FILE"]), ("LOAD", ["FILE"]), ("COORDINATION", ["GROUPA", "GROUPB", "SWITCH"]), ("TORSION", ["ATOMS"]) ]
+    for action, keys in actions :
+        syntax = { "output": { "value": { "flag": "default", "description": "the value", "type": "scalar" } } }
+        for key in keys : syntax[key] = { "description": "The " + key.lower() + ". More details", "multiple": 0, "actionlink": "none" }
+        syntax["LABEL"] = { "description": "a label for the action so that its output can be referenced", "multiple": 0, "actionlink": "none" }
+        keyword_dict[action] = { "description": "The " + action + " action.", "hyperlink": "https://www.plumed.org/doc/" + action, "syntax": syntax }
+    return keyword_dict
+
+def continuation( nlines ) :
+    """
+       An input with one action whose keywords are spread over nlines lines of a continuation block
+    """
+    lines = [ "c1: COORDINATION ..." ] + [ "   GROUPA=" + str(i+1) + " # the first group " + str(i) for i in range(nlines) ] + [ "   GROUPB=1-100 SWITCH={RATIONAL R_0=0.1}", "..." ]
+    return "\n".join(lines) + "\nPRINT ARG=c1 FILE=colvar\n"
+
+def nested_shortcuts( depth, width ) :
+    """
+       An input with one shortcut that is expanded into width shortcuts that are expanded in the same way depth times
+
+       The input and the dictionary of expansions in the format that is output by plumed driver --shortcut-ofile are returned.
+    """
+    def expand( label, level ) :
+        children = [ label + "_" + str(i) for i in range(width) ]
+        if level==depth :
+           return { "expansion": "\n".join( child + ": BIASVALUE ARG=d1" for child in children ) + "\n" }
+        data = { "expansion": "\n".join( child + ": RESTRAINT ARG=d1 AT=0.1 KAPPA=10" for child in children ) + "\n", "defaults": "SLOPE=0.0" }
+        for child in children : data[child] = expand( child, level + 1 )
+        return data
+    inpt = "d1: DISTANCE ATOMS=1,2\nr: RESTRAINT ARG=d1 AT=0.1 KAPPA=10\n"
+    return inpt, { "r": expand( "r", 1 ) }
+
+def shortcut_chain( depth ) :
+    """
+       An input with one shortcut that is expanded into a shortcut that is expanded in the same way depth times
+
+       The input and the dictionary of expansions in the format that is output by plumed driver --shortcut-ofile are returned.  The
+       dictionary is built from the bottom up so chains that are deeper than the recursion limit can be made.
+    """
+    data = { "expansion": "c" + str(depth) + ": BIASVALUE ARG=d1\n" }
+    for level in range(depth-1, 0, -1) :
+        child = "c" + str(level+1)
+        data = { "expansion": child + ": RESTRAINT ARG=d1 AT=0.1 KAPPA=10\nPRINT ARG=" + child + ".bias FILE=colvar\n", "defaults": "SLOPE=0.0", child: data }
+    return "d1: DISTANCE ATOMS=1,2\nc1: RESTRAINT ARG=d1 AT=0.1 KAPPA=10\n", { "c1": data }
+
+def labels( nlabels ) :
+    """
+       An input with nlabels labels that are used in PRINT actions with 100 labels in each ARG
+    """
+    lines = [ "d" + str(i) + ": DISTANCE ATOMS=" + str(i+1) + "," + str(i+2) for i in range(nlabels) ]
+    for i in range(0, nlabels, 100) :
+        lines.append( "PRINT ARG=" + ",".join( "d" + str(j) for j in range(i, min(i+100,nlabels)) ) + " FILE=colvar" + str(i) )
+    return "\n".join(lines) + "\n"
+
+def include_tree( depth, width ) :
+    """
+       An input that includes width files that each include width files until depth levels of files have been included
+
+       The input and a dictionary with the names and contents of all the files that are included are returned.
+    """
+    files = {}
+    def make( name, level ) :
+        lines = [ name.replace(".","_") + "_d" + str(i) + ": DISTANCE ATOMS=" + str(i+1) + "," + str(i+2) for i in range(5) ]
+        if level<depth :
+           for i in range(width) :
+               child = name.rsplit(".",1)[0] + "_" + str(i) + ".inc"
+               make( child, level + 1 )
+               lines.append( "INCLUDE FILE=" + child )
+        files[name] = "\n".join(lines) + "\n"
+    make( "tree.inc", 1 )
+    return "INCLUDE FILE=tree.inc\nd1: DISTANCE ATOMS=1,2\n", files
+
+def braces( nterms ) :
+    """
+       An input with a SWITCH keyword whose value in braces contains nterms terms
+    """
+    terms = " ".join( "A" + str(i) + "=" + str(i) for i in range(nterms) )
+    return "c1: COORDINATION GROUPA=1-10 GROUPB=11-20 SWITCH={CUSTOM FUNC=1/(1+x^6) R_0=0.3 " + terms + "}\nPRINT ARG=c1 FILE=colvar\n"
+
+def long_line( nflags ) :
+    """
+       An input with one action that has nflags flags on a single line.  The regular expressions in PlumedLexer backtrack a lot on lines like this
+    """
+    return "d1: DISTANCE ATOMS=1,2 " + " ".join( "COMPONENTS" for i in range(nflags) ) + "\nPRINT ARG=d1 FILE=colvar\n"
+
+def markdown( nblocks ) :
+    """
+       A markdown page with nblocks PLUMED inputs separated by paragraphs of text
+    """
+    parts = [ "# Benchmark lesson\n\n" ]
+    for i in range(nblocks) :
+        parts.append( "Some text that describes input " + str(i) + ".\n\n```plumed\n" )
+        parts.append( "d" + str(i) + ": DISTANCE ATOMS=1,2\nr" + str(i) + ": RESTRAINT ARG=d" + str(i) + " AT=0.1 KAPPA=10\nPRINT ARG=d" + str(i) + " FILE=colvar\n```\n\n" )
+    return "".join(parts)
+
+# The stub executible reads the input and writes a value dictionary with the labels in it.  Inputs that contain BROKEN fail
+STUB = """#!{python}
+import re, sys, json
+args = sys.argv[1:]
+if args[:1]==["--no-mpi"] : args = args[1:]
+def option( name ) : return args[args.index(name)+1] if name in args else None
+if args[:2]==["info", "--root"] : print({root!r})
+elif args[:2]==["info", "--version"] : print("stub")
+elif args[:1]==["driver"] :
+   with open( option("--plumed") ) as f : inpt = f.read()
+   values = {{}}
+   for label, action in re.findall( r"^\\s*(\\w+):\\s+(\\w+)", inpt, re.MULTILINE ) :
+       values[label] = {{ "action": action, label: {{ "type": "scalar", "description": "the value of " + label }} }}
+   if option("--shortcut-ofile") :
+      with open( option("--shortcut-ofile"), "w" ) as f : json.dump( {{}}, f )
+   if option("--valuedict-ofile") :
+      with open( option("--valuedict-ofile"), "w" ) as f : json.dump( values, f )
+   sys.exit( 1 if "BROKEN" in inpt else 0 )
+elif args[:1]==["show_graph"] :
+   with open( option("--out"), "w" ) as f : f.write("flowchart TB\\n")
+else : sys.exit(2)
+"""
+
+def make_stub( directory ) :
+    """
+       Write a stub plumed executible and its syntax.json file to directory.  The directory should be put at the start of PATH
+    """
+    os.makedirs( os.path.join( directory, "json" ), exist_ok=True )
+    with open( os.path.join( directory, "json", "syntax.json" ), "w" ) as f : json.dump( make_syntax(), f )
+    exe = os.path.join( directory, "plumed" )
+    with open( exe, "w" ) as f : f.write( STUB.format( python=sys.executable, root=directory ) )
+    os.chmod( exe, os.stat( exe ).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH )
+    return exe
@@ -0,0 +1,65 @@
+"""
+   Time the lookup of the descriptions of numbered keywords in PlumedFormatter
+
+   A syntax dictionary with one action that has many keywords that can be numbered is created so plumed is not needed.  
+   The time taken to look up the keywords with the KeywordIndex is compared with the time taken by scanning all the 
+   keywords of the action, which is what the formatter did before the index was introduced.
+
+   Usage: python benchmarks/keyword_lookup.py [number of keywords] [number of lookups]
+"""
+import sys
+import time
+from io import StringIO
+from PlumedToHTML.PlumedLexer import PlumedLexer
+from PlumedToHTML.PlumedFormatter import PlumedFormatter, KeywordIndex
+
+def make_dictionary( nkeys ) :
+    syntax = { "output": {} }
+    for i in range(nkeys) : syntax["KEY" + chr(65 + i%26) * (1 + i//26)] = { "description": "A keyword that can be numbered. More details.", "multiple": 1 }
+    return { "BIGACTION": { "description": "An action with many keywords.", "hyperlink": "https://www.plumed.org", "syntax": syntax }, "groups": {} }
+
+def scan( keyword_dict, action, value ) :
+    """
+       Find the description of a keyword by looking at all the keywords of the action
+    """
+    mykey = value.strip().upper()
+    if mykey in keyword_dict[action]["syntax"] : return keyword_dict[action]["syntax"][mykey]["description"].split('.')[0]
+    desc = None
+    for kkkk in keyword_dict[action]["syntax"] :
+        if kkkk=="output" or keyword_dict[action]["syntax"][kkkk]["multiple"]==0 : continue
+        if kkkk in value.strip() : desc = keyword_dict[action]["syntax"][kkkk.upper()]["description"].split('.')[0]
+    return desc
+
+if __name__ == "__main__" :
+    nkeys = int(sys.argv[1]) if len(sys.argv)>1 else 500
+    nlookups = int(sys.argv[2]) if len(sys.argv)>2 else 20000
+    keyword_dict = make_dictionary( nkeys )
+    keys = [ key for key in keyword_dict["BIGACTION"]["syntax"] if key!="output" ]
+    values = [ keys[i%len(keys)] + str(i%50) for i in range(nlookups) ]
+
+    start = time.perf_counter()
+    for value in values : scan( keyword_dict, "BIGACTION", value )
+    scantime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = KeywordIndex( keyword_dict )
+    buildtime = time.perf_counter() - start
+    start = time.perf_counter()
+    for value in values : index.lookup( "BIGACTION", value )
+    indextime = time.perf_counter() - start
+
+    # Now time the formatter on an input that uses all the numbered keywords
+    inpt, line = "", []
+    for i, value in enumerate(values[:2000]) :
+        line.append( value + "=1" )
+        if len(line)==20 : 
+           inpt, line = inpt + "b" + str(i) + ": BIGACTION " + " ".join(line) + "\n", []
+    tokens = list( PlumedLexer().get_tokens( inpt ) )
+    start = time.perf_counter()
+    PlumedFormatter( keyword_dict=keyword_dict, input_name="bench", hasload=False, broken=False, actions=set({}), valuedict={}, auxinputs=[], auxinputlines=[], checkaction="" ).format( tokens, StringIO() )
+    formattime = time.perf_counter() - start
+
+    print( "keywords:", nkeys, "lookups:", nlookups )
+    print( "linear scan: %.4f s" % scantime )
+    print( "index build: %.4f s lookups: %.4f s" % ( buildtime, indextime ) )
+    print( "formatter with index on 2000 keywords: %.4f s" % formattime )
@@ -0,0 +1,40 @@
+"""
+   Time PlumedFormatter on inputs with many labels that are used in long ARG lists
+
+   A syntax dictionary with the actions that are needed is created so plumed is not needed.  The input has nlabels DISTANCE 
+   actions and PRINT actions that each have an ARG list with 100 labels.  The time per label should not grow with the number of labels.
+
+   Usage: python benchmarks/labels.py [number of labels]
+"""
+import sys
+import time
+from io import StringIO
+from PlumedToHTML.PlumedLexer import PlumedLexer
+from PlumedToHTML.PlumedFormatter import PlumedFormatter
+
+def make_dictionary() :
+    keyword_dict = { "groups": {} }
+    for action, keys in [ ("DISTANCE", ["ATOMS"]), ("PRINT", ["ARG", "FILE"]) ] :
+        syntax = { "output": { "value": { "flag": "default", "description": "the value" } } }
+        for key in keys : syntax[key] = { "description": "The " + key.lower() + ". More details", "multiple": 0 }
+        keyword_dict[action] = { "description": "The " + action + " action.", "hyperlink": "https://www.plumed.org", "syntax": syntax }
+    return keyword_dict
+
+def make_input( nlabels ) :
+    lines = [ "d" + str(i) + ": DISTANCE ATOMS=" + str(i+1) + "," + str(i+2) for i in range(nlabels) ]
+    for i in range(0, nlabels, 100) :
+        lines.append( "PRINT ARG=" + ",".join( "d" + str(j) for j in range(i, min(i+100,nlabels)) ) + " FILE=colvar" + str(i) )
+    return "\n".join(lines) + "\n"
+
+def run( keyword_dict, nlabels ) :
+    tokens = list( PlumedLexer().get_tokens( make_input( nlabels ) ) )
+    start = time.perf_counter()
+    PlumedFormatter( keyword_dict=keyword_dict, input_name="bench", hasload=False, broken=False, actions=set({}), valuedict={}, auxinputs=[], auxinputlines=[], checkaction="" ).format( tokens, StringIO() )
+    return time.perf_counter() - start
+
+if __name__ == "__main__" :
+    nlabels = int(sys.argv[1]) if len(sys.argv)>1 else 10000
+    keyword_dict = make_dictionary()
+    for n in [ nlabels // 10, nlabels ] :
+        elapsed = min( run( keyword_dict, n ) for i in range(3) )
+        print( "labels: %d time: %.3f s time per label: %.2f us" % ( n, elapsed, 1e6*elapsed/n ) )
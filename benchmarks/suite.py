@@ -0,0 +1,126 @@
+"""
+   Time the import of the package and the lexers, the formatter, the expansion of shortcuts, the validation in get_html and processMarkdownString on large synthetic inputs
+
+   The inputs are made by the generators in benchmarks/generators.py.  A stub plumed executible is created and put at the start of
+   PATH so the suite runs without a PLUMED installation.  The best time from a number of repeats for each benchmark is output as
+   JSON.  If the results from an earlier run are passed with --compare the ratio of the new and old time for each benchmark is shown.
+
+   Usage: python benchmarks/suite.py [--scale N] [--repeats N] [--output results.json] [--compare old.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from io import StringIO
+import generators
+
+def best( repeats, func, *args ) :
+    times = []
+    for i in range(repeats) :
+        start = time.perf_counter()
+        func( *args )
+        times.append( time.perf_counter() - start )
+    return min( times )
+
+def import_time( repeats ) :
+    """
+       Get the time taken to import PlumedToHTML in a new interpreter from the output of python -X importtime
+    """
+    times = []
+    for i in range(repeats) :
+        stderr = subprocess.run( [sys.executable, "-X", "importtime", "-c", "import PlumedToHTML"], capture_output=True, text=True, check=True ).stderr
+        for line in stderr.splitlines() :
+            fields = line.split("|")
+            if len(fields)==3 and fields[2].strip()=="PlumedToHTML" : times.append( int(fields[1]) / 1e6 )
+    return min( times )
+
+def make_cases( scale, directory ) :
+    """
+       Get the inputs for the lexer and formatter benchmarks with all the shortcuts and included files resolved
+    """
+    from PlumedToHTML.PlumedToHTML import resolve_expansions, resolve_includes
+    inpt, shortcuts = generators.nested_shortcuts( 4, 4 + scale )
+    cases = { "continuation": generators.continuation( 2000*scale ), "shortcuts": resolve_expansions( inpt, shortcuts ), "labels": generators.labels( 5000*scale ), "braces": generators.braces( 5000*scale ),
+              "long_line": generators.long_line( 2000*scale ) }
+    inpt, files = generators.include_tree( 4, 3 + scale )
+    for name, content in files.items() :
+        with open( os.path.join( directory, name ), "w" ) as f : f.write( content )
+    cases["includes"] = resolve_includes( directory, inpt, 1, True )[1]
+    return cases
+
+def run_get_html( inpt, shortcuts, validate, directory, delegated=False ) :
+    import PlumedToHTML
+    name = os.path.join( directory, "bench" )
+    # The json files are deleted by get_html so they are written again every time
+    with open( name + ".json", "w" ) as f : json.dump( shortcuts, f )
+    PlumedToHTML.get_html( inpt, name, "bench", ("master",), (False,), ("plumed",), usejson=True, validate=validate, delegated=delegated )
+
+def run_markdown( markdown, directory, max_workers ) :
+    import PlumedToHTML
+    PlumedToHTML.processMarkdownString( markdown, os.path.join( directory, "bench.md" ), ("plumed",), ("master",), set({}), StringIO(), max_workers=max_workers )
+
+def run_suite( scale, repeats, directory ) :
+    from PlumedToHTML.PlumedLexer import PlumedLexer
+    from PlumedToHTML.PlumedTokenizer import PlumedTokenizer
+    from PlumedToHTML.PlumedFormatter import PlumedFormatter
+    results, syntax = {}, generators.make_syntax()
+    # Importing the package in a new interpreter as the build hooks that process one markdown file each do
+    results["import/PlumedToHTML"] = import_time( repeats )
+    # Tokenising and formatting each input
+    for name, inpt in make_cases( scale, directory ).items() :
+        results["lexer/" + name] = best( repeats, lambda : list( PlumedLexer().get_tokens( inpt ) ) )
+        results["lexer/linear/" + name] = best( repeats, lambda : list( PlumedTokenizer().get_tokens( inpt ) ) )
+        tokens = list( PlumedLexer().get_tokens( inpt ) )
+        def format_tokens() :
+            formatter = PlumedFormatter( keyword_dict=syntax, input_name="bench", hasload=False, broken=False, actions=set({}), valuedict={}, auxinputs=[], auxinputlines=[], checkaction="" )
+            formatter.format( tokens, StringIO() )
+        results["formatter/" + name] = best( repeats, format_tokens )
+    # Expanding wide and deep trees of shortcuts with and without the limits on the expansion
+    from PlumedToHTML.PlumedToHTML import resolve_expansions
+    for name, ( inpt, shortcuts ) in [ ("nested", generators.nested_shortcuts( 4, 4 + scale )), ("chain", generators.shortcut_chain( 2000*scale )) ] :
+        results["expansion/" + name] = best( repeats, resolve_expansions, inpt, shortcuts )
+        results["expansion/" + name + "/maxdepth=3"] = best( repeats, lambda : resolve_expansions( inpt, shortcuts, maxdepth=3 ) )
+        results["expansion/" + name + "/maxsize=100000"] = best( repeats, lambda : resolve_expansions( inpt, shortcuts, maxsize=100000 ) )
+    # The whole of get_html on an input with nested shortcuts with each type of validation
+    inpt, shortcuts = generators.nested_shortcuts( 3, 4 + scale )
+    run_get_html( inpt, shortcuts, None, directory )
+    for validate in [None, "index", "full"] :
+        results["get_html/validate=" + str(validate)] = best( repeats, run_get_html, inpt, shortcuts, validate, directory )
+    results["get_html/delegated"] = best( repeats, run_get_html, inpt, shortcuts, "full", directory, True )
+    # Markdown with many inputs that are tested with the stub plumed
+    markdown = generators.markdown( 50*scale )
+    for max_workers in [1, 4] :
+        results["markdown/workers=" + str(max_workers)] = best( repeats, run_markdown, markdown, directory, max_workers )
+    return results
+
+def commit() :
+    try : return subprocess.run( ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) : return None
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser( description="Run the PlumedToHTML benchmark suite" )
+    parser.add_argument( "--scale", type=int, default=1, help="make all the inputs larger by this factor" )
+    parser.add_argument( "--repeats", type=int, default=3, help="the number of times to run each benchmark" )
+    parser.add_argument( "--output", default=None, help="the file to write the results to.  By default they are written to stdout" )
+    parser.add_argument( "--compare", default=None, help="a file containing the results of an earlier run to compare with" )
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory :
+         # The benchmarks are run in the scratch directory so the files that are output are removed at the end
+         generators.make_stub( os.path.join( directory, "stub" ) )
+         os.environ["PATH"] = os.path.join( directory, "stub" ) + os.pathsep + os.environ.get("PATH","")
+         olddir = os.getcwd()
+         os.chdir( directory )
+         try : results = run_suite( args.scale, args.repeats, directory )
+         finally : os.chdir( olddir )
+    output = { "commit": commit(), "python": platform.python_version(), "scale": args.scale, "repeats": args.repeats, "results": results }
+    if args.output is None : print( json.dumps( output, indent=2 ) )
+    else :
+       with open( args.output, "w" ) as f : json.dump( output, f, indent=2 )
+    if args.compare is not None :
+       with open( args.compare ) as f : old = json.load( f )["results"]
+       for key, value in results.items() :
+           if key in old : print( "%-32s %9.4f s %9.4f s %6.2fx" % ( key, old[key], value, value / old[key] ), file=sys.stderr )
@@ -0,0 +1,39 @@
+"""
+   Compare the size of the html that is output with the classic tooltips and with the compact tooltips
+
+   In the compact mode each tooltip description is output once in a table rather than in every tooltip.  The sizes 
+   of the html for all the inputs in tdata/tests.json on one page and for a large input with many actions are printed.
+   plumed must be available to get the syntax.
+
+   Usage: python benchmarks/tooltips.py [number of actions in large input]
+"""
+import sys
+import json
+import time
+import PlumedToHTML
+
+def render( inputs, compact ) :
+    tooltips = {} if compact else None
+    start, html = time.perf_counter(), []
+    for n, inpt in enumerate(inputs) :
+        name = "tooltipbench" + str(n)
+        html.append( PlumedToHTML.get_html( inpt, name, name, ("master",), (False,), ("plumed",), usejson=False, tooltips=tooltips ) )
+    if compact : html.append( PlumedToHTML.get_tooltip_table( tooltips ) )
+    return len( "".join(html).encode() ), time.perf_counter() - start
+
+def make_input( nactions ) :
+    lines = []
+    for i in range(nactions) :
+        lines.append( "d" + str(i) + ": DISTANCE ATOMS=" + str(i+1) + "," + str(i+2) + " COMPONENTS" )
+        lines.append( "r" + str(i) + ": RESTRAINT ARG=d" + str(i) + ".x AT=0.1 KAPPA=10" )
+    lines.append( "PRINT ARG=" + ",".join( "d" + str(i) + ".x" for i in range(nactions) ) + " FILE=colvar STRIDE=10" )
+    return "\n".join(lines) + "\n"
+
+if __name__ == "__main__" :
+    nactions = int(sys.argv[1]) if len(sys.argv)>1 else 1000
+    with open("tdata/tests.json") as f : tests = json.load(f)
+    benchmarks = [ ("tdata/tests.json", [ item["input"] for item in tests["regtests"] ]), ("large input", [ make_input( nactions ) ]) ]
+    for name, inputs in benchmarks :
+        classic, tclassic = render( inputs, False )
+        compact, tcompact = render( inputs, True )
+        print( "%s: classic %d bytes (%.2f s) compact %d bytes (%.2f s) ratio %.2f" % ( name, classic, tclassic, compact, tcompact, compact / classic ) )
@@ -0,0 +1,43 @@
+"""
+   Compare the time taken to check the html for a large PLUMED input with shortcuts using the index based 
+   validation in the formatter and the full validation that parses the html
+
+   Usage: python benchmarks/validation.py [number of shortcuts]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import PlumedToHTML
+
+def make_input( n ) :
+    """
+       Create an input with n shortcuts and the dictionary of expansions that plumed would output for it
+    """
+    lines, shortcuts = [], {}
+    for i in range(n) :
+        lines.append( "d" + str(i) + ": DISTANCE ATOMS=" + str(i+1) + "," + str(i+2) )
+        lines.append( "r" + str(i) + ": RESTRAINT ARG=d" + str(i) + " AT=0.1 KAPPA=10" )
+        shortcuts["r" + str(i)] = { "expansion": "r" + str(i) + "_bias: BIASVALUE ARG=d" + str(i) + "\nPRINT ARG=r" + str(i) + "_bias FILE=colvar" }
+    return "\n".join(lines) + "\n", shortcuts
+
+def run( inpt, shortcuts, validate, directory ) :
+    name = os.path.join( directory, "bench" )
+    # The json file is deleted by get_html so it is written again every time
+    with open( name + ".json", "w" ) as f : json.dump( shortcuts, f )
+    start = time.perf_counter()
+    PlumedToHTML.get_html( inpt, name, "bench", ("master",), (False,), ("plumed",), usejson=True, validate=validate )
+    return time.perf_counter() - start
+
+if __name__ == "__main__" :
+    n = int(sys.argv[1]) if len(sys.argv)>1 else 1000
+    inpt, shortcuts = make_input( n )
+    with tempfile.TemporaryDirectory() as directory :
+         # Render once so the syntax, lexers and formatter are set up before we start timing
+         run( inpt, shortcuts, None, directory )
+         times = {}
+         for validate in [None, "index", "full"] : times[str(validate)] = min( run( inpt, shortcuts, validate, directory ) for i in range(3) )
+    print( "shortcuts:", n )
+    for key, value in times.items() : print( "validate=" + key, "%.3f s" % value )
+    print( "validation cost index: %.3f s full: %.3f s" % ( times["index"] - times["None"], times["full"] - times["None"] ) )
@@ -2,6 +2,7 @@ from pygments.styles import get_style_by_name
 from pygments.formatters import HtmlFormatter
 import os
 import json
+import concurrent.futures
 import PlumedToHTML
 
 # Output css file for codehighlighting
@@ -43,9 +44,11 @@ f = open("./tdata/tests.json")
 tests = json.load(f)
 f.close()
 
-for item in tests["regtests"] :
-    actions = set({})
-    out = PlumedToHTML.test_and_get_html( item["input"], "plinp" + str(item["index"]), actions=actions )
+# The inputs are tested by a pool of workers and the html is output in the order of the inputs
+with PlumedToHTML.WorkerPool() as pool, concurrent.futures.ThreadPoolExecutor( max_workers=pool.nworkers ) as executor :
+  futures = [ executor.submit( PlumedToHTML.test_and_get_html, item["input"], "plinp" + str(item["index"]), actions=set({}), test_plumed_kwargs={"backend": pool} ) for item in tests["regtests"] ]
+  for item, future in zip( tests["regtests"], futures ) :
+    out = future.result()
     
     print(f"<h3>Input number {item['index']}</h3>")
     #this visualizes the "from-to" and it is more clear to eye-check what is going on
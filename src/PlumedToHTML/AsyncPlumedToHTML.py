@@ -0,0 +1,237 @@
+import os
+import glob
+import signal
+import tempfile
+import functools
+import contextlib
+from .PlumedToHTML import SubprocessBackend, _setup_test, _open_captures, _restore_test, _remove_backups, _finish_test, _getDefaultRenderer
+
+class ProcessSlots :
+    """
+       A semaphore that limits the number of plumed processes that run at the same time
+
+       A test that is run with mpirun -np N uses N of the slots.  Tests that need more processes than there are slots are run
+       when all the slots are free.  The same object can be shared by any number of the coroutines in this module.
+
+       Keyword arguments:
+       nslots -- The number of processes that can run at the same time
+    """
+    def __init__( self, nslots=None ) :
+        if nslots is None : nslots = os.cpu_count() or 1
+        if nslots<1 : raise ValueError("number of slots must be at least one")
+        self.nslots = nslots
+        self.free = nslots
+        # The condition is created when it is first used so that it belongs to the event loop that is running
+        self._condition = None
+
+    def _getCondition( self ) :
+        import asyncio
+        if self._condition is None : self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire( self, n=1 ) :
+        """
+           Wait until n slots are free and take them.  The number of slots that were taken is returned
+        """
+        n, condition = min( n, self.nslots ), self._getCondition()
+        async with condition :
+             await condition.wait_for( lambda : self.free>=n )
+             self.free = self.free - n
+        return n
+
+    async def release( self, n=1 ) :
+        """
+           Give back n slots that were taken with acquire
+        """
+        condition = self._getCondition()
+        async with condition :
+             self.free = self.free + n
+             condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def hold( self, n=1 ) :
+        """
+           Hold n slots for the duration of an async with block
+        """
+        n = await self.acquire( n )
+        try :
+           yield n
+        finally :
+           await self.release( n )
+
+async def _in_thread( func, *args, **kwargs ) :
+    """
+       Run a blocking function in the default executor so that the event loop is not stalled
+    """
+    import asyncio
+    return await asyncio.get_running_loop().run_in_executor( None, functools.partial( func, *args, **kwargs ) )
+
+async def _pump( reader, capture ) :
+    """
+       Copy everything that is output on a stream to a capture until the stream is closed
+
+       The blocks are compressed and written to the archive in the default executor so that the event loop is not stalled
+    """
+    while True :
+       block = await reader.read( 65536 )
+       if not block : break
+       await _in_thread( capture.write, block )
+
+async def _run( cmd, stdout, stderr, cmdTimeout, cwd, captures=None ) :
+    """
+       Run a command and return its return code or -1 if the command does not finish within cmdTimeout seconds
+
+       If captures are given the stdout and stderr of the command are read as they are produced and written to the captures.  The command
+       is started in a new session so that the processes that it starts are also stopped when it takes too long (see SubprocessBackend.run)
+    """
+    import asyncio
+    if captures is not None : stdout, stderr = asyncio.subprocess.PIPE, asyncio.subprocess.PIPE
+    loop = asyncio.get_running_loop()
+    deadline = None if cmdTimeout is None else loop.time() + cmdTimeout
+    process = await asyncio.create_subprocess_exec( *cmd, stdout=stdout, stderr=stderr, cwd=cwd, start_new_session=True )
+    pumps = asyncio.ensure_future( asyncio.gather( _pump( process.stdout, captures[0] ), _pump( process.stderr, captures[1] ) ) ) if captures is not None else None
+    try :
+       returnCode = await asyncio.wait_for( process.wait(), cmdTimeout )
+       # Processes that were started by the command and that are still running keep the pipes open
+       if pumps is not None : await asyncio.wait_for( asyncio.shield( pumps ), None if deadline is None else max( 0, deadline - loop.time() ) )
+    except asyncio.TimeoutError :
+       _killGroup( process )
+       await process.wait()
+       returnCode = -1
+    except asyncio.CancelledError :
+       _killGroup( process )
+       if pumps is not None : pumps.cancel()
+       raise
+    if pumps is not None : await pumps
+    return returnCode
+
+def _killGroup( process ) :
+    """
+       Stop a command that was started in a new session and all the processes that it started
+    """
+    try : os.killpg( process.pid, signal.SIGKILL )
+    except ProcessLookupError : pass
+
+async def async_test_plumed( executible, filename, header="", printjson=False, jsondir="./", cmdTimeout:"None|float"=None, ghmarkdown=True, cache=None, rundir=None,
+        maxlines=1000, archive="zip", compresslevel=None, artifacts=True, backend=None, slots=None, artifactname=None ) :
+    """
+        Test if plumed can parse this input file without blocking the event loop (see test_plumed)
+
+        Keyword arguments:
+        executible   -- A string that contains the command for running plumed
+        filename     -- A string that contains the name of the plumed input file to parse
+        header       -- A string to put at the top of the error page that is output
+        printjson    -- Set true if you want to used plumed to print the files containing the expansions of shortcuts and the value dictionary
+        jsondir      -- The directory in which to output the files containing the expansions of the shortcuts and the value dictionaries
+        cmdTimeout   -- Set the timeout for the plumed test
+        cache        -- A ResultCache that is used to store the results of the test so that plumed is not run again on the same input
+        rundir       -- The directory in which plumed is run.  By default this is the directory that contains filename
+        maxlines     -- The number of lines of stderr to show in the markdown page
+        archive      -- How to store the raw stdout and stderr.  This can be zip, gzip or none (for uncompressed text files)
+        compresslevel -- The compression level to use for the zip or gzip archives
+        artifacts    -- Set false to only get the return code.  No files with the stdout and stderr are output
+        backend      -- The object that runs plumed.  Backends other than SubprocessBackend are run in the default executor
+        slots        -- A ProcessSlots object that limits the number of plumed processes that run at the same time
+        artifactname -- The name to use in place of filename for the files that contain the stdout and stderr
+    """
+    test = await _in_thread( _setup_test, executible, filename, printjson, jsondir, cache, rundir, maxlines, archive, compresslevel, artifacts, artifactname )
+    captures = _open_captures( test )
+    try :
+       if test["cached"] is not None : returnCode = await _in_thread( _restore_test, test, captures )
+       else :
+          if slots is None : slots = ProcessSlots( test["nprocs"] )
+          backups = set( glob.glob( os.path.join(test["run_folder"], "bck.*") ) )
+          async with slots.hold( test["nprocs"] ) :
+               if backend is None or isinstance( backend, SubprocessBackend ) : returnCode = await _run( test["cmd"], None, None, cmdTimeout, test["run_folder"], captures )
+               else : returnCode = await _in_thread( backend.run, test["cmd"], captures, cmdTimeout, test["run_folder"] )
+          _remove_backups( test["run_folder"], backups )
+    finally :
+       for capture in captures : capture.close()
+    await _in_thread( _finish_test, test, returnCode, captures, header, ghmarkdown, cache )
+    return returnCode
+
+async def async_get_mermaid( executible, inpt, force, *, slots=None, test_plumed_kwargs={} ) :
+    """
+       Generate the mermaid graph showing how data passes through PLUMED input file without blocking the event loop (see get_mermaid)
+
+       Keyword arguments:
+       inpt -- A string containing the PLUMED input
+       force -- Bool that if true ensures we show the graph for the backwards pass through the action list
+       slots -- A ProcessSlots object that limits the number of plumed processes that run at the same time
+       test_plumed_kwargs -- a dictionary of extra keywords to pass to the test_plumed utility, useful for passing an"header"
+    """
+    import asyncio
+    if slots is None : slots = ProcessSlots( 1 )
+    with tempfile.TemporaryDirectory() as scratch :
+         plumedfile, mermaidfile = os.path.join( scratch, "mermaid_plumed.dat" ), os.path.join( scratch, "mermaid.md" )
+         # Write the plumed input to a file
+         with open( plumedfile, "w+") as iff : iff.write(inpt+ "\n")
+         # Now check the input is OK
+         broken = await async_test_plumed( executible, plumedfile, rundir=".", slots=slots, **test_plumed_kwargs )
+         if broken!=0 : raise Exception("invalid plumed input file -- cannot create mermaid graph")
+         # Run mermaid
+         cmd = [executible, 'show_graph', '--plumed', plumedfile, '--out', mermaidfile]
+         if force : cmd.append("--force")
+         backend = test_plumed_kwargs.get("backend")
+         async with slots.hold( 1 ) :
+              if backend is None or isinstance( backend, SubprocessBackend ) : returnCode = await _run( cmd, asyncio.subprocess.DEVNULL, asyncio.subprocess.STDOUT, None, None )
+              else : returnCode = await _in_thread( backend.run, cmd, None )
+         if returnCode!=0 : raise Exception("error running plumed show_graph")
+         with open(mermaidfile) as mf : mermaid = mf.read()
+    return mermaid
+
+async def async_process_markdown_string( inp, filename, plumedexe, plumed_names, actions, ofile,
+        jsondir="./", ghmarkdown=True, checkaction="ignore", checkactionkeywords=set({}),
+        *,slots=None,test_plumed_kwargs={},compact_tooltips=False,delegated=False) :
+    """
+       Process a string of markdown that contains PLUMED input files without blocking the event loop (see processMarkdownString)
+
+       The tests for all the inputs are run at the same time.  The number of plumed processes that run at once is limited by slots.
+       The output is the same as the output from processMarkdownString.
+
+        Keyword arguments:
+        inp -- the string that contains the plumed input file
+        filename -- a name to use for the plumed inputs we create
+        plumedexe -- a tuple of plumed executible names for testing plumed.
+        plumed_names -- the names of the plumed executibles to use in the badges
+        actions -- names of actions used in the plumed inputs in this markdown file
+        ofile -- the file on which to output the processed markdown
+        jsondir -- The directory in which to output the files containing the expansions of the shortcuts and the value dictionaries
+        slots -- A ProcessSlots object that limits the number of plumed processes that run at the same time.  By default one slot per cpu is used
+        test_plumed_kwargs -- a dictionary of extra keywords to pass to the test_plumed utility, only "header" and "cmdTimeout" works
+        compact_tooltips -- Set true to output each tooltip description once in a table at the end of the markdown
+        delegated -- Set true to output data attributes instead of inline onclick handlers (see get_html)
+    """
+    import asyncio
+    if slots is None : slots = ProcessSlots()
+    renderer = await _in_thread( _getDefaultRenderer, plumedexe )
+    chunks, ninputs = await _in_thread( renderer._collect_markdown, inp, filename, jsondir )
+    # The tests and graphs are found by the same planner that is used by processMarkdownString
+    groups, mermaids = {}, {}
+    for block in chunks :
+        if isinstance( block, str ) : continue
+        if block["graph"] is not None : mermaids[block["index"]] = block["graph"]
+        for key in block["tests"] :
+            # Inputs that share a solution file only need to be tested once
+            if key not in groups.get( key[:2], [] ) : groups.setdefault( key[:2], [] ).append( key )
+
+    # Tests with the same executible and input write to the same output files so they are run one after the other
+    async def run_group( keys ) :
+        return { key: await async_test_plumed( key[0], key[1], slots=slots, printjson=key[2], jsondir=key[3], ghmarkdown=ghmarkdown, **test_plumed_kwargs ) for key in keys }
+    jobs = [ run_group( keys ) for keys in groups.values() ]
+    jobs += [ async_get_mermaid( job[0], job[1], job[2], slots=slots, test_plumed_kwargs=test_plumed_kwargs ) for job in mermaids.values() ]
+    tasks = [ asyncio.ensure_future( job ) for job in jobs ]
+    try :
+       done = await asyncio.gather( *tasks )
+    except BaseException :
+       # The jobs that are still running are stopped so they do not carry on running plumed and writing files after the error
+       for task in tasks : task.cancel()
+       await asyncio.gather( *tasks, return_exceptions=True )
+       raise
+    results = {}
+    for result in done[:len(groups)] : results.update( result )
+    graphs = dict( zip( mermaids.keys(), done[len(groups):] ) )
+
+    # Output everything in the order it appeared in the markdown
+    nfail = await _in_thread( renderer._write_markdown, chunks, results, graphs, plumed_names, actions, ofile, jsondir, ghmarkdown, checkaction, checkactionkeywords, compact_tooltips, delegated )
+    return ninputs, nfail
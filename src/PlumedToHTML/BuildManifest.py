@@ -0,0 +1,161 @@
+import os
+import re
+import glob
+import zlib
+import pickle
+import hashlib
+import tempfile
+import threading
+from .ResultCache import executibleIdentity, _readFiles
+from .PlumedToHTML import _getPlumedRoot
+
+class BuildManifest :
+    """
+       A record of the output for each of the PLUMED inputs in a set of markdown files that is used to rebuild the files incrementally
+
+       Each entry in the manifest is stored under a hash of the name of the markdown file, the position of the input in the file, the
+       contents of the input and its solution file, the contents of any files that the input reads, the identities of the plumed
+       executibles, the contents of the syntax.json file, the source of this package and the options that were used to process the
+       markdown.  The entry holds the html that was output for the input, the number of failed tests, the actions and keywords that
+       the input used, the tooltip descriptions and the files containing the stdout and stderr of the tests.  When processMarkdown
+       finds an entry for an input the html is copied from the manifest and the files are recreated so neither plumed nor the
+       formatter are run.
+
+       Entries for inputs that are no longer in a markdown file are removed once the file has been processed.  Entries for markdown
+       files that are no longer part of the site are removed with prune.  The manifest is saved when it is used in a with
+       statement.  Inputs whose html is stored in the manifest have their own modals for the files that they read.
+
+       Keyword arguments:
+       path -- The file in which the manifest is stored.  The entries in this file are read in if it exists
+    """
+    # Increase this if the information that is stored in the entries changes
+    version = 1
+
+    def __init__( self, path ) :
+        self.path = path
+        self.entries = {}
+        self.hits, self.misses, self.removed = 0, 0, 0
+        # The keys of the entries that have been used for each markdown file since the manifest was loaded
+        self._used = {}
+        self._syntax = {}
+        self._lock = threading.Lock()
+        try :
+           with open( path, "rb" ) as f : data = pickle.loads( zlib.decompress( f.read() ) )
+           if data["version"]==BuildManifest.version : self.entries = data["entries"]
+        except (OSError, EOFError, KeyError, TypeError, ValueError, zlib.error, pickle.UnpicklingError) :
+           self.entries = {}
+        # Any change to this package can change the html
+        sha = hashlib.sha256()
+        srcdir = os.path.dirname( os.path.abspath(__file__) )
+        for srcfile in sorted( glob.glob( os.path.join( srcdir, "*.py" ) ) + glob.glob( os.path.join( srcdir, "assets", "*" ) ) ) :
+            with open( srcfile, "rb" ) as f : sha.update( f.read() + b"\0" )
+        self.source = sha.hexdigest()
+
+    def syntax_identity( self, executible ) :
+        """
+           Get the hash of the syntax.json file for a plumed executible.  The file is only read again if it is modified
+        """
+        keyfile = _getPlumedRoot( executible ) + "/json/syntax.json"
+        try :
+           fstat = os.stat( keyfile )
+           stamp = (keyfile, fstat.st_mtime_ns, fstat.st_size)
+        except OSError : return ""
+        with self._lock :
+             if stamp in self._syntax : return self._syntax[stamp]
+        with open( keyfile, "rb" ) as f : identity = hashlib.sha256( f.read() ).hexdigest()
+        with self._lock : self._syntax[stamp] = identity
+        return identity
+
+    def key( self, filename, block, plumedexe, options ) :
+        """
+           Get the key for the entry for a PLUMED input from a markdown file
+
+           Keyword arguments:
+           filename -- The name of the markdown file
+           block -- The dictionary that describes the input (see Renderer._iter_markdown)
+           plumedexe -- The plumed executibles that are used to test the input
+           options -- A string that contains all the other options that change the output for the input
+        """
+        sha = hashlib.sha256()
+        items = [ os.path.normpath( filename ), str(block["index"]), block["input"], block["mermaid"], str(block["incomplete"]), block["solutionfile"], options, self.source ]
+        items += [ executibleIdentity( exe ) for exe in plumedexe ] + [ self.syntax_identity( plumedexe[-1] ) ]
+        for item in items : sha.update( item.encode() + b"\0" )
+        # The solution file and the files that it reads
+        if os.path.isfile( block["solutionfile"] ) :
+           with open( block["solutionfile"], "rb" ) as f : sha.update( f.read() + b"\0" )
+           nreplicas = re.search( r"#SETTINGS.*NREPLICAS=(\d+)", block["input"] )
+           for name, content in _readFiles( os.path.dirname( block["solutionfile"] ), block["solutionfile"], int(nreplicas.group(1)) if nreplicas else 1, set() ) :
+               sha.update( name.encode() + b"\0" + content + b"\0" )
+        return sha.hexdigest()
+
+    def _use( self, filename, key ) :
+        with self._lock : self._used.setdefault( os.path.normpath( filename ), set() ).add( key )
+
+    def get( self, filename, key ) :
+        """
+           Get the entry for key from the markdown file filename or None if there is no entry for this key
+        """
+        self._use( filename, key )
+        with self._lock :
+             entry = self.entries.get( key )
+             if entry is None : self.misses = self.misses + 1
+             else : self.hits = self.hits + 1
+        return entry
+
+    def put( self, filename, key, entry ) :
+        """
+           Store the entry for key from the markdown file filename
+
+           Keyword arguments:
+           filename -- The name of the markdown file
+           key -- The key that was returned by the key method
+           entry -- A dictionary containing the html, the failures, the actions, the keywords, the tooltips and the files output by the tests
+        """
+        self._use( filename, key )
+        entry["file"] = os.path.normpath( filename )
+        with self._lock : self.entries[key] = entry
+
+    def collect( self, filename ) :
+        """
+           Remove the entries for the inputs from the markdown file filename that have not been used since the manifest was loaded
+        """
+        filename = os.path.normpath( filename )
+        with self._lock :
+             used = self._used.get( filename, set() )
+             stale = [ key for key, entry in self.entries.items() if entry["file"]==filename and key not in used ]
+             for key in stale : del self.entries[key]
+             self.removed = self.removed + len(stale)
+
+    def prune( self, filenames ) :
+        """
+           Remove the entries for the inputs from all the markdown files that are not in filenames
+        """
+        filenames = set( os.path.normpath( filename ) for filename in filenames )
+        with self._lock :
+             stale = [ key for key, entry in self.entries.items() if entry["file"] not in filenames ]
+             for key in stale : del self.entries[key]
+             self.removed = self.removed + len(stale)
+
+    def save( self ) :
+        """
+           Write the manifest to its file
+        """
+        with self._lock :
+             data = zlib.compress( pickle.dumps( { "version": BuildManifest.version, "entries": self.entries }, protocol=pickle.HIGHEST_PROTOCOL ) )
+        # Write to a tempory file and rename so that the manifest is never left half written
+        fd, tmpname = tempfile.mkstemp( dir=os.path.dirname( os.path.abspath( self.path ) ), suffix=".tmp" )
+        with os.fdopen( fd, "wb" ) as f : f.write( data )
+        os.replace( tmpname, self.path )
+
+    def stats( self ) :
+        """
+           Get a dictionary that contains the number of hits, misses and removed entries and the number of entries in the manifest
+        """
+        with self._lock :
+             return { "hits": self.hits, "misses": self.misses, "removed": self.removed, "entries": len(self.entries) }
+
+    def __enter__( self ) :
+        return self
+
+    def __exit__( self, *args ) :
+        self.save()
@@ -0,0 +1,141 @@
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import concurrent.futures
+from .PlumedToHTML import test_plumed, processMarkdown, PhaseTimer, SubprocessBackend, _getDefaultRenderer
+from .WorkerPool import WorkerPool
+
+class _TimedBackend :
+    """
+       A backend that adds the time spent running plumed to a PhaseTimer and then runs the command with another backend
+
+       This is only used when plumed is run in this process or in a subprocess.  A WorkerPool adds the times to the timer itself so the time
+       that is spent waiting for a free worker is not counted as time spent running plumed.
+    """
+    def __init__( self, backend, timer ) :
+        self.backend, self.timer = backend, timer
+
+    def run( self, cmd, captures, cmdTimeout=None, cwd=None ) :
+        with self.timer.measure( "plumed" ) : return self.backend.run( cmd, captures, cmdTimeout, cwd )
+
+def findInputs( paths ) :
+    """
+       Get the markdown files and PLUMED input files in a list of files and directories
+
+       Directories are searched recursively for files that end in .md or .dat.  The files for the inputs in markdown files that
+       are created by processMarkdown and the files with the output from plumed that are created by test_plumed are ignored so 
+       the same directory can be processed again.
+
+       Keyword arguments:
+       paths -- A list containing the names of files and directories
+    """
+    inputs = []
+    for path in paths :
+        if not os.path.isdir( path ) :
+           inputs.append( path )
+           continue
+        for dirpath, dirnames, filenames in os.walk( path ) :
+            dirnames.sort()
+            for fname in sorted( filenames ) :
+                if re.search( r"(\.md_working_[0-9]+\.dat|\.stderr\.md|\.(stdout|stderr)\.txt(\.zip|\.gz)?)$", fname ) : continue
+                if fname.endswith(".md") or fname.endswith(".dat") : inputs.append( os.path.join( dirpath, fname ) )
+    return inputs
+
+def processInput( filename, plumedexe, plumed_names, ghmarkdown, test_plumed_kwargs, delegated=False ) :
+    """
+       Test and render a PLUMED input file or all the PLUMED inputs in a markdown file and return the number of failures for each executible
+
+       Markdown files are processed with processMarkdown.  For a PLUMED input file the html is written to a file whose name is the
+       name of the input file with .html appended.
+
+       Keyword arguments:
+       filename -- The name of the markdown file or PLUMED input file
+       plumedexe -- The plumed executibles to test the inputs with
+       plumed_names -- The names of the plumed executibles to use in the badges
+       ghmarkdown -- Set true if the markdown is for github pages
+       test_plumed_kwargs -- A dictionary of extra keywords to pass to test_plumed
+       delegated -- Set true to output data attributes instead of inline onclick handlers (see get_html)
+    """
+    if filename.endswith(".md") :
+       ninputs, nfail = processMarkdown( filename, plumedexe, plumed_names, set({}), ghmarkdown=ghmarkdown, test_plumed_kwargs=test_plumed_kwargs, delegated=delegated )
+       return nfail
+    with open( filename ) as f : inpt = f.read()
+    with tempfile.TemporaryDirectory() as scratch :
+         broken = [ test_plumed( exe, filename, printjson=(i==len(plumedexe)-1), jsondir=scratch + "/", ghmarkdown=ghmarkdown, **test_plumed_kwargs ) for i, exe in enumerate(plumedexe) ]
+         with open( filename + ".html", "w" ) as of :
+              _getDefaultRenderer( plumedexe ).render_input( inpt, filename, os.path.basename(filename), plumed_names, broken, usejson=(not broken[-1]), ghmarkdown=ghmarkdown,
+                      jsonname=os.path.join( scratch, os.path.basename(filename) ), out=of, delegated=delegated )
+    return [ int( b!=0 and b!="custom" ) for b in broken ]
+
+def _progress( stream, done, total, width=40 ) :
+    filled = width*done//total if total>0 else width
+    stream.write( "\r[" + "#"*filled + " "*(width-filled) + "] " + str(done) + "/" + str(total) + " inputs" )
+    stream.flush()
+
+def main( argv=None ) :
+    """
+       Test and render the PLUMED inputs in a set of markdown files and PLUMED input files
+
+       The inputs are processed by a pool of threads and plumed is run by a WorkerPool.  A progress bar is shown while the inputs
+       are processed.  At the end a report with the total time spent in each phase, the inputs that took longest and the number of
+       failures for each executible is output.  The return code is 1 if any input failed or could not be processed.
+
+       Keyword arguments:
+       argv -- The command line arguments.  By default the arguments that were passed to the program are used
+    """
+    parser = argparse.ArgumentParser( prog="plumedtohtml", description="Test the PLUMED inputs in markdown files and PLUMED input files and generate their html" )
+    parser.add_argument( "paths", nargs="+", help="markdown files, PLUMED input files and directories that contain them" )
+    parser.add_argument( "-j", "--jobs", type=int, default=1, help="the number of inputs to process at the same time" )
+    parser.add_argument( "--plumedexe", nargs="+", default=["plumed"], help="the plumed executibles to test the inputs with.  The last one is used to annotate the inputs" )
+    parser.add_argument( "--plumed-names", nargs="+", default=None, help="the names of the plumed executibles to use in the badges" )
+    parser.add_argument( "--ghmarkdown", dest="ghmarkdown", action="store_true", default=True, help="output markdown for github pages (the default)" )
+    parser.add_argument( "--no-ghmarkdown", dest="ghmarkdown", action="store_false", help="output plain html in the markdown" )
+    parser.add_argument( "--timeout", type=float, default=None, help="the number of seconds after which a plumed test is stopped" )
+    parser.add_argument( "--slowest", type=int, default=10, help="the number of slowest inputs to show in the report" )
+    parser.add_argument( "--delegated", action="store_true", help="output data attributes that are handled by one listener for each input instead of inline onclick handlers" )
+    parser.add_argument( "--no-progress", dest="progress", action="store_false", help="do not show the progress bar" )
+    args = parser.parse_args( argv )
+    if args.jobs<1 : parser.error("the number of jobs must be at least one")
+    plumedexe = tuple( args.plumedexe )
+    plumed_names = tuple( args.plumed_names ) if args.plumed_names is not None else plumedexe
+    if len(plumed_names)!=len(plumedexe) : parser.error("there must be one name for each plumed executible")
+
+    inputs = findInputs( args.paths )
+    timer, times, failures, errors = PhaseTimer(), {}, len(plumedexe)*[0], {}
+    renderer, start = _getDefaultRenderer( plumedexe ), time.perf_counter()
+    backend = WorkerPool( args.jobs, timer=timer ) if args.jobs>1 else _TimedBackend( SubprocessBackend(), timer )
+    test_plumed_kwargs = { "cmdTimeout": args.timeout, "backend": backend }
+    def run( filename ) :
+        begin = time.perf_counter()
+        try : return processInput( filename, plumedexe, plumed_names, args.ghmarkdown, test_plumed_kwargs, args.delegated )
+        finally : times[filename] = time.perf_counter() - begin
+    renderer.timer = timer
+    try :
+       with concurrent.futures.ThreadPoolExecutor( max_workers=args.jobs ) as pool :
+            futures = { pool.submit( run, filename ): filename for filename in inputs }
+            if args.progress : _progress( sys.stderr, 0, len(inputs) )
+            for n, future in enumerate( concurrent.futures.as_completed( futures ) ) :
+                try :
+                   for i, fail in enumerate( future.result() ) : failures[i] = failures[i] + fail
+                except Exception as e : errors[futures[future]] = str(e)
+                if args.progress : _progress( sys.stderr, n+1, len(inputs) )
+            if args.progress : sys.stderr.write("\n")
+    finally :
+       renderer.timer = None
+       if isinstance( backend, WorkerPool ) : backend.close()
+
+    # Output the report
+    print( "Processed " + str(len(inputs)) + " inputs in " + format( time.perf_counter() - start, ".2f" ) + " s with " + str(args.jobs) + " jobs" )
+    print( "Time in each phase (summed over all jobs):" )
+    for phase in ["plumed", "queue", "lexing", "formatting", "validation"] :
+        print( "  " + phase.ljust(12) + format( timer.totals[phase], "8.2f" ) + " s" )
+    print( "Slowest inputs:" )
+    for filename in sorted( times, key=times.get, reverse=True )[:args.slowest] :
+        print( "  " + format( times[filename], "8.2f" ) + " s  " + filename )
+    print( "Failures:" )
+    for name, fail in zip( plumed_names, failures ) : print( "  " + name.ljust(12) + str(fail) )
+    for filename, error in errors.items() : print( "Error processing " + filename + ": " + error )
+    return 1 if sum(failures)>0 or len(errors)>0 else 0
@@ -0,0 +1,90 @@
+import os
+import sys
+import ctypes
+import tempfile
+import threading
+from .PlumedToHTML import SubprocessBackend
+
+class PlumedModuleBackend :
+    """
+       Run the plumed command line tools in this process with the plumed python module
+
+       The PLUMED library is loaded once when the backend is created and the same Plumed object is used for all the commands
+       so the cost of starting a process and loading the library is not paid for every input.  The commands are run with the
+       CLTool interface of the library so the json files with the shortcuts and value dictionaries are the same as the ones
+       that are output when plumed is run in a subprocess.
+
+       Plumed writes to the stdout and stderr of the process and reads files relative to the working directory of the
+       process.  The file descriptors and the working directory are changed while a command runs so the backend can only be 
+       used by the thread that created it and a RuntimeError is raised if it is used by any other thread.  To check many inputs 
+       at once use a WorkerPool with backend=PlumedModuleBackend so each worker process has its own backend.
+
+       Only the commands for the executible that the library belongs to are run in this process.  Commands for other executibles, 
+       commands that use mpirun and commands that have arguments that contain spaces are run in a subprocess.  A timeout cannot 
+       be enforced for a command that is run in this process so commands with a timeout are also run in a subprocess unless 
+       timeout_enforced is true.  This is set by the workers of a WorkerPool as the pool stops workers that take too long.
+
+       Keyword arguments:
+       kernel -- The path to the PLUMED kernel library.  By default the library in the PLUMED_KERNEL environment variable is used
+       executible -- The name of the plumed executible whose commands are run with the library
+    """
+    # Only one command can use the stdout and stderr of the process at a time
+    _lock = threading.Lock()
+
+    def __init__( self, kernel=None, executible="plumed" ) :
+        # The plumed module and numpy are only needed if this backend is used
+        import plumed
+        import numpy
+        self._module, self._numpy, self.kernel, self.executible = plumed, numpy, kernel, executible
+        self._plumed = self._createPlumed()
+        self._owner, self.timeout_enforced = threading.get_ident(), False
+        self.fallback = SubprocessBackend()
+
+    def _createPlumed( self ) :
+        if self.kernel is None : return self._module.Plumed()
+        return self._module.Plumed( kernel=self.kernel )
+
+    def _runTool( self, cmd ) :
+        """
+           Run a command line tool with the Plumed object and return its return code
+        """
+        if self._plumed is None : self._plumed = self._createPlumed()
+        returnCode = self._numpy.zeros( 1, dtype=self._numpy.int32 )
+        self._plumed.cmd( "CLTool setArgvLine", " ".join(cmd) )
+        self._plumed.cmd( "CLTool run", returnCode )
+        return int( returnCode[0] )
+
+    def run( self, cmd, captures, cmdTimeout=None, cwd=None ) :
+        """
+           Run a plumed command and return its return code (see SubprocessBackend.run)
+        """
+        if threading.get_ident()!=self._owner : 
+           raise RuntimeError("a PlumedModuleBackend can only be used by the thread that created it.  Use a WorkerPool to run commands at the same time")
+        if cmd[0]!=self.executible or any( len(arg.split())!=1 for arg in cmd ) or ( cmdTimeout is not None and not self.timeout_enforced ) : 
+           return self.fallback.run( cmd, captures, cmdTimeout, cwd )
+        error = ""
+        with self._lock, tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err :
+             sys.stdout.flush()
+             sys.stderr.flush()
+             saved, olddir = [ os.dup(1), os.dup(2) ], os.getcwd()
+             try :
+                os.dup2( out.fileno(), 1 )
+                os.dup2( err.fileno(), 2 )
+                if cwd is not None : os.chdir( cwd )
+                returnCode = self._runTool( cmd )
+             except Exception as e :
+                # Errors in the input are raised as exceptions.  The Plumed object is created again in case it was left in a bad state
+                error, returnCode, self._plumed = str(e) + "\n", 1, None
+             finally :
+                # Flush the output that the library has written with the C stdio functions before the file descriptors are restored
+                ctypes.CDLL( None ).fflush( None )
+                os.chdir( olddir )
+                os.dup2( saved[0], 1 )
+                os.dup2( saved[1], 2 )
+                for fd in saved : os.close( fd )
+             if captures is not None :
+                for capture, output in [ (captures[0], out), (captures[1], err) ] :
+                    output.seek( 0 )
+                    for block in iter( lambda : output.read( 65536 ), b"" ) : capture.write( block )
+                if len(error)>0 : captures[1].write( error.encode() )
+        return returnCode
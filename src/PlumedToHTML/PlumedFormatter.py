@@ -1,18 +1,158 @@
 from pygments import highlight
 from pygments.formatter import Formatter
 from pygments.token import Text, Comment, Literal, Keyword, Name, Generic, String
-from pygments.lexers.c_cpp import CppLexer
-from pygments.formatters import HtmlFormatter
-from requests.exceptions import InvalidJSONError
+import os
 import re
 import html
+import hashlib
+import itertools
+import functools
+import warnings
 import json
+import threading
+import collections
+
+class KeywordIndex :
+    """
+       An index of the keywords in a syntax dictionary that makes looking up the description of a keyword fast
+
+       For each action the short descriptions (the first sentence of the description) and the links to the actions that explain 
+       the options for a keyword are computed once.  The numbered keywords (e.g. ATOMS1, MATRIX12) that match a keyword that can be 
+       used multiple times are found once for each action and keyword and remembered.
+
+       Keyword arguments:
+       keyword_dict -- The syntax dictionary
+    """
+    def __init__( self, keyword_dict ) :
+        self.keyword_dict = keyword_dict
+        # The short descriptions of all the keywords, the links to other actions, the keywords that can be numbered and the resolved keywords for each action
+        self.descriptions, self.links, self.numbered, self.resolved, self.checkkeys = {}, {}, {}, {}, {}
+        for action, data in keyword_dict.items() :
+            if not isinstance( data, dict ) or not isinstance( data.get("syntax"), dict ) : continue
+            descriptions, links, numbered = {}, {}, []
+            for key, keydata in data["syntax"].items() :
+                if key=="output" : continue
+                if key=="--help/-h" : descriptions[key] = keydata["description"]
+                else : descriptions[key] = keydata["description"].split('.')[0]
+                links[key] = ""
+                if "actionlink" in keydata.keys() and keydata["actionlink"]!="none" and keydata["actionlink"] in keyword_dict :
+                   linkaction = keydata["actionlink"]
+                   links[key] = ". Options for this keyword are explained in the documentation for <a href=\"" + keyword_dict[linkaction]["hyperlink"] + "\">" + linkaction + "</a>."
+                if keydata.get("multiple",0)!=0 : numbered.append( key )
+            self.descriptions[action], self.links[action], self.numbered[action] = descriptions, links, numbered
+
+    def lookup( self, action, value ) :
+        """
+           Get the keyword in the dictionary, its short description and the link to the action that explains its options for a keyword
+           that appears in the input.  None is returned if the keyword is not in the dictionary
+        """
+        resolved = self.resolved.setdefault( action, {} )
+        if value in resolved : return resolved[value]
+        descriptions, links, word = self.descriptions[action], self.links[action], value.strip()
+        mykey = word.upper()
+        if mykey not in descriptions and word in descriptions : mykey = word
+        if mykey=="--HELP" or mykey=="-H" : mykey = "--help/-h"
+        if mykey in descriptions : result = ( mykey, descriptions[mykey], links[mykey] )
+        else :
+           # This deals with numbered keywords.  The last keyword that matches is used
+           result = None
+           for kkkk in self.numbered[action] :
+               if kkkk in word : result = ( kkkk.upper(), descriptions[kkkk.upper()], links[kkkk.upper()] )
+        resolved[value] = result
+        return result
+
+    def numberedKeywords( self, action, key ) :
+        """
+           Get the keywords for an action that a keyword that is not in the dictionary is a numbered version of
+        """
+        checkkeys = self.checkkeys.setdefault( action, {} )
+        if key not in checkkeys : checkkeys[key] = [ kkkk for kkkk in self.numbered[action] if kkkk in key ]
+        return checkkeys[key]
+
+# The indexes for the syntax dictionaries that have been used most recently.  The dictionary is stored with its index to ensure that the id is not reused
+# and at most _max_keyword_indexes indexes are kept so the dictionaries for old PLUMED installations are not held forever.  Renderers are created by
+# many threads at once so the indexes are only used with the lock held
+_keyword_indexes, _max_keyword_indexes, _keyword_indexes_lock = collections.OrderedDict(), 8, threading.Lock()
+
+def getKeywordIndex( keyword_dict ) :
+    """
+       Get the index for a syntax dictionary.  The index is only built the first time it is needed
+    """
+    key = id(keyword_dict)
+    with _keyword_indexes_lock :
+         if key not in _keyword_indexes or _keyword_indexes[key][0] is not keyword_dict :
+            _keyword_indexes[key] = ( keyword_dict, KeywordIndex( keyword_dict ) )
+            while len(_keyword_indexes)>_max_keyword_indexes : _keyword_indexes.popitem( last=False )
+         _keyword_indexes.move_to_end( key )
+         return _keyword_indexes[key][1]
+
+def _tailLines( filename, nlines ) :
+    """
+       Get the last nlines lines of a file.  The file is read backwards from the end in blocks so only the end of the file is read
+    """
+    # A slice from -0 would be all the lines
+    if nlines<=0 : return []
+    with open( filename, 'rb' ) as iff :
+         iff.seek( 0, os.SEEK_END )
+         pos, data = iff.tell(), b""
+         # One more newline than the number of lines is needed to be sure that the first line is complete
+         while pos>0 and data.count(b"\n")<=nlines :
+             step = min( 65536, pos )
+             pos = pos - step
+             iff.seek( pos )
+             data = iff.read( step ) + data
+    return data.decode( errors="replace" ).splitlines()[-nlines:]
+
+@functools.lru_cache(maxsize=128)
+def _readAuxFile( filename, mtime, size, auxinputlines ) :
+    """
+       Get the extract from an auxiliary input file that is shown in the modal.  The modification time and size of the file are 
+       arguments so the cached extract is not used if the file changes
+    """
+    if filename.split(".")[-1]=="cpp" or len(auxinputlines)==0 :
+       with open( filename, 'r' ) as iff : fcontent = iff.read()
+       # This does syntax highlighting on cpp files 
+       if filename.split(".")[-1]=="cpp" : 
+          from pygments.lexers.c_cpp import CppLexer
+          from pygments.formatters import HtmlFormatter
+          fcontent = highlight( fcontent, CppLexer(), HtmlFormatter() )
+       if len(auxinputlines)==0 : return fcontent
+       allines = fcontent.splitlines()
+    else :
+       # Only read the lines that are needed.  A range -n is the last n lines of the file
+       nhead = max( [ int( rng.split("-")[1] ) for rng in auxinputlines if not rng.startswith("-") ], default=0 )
+       with open( filename, 'r' ) as iff : allines = [ line.rstrip("\n") for line in itertools.islice( iff, nhead ) ]
+    shortversion, whole = "", filename.split(".")[-1]=="cpp"
+    for n, rng in enumerate(auxinputlines) :
+        # The end of a cpp file is taken from the highlighted html so it is escaped in the same way as the rest of the extract
+        if rng.startswith("-") and whole : lines = allines[max( 0, len(allines)-int( rng[1:] ) ):]
+        elif rng.startswith("-") : lines = _tailLines( filename, int( rng[1:] ) )
+        else :
+           bounds = rng.split("-")
+           start, end = int( bounds[0] ), int( bounds[1] )
+           if start>len(allines) : break
+           lines = allines[start-1:end]
+        if n>0 : shortversion += "...\n"
+        for line in lines : shortversion += line + "\n"
+    return shortversion
+
+def getAuxFileExtract( filename, auxinputlines ) :
+    """
+       Get the extract from an auxiliary input file that is shown in the modal.  The extract is only created once unless the file changes
+
+       Keyword arguments:
+       filename -- The name of the file
+       auxinputlines -- A list of the ranges of lines (e.g. 1-5) to show.  A range -n shows the last n lines.  All the file is shown if this is empty
+    """
+    stat = os.stat( filename )
+    return _readAuxFile( filename, stat.st_mtime_ns, stat.st_size, tuple(auxinputlines) )
 
 class PlumedFormatter(Formatter):
     def __init__(self, **options) :
         Formatter.__init__(self, **options) 
         # Retrieve the dictionary of keywords from the json
         self.keyword_dict=options["keyword_dict"]
+        self.keyword_index=getKeywordIndex( self.keyword_dict )
         self.divname=options["input_name"]
         self.egname=options["input_name"]
         self.hasload=options["hasload"]
@@ -22,7 +162,17 @@ class PlumedFormatter(Formatter):
         self.valuedict=options["valuedict"]
         self.actions=options["actions"]
         self.checkaction=options["checkaction"]
+        # A dictionary that holds the ids of the tooltips on the page if the tooltips are output in a separate table
+        self.tooltips=options.get("tooltips",None)
+        # A dictionary that holds the modals for the auxiliary input files on the page if the modals are output in a separate block.  
+        # Only one modal is then output for each file on a page
+        self.auxmodals=options.get("auxmodals",None)
+        # Set true to output data attributes that are read by the listener on the container for the input instead of inline onclick handlers
+        self.delegated=options.get("delegated",False)
         self.checkaction_keywords = set({})
+        # The ids of the elements that are output and the targets of the javascript functions that are called when things are clicked.  
+        # These are used to check that every target exists once the html has been output
+        self.element_ids, self.references = set({}), []
         self.valcolors = { 
            "scalar": "black", 
            "atoms": "violet", 
@@ -50,6 +200,7 @@ class PlumedFormatter(Formatter):
                      if action in self.keyword_dict and "output" in self.keyword_dict[action]["syntax"] : self.writeValuesData( outfile, action, label, keywords, self.keyword_dict[action]["syntax"]["output"] )
                      else : 
                         outfile.write('<span style="display:none;" id="' + self.egname + label + r'">')
+                        self.addId( "span", self.egname + label )
                         outfile.write('The ' + action + ' action with label <b>' + label + '</b> calculates something') 
                         outfile.write('</span>') 
                   # Reset everything for the new action
@@ -68,21 +219,22 @@ class PlumedFormatter(Formatter):
             elif ttype==Literal :
                # mpirun -np for command line tools
                if re.search(r"mpirun\s+-np", value ) :
-                   outfile.write('<span class="plumedtooltip">' + value + '<span class="right">Run instances of PLUMED on this number of MPI processes<i></i></span></span>') 
+                   self.writeTooltip( outfile, value, 'Run instances of PLUMED on this number of MPI processes' )
                # --no-mpmi for command such as plumed --no-mpi tool ...
                elif value=="--no-mpi" :
-                   outfile.write('<span class="plumedtooltip">' + value + '<span class="right">Ignore any mpirun commands and turn off MPI.<i></i></span></span>')
+                   self.writeTooltip( outfile, value, 'Ignore any mpirun commands and turn off MPI.' )
                # __FILL__ for incomplete values
                elif value=="__FILL__"  : 
                    outfile.write('<span style="background-color:yellow">__FILL__</span>')
                # This is for vim syntax expression
                elif "vim:" in value :
-                   outfile.write('<span class="plumedtooltip" style="color:blue">' + value + '<span class="right">Enables syntax highlighting for PLUMED files in vim. See <a href="' + self.keyword_dict["vimlink"] + '">here for more details. </a><i></i></span></span>')
+                   self.writeTooltip( outfile, value, 'Enables syntax highlighting for PLUMED files in vim. See <a href="' + self.keyword_dict["vimlink"] + '">here for more details. </a>', ' style="color:blue"' )
                else : raise ValueError("found invalid Literal in input " + value)
             elif ttype==Comment.Hashbang :
                # This handles the mechanism for closing the expanding shortcut
                if shortcut_state!=2 : raise ValueError("Should only find line to close shortcut between #EXPANSION and #ENDEXPANSION tags")
-               outfile.write('<span class="toggler" style="color:red" onclick=\'toggleDisplay("' + self.egname + expansion_label + '")\'>' + value + '</span>')
+               outfile.write('<span class="toggler" style="color:red" ' + self.onClick( "toggleDisplay", self.egname + expansion_label ) + '>' + value + '</span>')
+               self.addReference( "span", self.egname + expansion_label )
             elif ttype==Comment.Special or ttype==Comment.Preproc :
                # This handles the mechanisms for the expandable shortcuts
                act_label=""
@@ -90,6 +242,7 @@ class PlumedFormatter(Formatter):
                   if default_state!=0 : raise ValueError("Found rogue #NODEFAULT")
                   default_state, act_label = 1, html.escape( value.replace("#NODEFAULT","").strip() )
                   outfile.write('<span id="' + self.egname + "def" + act_label + '_short">')
+                  self.addId( "span", self.egname + "def" + act_label + '_short' )
                elif "#ENDDEFAULT" in value :
                   if default_state!=2 : raise ValueError("Found rogue #ENDDEFAULT")
                   default_state = 0
@@ -98,11 +251,13 @@ class PlumedFormatter(Formatter):
                   if default_state!=1 : raise ValueError("Found rogue #DEFAULT")
                   act_label, default_state = html.escape( value.replace("#DEFAULT","").strip() ), 2
                   outfile.write('</span><span id="' + self.egname + "def" + act_label + '_long" style="display:none;">')
+                  self.addId( "span", self.egname + "def" + act_label + '_long' )
                elif "#SHORTCUT" in value :
                   if shortcut_depth==0 and shortcut_state!=0 : raise ValueError("Found rogue #SHORTCUT")
                   shortcut_state, shortcut_depth = 1, shortcut_depth + 1
                   act_label = html.escape( value.replace("#SHORTCUT","").strip() )
                   outfile.write('<span id="' + self.egname + act_label + '_short">')
+                  self.addId( "span", self.egname + act_label + '_short' )
                elif "#ENDEXPANSION" in value :
                   if shortcut_state!=2 : raise ValueError("Should only find #ENDEXPANSION tag after #EXPANSION tag")
                   shortcut_depth = shortcut_depth - 1
@@ -115,16 +270,21 @@ class PlumedFormatter(Formatter):
                   shortcut_state = 2
                   act_label, expansion_label = html.escape( value.replace("#EXPANSION","").strip() ), value.replace("#EXPANSION","").strip()
                   outfile.write('</span><span id="' + self.egname + act_label + '_long" style="display:none;">')
+                  self.addId( "span", self.egname + act_label + '_long' )
                elif "#ENDHIDDEN" in value :
                   if hidden_state != 1 : raise ValueError("Found rogue #ENDHIDDEN")
                   hidden_state = 0 
-                  outfile.write('<a class="toggler" style="color:red" onclick=\'toggleDisplay("' + self.egname + "_hiddenpart" + str(hidenum) + '")\'># --- Click here to hide input --- \n</a></span>')
+                  outfile.write('<a class="toggler" style="color:red" ' + self.onClick( "toggleDisplay", self.egname + "_hiddenpart" + str(hidenum) ) + '># --- Click here to hide input --- \n</a></span>')
+                  self.addReference( "span", self.egname + "_hiddenpart" + str(hidenum) )
                elif "#HIDDEN" in value :
                   if hidden_state != 0 : raise ValueError("Found rogue #HIDDEN in already hidden input") 
                   hidden_state, hidenum = 1, hidenum + 1
                   outfile.write('<span id="' + self.egname + "_hiddenpart" + str(hidenum) + '_short">')
-                  outfile.write('<a class="toggler" style="color:red" onclick=\'toggleDisplay("' + self.egname + "_hiddenpart" + str(hidenum) + '")\'># --- Click here to reveal hidden parts of input file ---- \n</a></span>')
+                  outfile.write('<a class="toggler" style="color:red" ' + self.onClick( "toggleDisplay", self.egname + "_hiddenpart" + str(hidenum) ) + '># --- Click here to reveal hidden parts of input file ---- \n</a></span>')
                   outfile.write('<span id="' + self.egname + "_hiddenpart" + str(hidenum) + '_long" style="display:none;">')
+                  self.addId( "span", self.egname + "_hiddenpart" + str(hidenum) + '_short' )
+                  self.addId( "span", self.egname + "_hiddenpart" + str(hidenum) + '_long' )
+                  self.addReference( "span", self.egname + "_hiddenpart" + str(hidenum) )
                else : raise ValueError("Found " + value.strip() + " in Comment.Special should only catch string that are #SHORTCUT, #EXPANSION, #ENDEXPANSION, #HIDDEN or #ENDHIDDEN")
                # This sets up the label at the start of a new block with NODEFAULT or SHORTCUT
                if ttype==Comment.Preproc :
@@ -134,48 +294,30 @@ class PlumedFormatter(Formatter):
                # whatever in KEYWORD=whatever 
                if action=="INCLUDE" and shortcut_state==1 : 
                   # special treatment for filename in INCLUDE FILE=filename
-                  outfile.write('<a class="toggler" href=\'javascript:;\' onclick=\'toggleDisplay("' + self.egname + label + '");\'>' + value + '</a>') 
+                  outfile.write('<a class="toggler" href=\'javascript:;\' ' + self.onClick( "toggleDisplay", self.egname + label, end=";" ) + '>' + value + '</a>') 
+                  self.addReference( "span", self.egname + label )
                else :
                   # notice special treatment here because we want to find labels so we can show paths
                   inputs, nocomma = value.split(","), True
                   for inp in inputs : 
-                      islab, inpt = False, inp.strip()
-                      for lab in all_labels : 
-                          if inpt.split('.')[0]==lab : 
-                             islab=True
-                             break
+                      # The label is the part of the value before the first dot (e.g. d1 in d1.x)
+                      lab = inp.strip().split('.',1)[0]
                       if not nocomma : outfile.write(',')
-                      if islab : outfile.write('<b name="' + self.egname + inpt.split('.')[0] + '">' + inp + '</b>')
+                      if lab in all_labels : outfile.write('<b name="' + self.egname + lab + '">' + inp + '</b>')
                       # Deal with files
                       elif inp in self.auxinputs :
-                        iff = open( inp, 'r' )
-                        fcontent = iff.read()
-                        iff.close()
-                        # This does syntax highlighting on cpp files 
-                        if inp.split(".")[-1]=="cpp" : fcontent = highlight( fcontent, CppLexer(), HtmlFormatter() )
-                        nfiles = nfiles + 1
-                        if len(self.auxinputlines)>0 : 
-                           shortversion, allines = "", fcontent.splitlines()
-                           for n, l in enumerate(self.auxinputlines) : 
-                               bounds = l.split("-")
-                               start, end = int( bounds[0] ), int( bounds[1] )
-                               if start>len(allines) : break
-                               if n>0 : shortversion += "...\n"
-                               for kk in range(start,end+1) : 
-                                   if kk<=len(allines) : shortversion += allines[kk-1] + "\n"
-                           fcontent = shortversion
-                        outfile.write('<div class="plumedtooltip">' + inp + '<div class="right"> Click <a onclick=\'openModal("' + self.egname + inp + str(nfiles) + '")\'>here</a> to see an extract from this file.<i></i></div></div>')
-                        outfile.write('<div id="' + self.egname + inp + str(nfiles) + '" class="plumedmodal">')
-                        outfile.write('  <div class="plumedmodal-content">')
-                        outfile.write('<div class="plumedmodal-header">')
-                        outfile.write('  <span class="close" onclick=\'closeModal("' + self.egname + inp + str(nfiles) + '")\'>&times;</span>')
-                        outfile.write('  <h2>FILE: ' + inp + '</h2>')
-                        outfile.write('</div>')
-                        outfile.write('<div class="plumedmodal-body">')
-                        outfile.write('    <pre>' + fcontent + '</pre>')
-                        outfile.write('</div>')
-                        outfile.write('  </div>')
-                        outfile.write('</div>')
+                        if self.auxmodals is None : 
+                           nfiles = nfiles + 1
+                           modalid = self.egname + inp + str(nfiles)
+                        else : modalid = "plumedmodal_" + hashlib.sha1( ( inp + "\n" + "\n".join(self.auxinputlines) ).encode() ).hexdigest()[:12]
+                        outfile.write('<div class="plumedtooltip">' + inp + '<div class="right"> Click <a ' + self.onClick( "openModal", modalid ) + '>here</a> to see an extract from this file.<i></i></div></div>')
+                        # The modals for the page are stored in the dictionary and output once outside all the inputs by get_modal_table
+                        if self.auxmodals is not None : 
+                           if modalid not in self.auxmodals : self.auxmodals[modalid] = self.getModal( modalid, inp, 'onclick=\'closeModal("' + modalid + '")\'' )
+                        else : 
+                           outfile.write( self.getModal( modalid, inp, self.onClick( "closeModal", modalid ) ) )
+                           self.addId( "div", modalid )
+                           self.addReference( "modal", modalid )
                       # Deal with atom selections
                       elif "@" in inp :
                         tooltip, link = "", ""
@@ -192,7 +334,7 @@ class PlumedFormatter(Formatter):
                         else : 
                             select = inp.strip()
                             if select in self.keyword_dict["groups"] : tooltip, link = self.keyword_dict["groups"][select]["description"], self.keyword_dict["groups"][select]["link"]
-                        if len(tooltip)>0 : outfile.write('<span class="plumedtooltip">' + inp + '<span class="right">' + tooltip + '. <a href="' + link + '">Click here</a> for more information. <i></i></span></span>') 
+                        if len(tooltip)>0 : self.writeTooltip( outfile, inp, tooltip + '. <a href="' + link + '">Click here</a> for more information. ' )
                         else : outfile.write( html.escape(inp) )
                       else : outfile.write( html.escape(inp) )
                       nocomma = False 
@@ -209,12 +351,14 @@ class PlumedFormatter(Formatter):
                       elif valtype=="unset" : valtype = ddd["type"]
                       elif valtype!=ddd["type"] : valtype = "mix" 
                if shortcut_state==1 and "shortcut_" + label in self.valuedict.keys() : 
-                  outfile.write('<b name="' + self.egname + label + '" onclick=\'showPath("' + self.divname + '","' + self.egname + label + '","' + self.egname + label + '_shortcut","' + self.valcolors[valtype] + '")\'>' + value + '</b>') 
+                  outfile.write('<b name="' + self.egname + label + '" ' + self.onClick( "showPath", self.divname, self.egname + label, self.egname + label + "_shortcut", self.valcolors[valtype] ) + '>' + value + '</b>') 
+                  self.addReference( "path", self.divname, self.egname + label + '_shortcut' )
                   if label + "_shortcut" not in all_labels :
                      all_labels.add(label + "_shortcut") 
                      self.writeValueInfo( outfile, label, label + "_shortcut", self.valuedict["shortcut_" + label] )
                else : 
-                  outfile.write('<b name="' + self.egname + label + '" onclick=\'showPath("' + self.divname + '","' + self.egname + label + '","' + self.egname + label + '","' + self.valcolors[valtype] + '")\'>' + value + '</b>')
+                  outfile.write('<b name="' + self.egname + label + '" ' + self.onClick( "showPath", self.divname, self.egname + label, self.egname + label, self.valcolors[valtype] ) + '>' + value + '</b>')
+                  self.addReference( "path", self.divname, self.egname + label )
                   if label in self.valuedict.keys() and label not in all_labels :
                      all_labels.add(label)
                      self.writeValueInfo( outfile, label, label, self.valuedict[label] )
@@ -227,45 +371,31 @@ class PlumedFormatter(Formatter):
                if notooltips :
                   outfile.write( value.strip() )
                else :
-                  desc, mykey = "", value.strip().upper()
+                  desc, link = "", ""
                   if action not in self.keyword_dict : raise Exception("action " + action + " not present in keyword dictionary")
                   if "syntax" not in self.keyword_dict[action] : raise Exception("syntax not present in documentation for " + action )
-                  if mykey not in self.keyword_dict[action]["syntax"] and value.strip() in self.keyword_dict[action]["syntax"] : mykey = value.strip()
-
-                  if mykey=="--HELP" or mykey=="-H" : 
-                     mykey, desc = "--help/-h", self.keyword_dict[action]["syntax"]["--help/-h"]["description"] 
-                  elif mykey in self.keyword_dict[action]["syntax"] : 
-                     desc = self.keyword_dict[action]["syntax"][mykey]["description"].split('.')[0]
-                  else :
-                     # This deals with numbered keywords
-                     foundkey=False
-                     for kkkk in self.keyword_dict[action]["syntax"] :
-                         if kkkk=="output" or self.keyword_dict[action]["syntax"][kkkk]["multiple"]==0 : continue
-                         if kkkk in value.strip() : foundkey, mykey, desc = True, kkkk.upper(), self.keyword_dict[action]["syntax"][kkkk.upper()]["description"].split('.')[0]
-                     if not self.broken and not notooltips and not foundkey : 
-                        if self.hasload : foundkey, desc = True, 'There is a possibity that this action is not part of PLUMED and was included by using a LOAD command. This LOADing replaces one of the actions that is in PLUMED. You should thus be wary of the documentation in these tooltips and look at the cpp file that was loaded <a href="' + self.keyword_dict["LOAD"]["hyperlink"] + '" style="color:green">More details</a>'
-                        else : raise Exception("keyword " + value.strip().upper() + " is not in syntax for action " + action )
+                  # The description and the link to any action that explains the options are found in the index
+                  found = self.keyword_index.lookup( action, value )
+                  if found is not None : desc, link = found[1], found[2]
+                  elif not self.broken : 
+                     if self.hasload : desc = 'There is a possibity that this action is not part of PLUMED and was included by using a LOAD command. This LOADing replaces one of the actions that is in PLUMED. You should thus be wary of the documentation in these tooltips and look at the cpp file that was loaded <a href="' + self.keyword_dict["LOAD"]["hyperlink"] + '" style="color:green">More details</a>'
+                     else : raise Exception("keyword " + value.strip().upper() + " is not in syntax for action " + action )
                   if desc=="" and self.broken : outfile.write( value )
-                  else :
-                     if action not in self.keyword_dict : raise Exception("action " + action + " not present in keyword dictionary")
-                     if "actionlink" in self.keyword_dict[action]["syntax"][mykey].keys() and self.keyword_dict[action]["syntax"][mykey]["actionlink"]!="none" : 
-                        linkaction = self.keyword_dict[action]["syntax"][mykey]["actionlink"]
-                        desc = desc + ". Options for this keyword are explained in the documentation for <a href=\"" + self.keyword_dict[linkaction]["hyperlink"] + "\">" + linkaction + "</a>.";  
-                     outfile.write('<span class="plumedtooltip">' + value + '<span class="right">' + desc + '<i></i></span></span>')
+                  else : self.writeTooltip( outfile, value, desc + link )
             elif ttype==Name.Constant :
                # @replicas in special replica syntax
                if value=="@replicas:" : 
-                  outfile.write('<span class="plumedtooltip">' + value + '<span class="right">This keyword specifies that different replicas have different values for this quantity.  See <a href="' + self.keyword_dict["replicalink"] +'">here for more details.</a><i></i></span></span>')
+                  self.writeTooltip( outfile, value, 'This keyword specifies that different replicas have different values for this quantity.  See <a href="' + self.keyword_dict["replicalink"] +'">here for more details.</a>' )
                # Deal with external libraries doing atom selections
                else :
                   if value not in self.keyword_dict["groups"] : raise Exception("special group " + value + " not in special group dictionary")
-                  outfile.write('<span class="plumedtooltip">' + value + '<span class="right">' + self.keyword_dict["groups"][value]["description"] + '.  <a href="' + self.keyword_dict["groups"][value]["link"] + '">Click here</a> for more information. <i></i></span></span>');
+                  self.writeTooltip( outfile, value, self.keyword_dict["groups"][value]["description"] + '.  <a href="' + self.keyword_dict["groups"][value]["link"] + '">Click here</a> for more information. ' )
             elif ttype==Name.Decorator :
                # Input files for command line tools
-               outfile.write('<span class="plumedtooltip">' + value + '<span class="right"> This is the input file for the calculation.<i></i></span></span>')
+               self.writeTooltip( outfile, value, ' This is the input file for the calculation.' )
             elif ttype==Name.Entity :
                # Direct out for command line tools
-               outfile.write('<span class="plumedtooltip">' + value + '<span class="right"> What is printed on standard output is directed to a file with this name.<i></i></span></span>')
+               self.writeTooltip( outfile, value, ' What is printed on standard output is directed to a file with this name.' )
             elif ttype==Keyword :
                action, notooltips = value.strip(), False
                if action not in self.keyword_dict :
@@ -280,20 +410,27 @@ class PlumedFormatter(Formatter):
                if default_state!=0 or shortcut_state==1 : 
                   if label!="" and label!=act_label : raise Exception("mismatched label and act_label for shortcut/default label=" + label + " act_label=" + act_label ) 
                if notooltips :
-                    outfile.write('<span class="plumedtooltip" style="color:green">' + value.strip() + '<span class="right">This action is not part of PLUMED and was included by using a LOAD command <a href="' + self.keyword_dict["LOAD"]["hyperlink"] + '" style="color:green">More details</a><i></i></span></span>') 
+                    self.writeTooltip( outfile, value.strip(), 'This action is not part of PLUMED and was included by using a LOAD command <a href="' + self.keyword_dict["LOAD"]["hyperlink"] + '" style="color:green">More details</a>', ' style="color:green"' )
                elif shortcut_state==1 and default_state==1 :
-                    outfile.write('<span class="plumedtooltip" style="color:green">' + value.strip() + '<span class="right">' + self.keyword_dict[action]["description"] + ' This action is <a class="toggler" href=\'javascript:;\' onclick=\'toggleDisplay("' + self.egname + label + '");\'>a shortcut</a> and it has <a class="toggler" href=\'javascript:;\' onclick=\'toggleDisplay("' + self.egname + "def" + act_label + '");\'>hidden defaults</a>. <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a><i></i></span></span>') 
+                    self.addReference( "span", self.egname + label )
+                    self.addReference( "span", self.egname + "def" + act_label )
+                    self.writeTooltip( outfile, value.strip(), self.keyword_dict[action]["description"] + ' This action is <a class="toggler" href=\'javascript:;\' ' + self.onClick( "toggleDisplay", self.egname + label, end=";" ) + '>a shortcut</a> and it has <a class="toggler" href=\'javascript:;\' ' + self.onClick( "toggleDisplay", self.egname + "def" + act_label, end=";" ) + '>hidden defaults</a>. <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a>', ' style="color:green"' )
                elif shortcut_state==1 and default_state==2 :
-                    outfile.write('<span class="plumedtooltip" style="color:green">' + value.strip() + '<span class="right">' + self.keyword_dict[action]["description"] + ' This action is <a class="toggler" href=\'javascript:;\' onclick=\'toggleDisplay("' + self.egname + act_label + '");\'>a shortcut</a> and uses the <a class="toggler" href=\'javascript:;\' onclick=\'toggleDisplay("' + self.egname + "def" + act_label + '");\'>defaults shown here</a>. <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a><i></i></span></span>')
+                    self.addReference( "span", self.egname + act_label )
+                    self.addReference( "span", self.egname + "def" + act_label )
+                    self.writeTooltip( outfile, value.strip(), self.keyword_dict[action]["description"] + ' This action is <a class="toggler" href=\'javascript:;\' ' + self.onClick( "toggleDisplay", self.egname + act_label, end=";" ) + '>a shortcut</a> and uses the <a class="toggler" href=\'javascript:;\' ' + self.onClick( "toggleDisplay", self.egname + "def" + act_label, end=";" ) + '>defaults shown here</a>. <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a>', ' style="color:green"' )
                elif default_state==1 :
-                    outfile.write('<span class="plumedtooltip" style="color:green">' + value.strip() + '<span class="right">' + self.keyword_dict[action]["description"] + ' This action has <a class="toggler" href=\'javascript:;\' onclick=\'toggleDisplay("' + self.egname + "def" + act_label + '");\'>hidden defaults</a>. <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a><i></i></span></span>')
+                    self.addReference( "span", self.egname + "def" + act_label )
+                    self.writeTooltip( outfile, value.strip(), self.keyword_dict[action]["description"] + ' This action has <a class="toggler" href=\'javascript:;\' ' + self.onClick( "toggleDisplay", self.egname + "def" + act_label, end=";" ) + '>hidden defaults</a>. <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a>', ' style="color:green"' )
                elif default_state==2 :
-                    outfile.write('<span class="plumedtooltip" style="color:green">' + value.strip() + '<span class="right">' + self.keyword_dict[action]["description"] + ' This action uses the <a class="toggler" href=\'javascript:;\' onclick=\'toggleDisplay("' + self.egname + "def" + act_label + '");\'>defaults shown here</a>. <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a><i></i></span></span>')
+                    self.addReference( "span", self.egname + "def" + act_label )
+                    self.writeTooltip( outfile, value.strip(), self.keyword_dict[action]["description"] + ' This action uses the <a class="toggler" href=\'javascript:;\' ' + self.onClick( "toggleDisplay", self.egname + "def" + act_label, end=";" ) + '>defaults shown here</a>. <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a>', ' style="color:green"' )
                elif shortcut_state==1 :
-                     if action=="INCLUDE" : outfile.write('<span class="plumedtooltip" style="color:green">' + value.strip() + '<span class="right">' + self.keyword_dict[action]["description"] + ' <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a>. Show <a class="toggler" href=\'javascript:;\' onclick=\'toggleDisplay("' + self.egname + act_label + '");\'>included file</a><i></i></span></span>')
-                     else : outfile.write('<span class="plumedtooltip" style="color:green">' + value.strip() + '<span class="right">' + self.keyword_dict[action]["description"] + ' This action is <a class="toggler" href=\'javascript:;\' onclick=\'toggleDisplay("' + self.egname + act_label + '");\'>a shortcut</a>. <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a><i></i></span></span>')
+                     self.addReference( "span", self.egname + act_label )
+                     if action=="INCLUDE" : self.writeTooltip( outfile, value.strip(), self.keyword_dict[action]["description"] + ' <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a>. Show <a class="toggler" href=\'javascript:;\' ' + self.onClick( "toggleDisplay", self.egname + act_label, end=";" ) + '>included file</a>', ' style="color:green"' )
+                     else : self.writeTooltip( outfile, value.strip(), self.keyword_dict[action]["description"] + ' This action is <a class="toggler" href=\'javascript:;\' ' + self.onClick( "toggleDisplay", self.egname + act_label, end=";" ) + '>a shortcut</a>. <a href="' + self.keyword_dict[action]["hyperlink"] + '">More details</a>', ' style="color:green"' )
                else :
-                     outfile.write('<span class="plumedtooltip" style="color:green">' + value.strip() + '<span class="right">'+ self.keyword_dict[action]["description"] + ' <a href="' + self.keyword_dict[action]["hyperlink"] + '" style="color:green">More details</a><i></i></span></span>')
+                     self.writeTooltip( outfile, value.strip(), self.keyword_dict[action]["description"] + ' <a href="' + self.keyword_dict[action]["hyperlink"] + '" style="color:green">More details</a>', ' style="color:green"' )
         # Check if there is stuff to output for the last action in the file
         if action==self.checkaction : 
            self.storeKeywordsForCheckAction( keywords )
@@ -302,6 +439,7 @@ class PlumedFormatter(Formatter):
            if action in self.keyword_dict and "output" in self.keyword_dict[action]["syntax"] : self.writeValuesData( outfile, action, label, keywords, self.keyword_dict[action]["syntax"]["output"] )
            else : 
               outfile.write('<span style="display:none;" id="' + self.egname + label + r'">')
+              self.addId( "span", self.egname + label )
               outfile.write('The ' + action + ' action with label <b>' + label + '</b> calculates something')
               outfile.write('</span>')
         outfile.write('</pre>')
@@ -309,6 +447,7 @@ class PlumedFormatter(Formatter):
     def writeValuesData( self, outfile, action, label, keywords, outdict ) :
         # Some header stuff 
         outfile.write('<span style="display:none;" id="' + self.egname + label + r'">')
+        self.addId( "span", self.egname + label )
         outfile.write('The ' + action + ' action with label <b>' + label + '</b>')
         # Check for components
         found_flags = False
@@ -334,6 +473,7 @@ class PlumedFormatter(Formatter):
     def writeValueInfo( self, outfile, label, span_label, valinfo ) :
         # Some header stuff 
         outfile.write('<span style="display:none;" id="' + self.egname + span_label + r'">')
+        self.addId( "span", self.egname + span_label )
         outfile.write('The ' + valinfo["action"] + ' action with label <b>' + label + '</b>')
         outfile.write(' calculates the following quantities:')
         outfile.write('<table  align="center" frame="void" width="95%" cellpadding="5%">')
@@ -344,6 +484,77 @@ class PlumedFormatter(Formatter):
         outfile.write('</table>') 
         outfile.write('</span>')
 
+    def writeTooltip( self, outfile, value, desc, style="" ) :
+        """
+           Output value with a tooltip that contains desc
+
+           If there is a tooltip dictionary the description is stored in the dictionary and only a reference to it is output.  
+           The javascript in the header puts the description into the tooltip when the mouse is moved over the value.
+        """
+        if self.tooltips is None : 
+           outfile.write('<span class="plumedtooltip"' + style + '>' + value + '<span class="right">' + desc + '<i></i></span></span>')
+        else : 
+           if desc not in self.tooltips : self.tooltips[desc] = "plumedtooltip_" + hashlib.sha1( desc.encode() ).hexdigest()[:12]
+           outfile.write('<span class="plumedtooltip"' + style + ' data-tooltip="' + self.tooltips[desc] + '">' + value + '</span>')
+
+    def getModal( self, modalid, filename, close ) :
+        """
+           Get the html for the modal that shows the extract from an auxiliary input file.  close is the attribute that closes the modal
+        """
+        fcontent = getAuxFileExtract( filename, self.auxinputlines )
+        modal = '<div id="' + modalid + '" class="plumedmodal">'
+        modal += '  <div class="plumedmodal-content">'
+        modal += '<div class="plumedmodal-header">'
+        modal += '  <span class="close" ' + close + '>&times;</span>'
+        modal += '  <h2>FILE: ' + filename + '</h2>'
+        modal += '</div>'
+        modal += '<div class="plumedmodal-body">'
+        modal += '    <pre>' + fcontent + '</pre>'
+        modal += '</div>'
+        modal += '  </div>'
+        modal += '</div>'
+        return modal
+
+    def onClick( self, function, *args, end="" ) :
+        """
+           Get the attributes that make an element call one of the javascript functions in the header when it is clicked
+
+           By default an inline onclick handler that calls the function is returned.  If the formatter was created with delegated=True
+           data attributes are returned instead.  These are read by the listener on the container for the input (see plumedInitContainer
+           in the header) so no handler is created for each element.  The div to show the value details in is then found from the container
+           and the name of the label is read from the name attribute so only the span with the details and the color are output for showPath.
+        """
+        if not self.delegated : return 'onclick=\'' + function + '(' + ','.join( '"' + arg + '"' for arg in args ) + ')' + end + '\''
+        if function=="showPath" : return 'data-value="' + args[2] + '" data-color="' + args[3] + '"'
+        attribute = { "toggleDisplay": "data-toggle", "openModal": "data-modal", "closeModal": "data-close" }[function]
+        return attribute + '="' + args[0] + '"'
+
+    def addId( self, tag, idname ) :
+        # Ids are stored as they will appear once the html has been parsed
+        self.element_ids.add( (tag, html.unescape(idname)) )
+
+    def addReference( self, kind, *targets ) :
+        self.references.append( (kind,) + tuple( html.unescape(t) for t in targets ) )
+
+    def checkReferences( self ) :
+        """
+           Check that the elements that are shown when things in the html are clicked are all present
+
+           Clicking a label calls showPath, which needs a div for the value details and a span that contains the information on the value.
+           Clicking a toggler calls toggleDisplay, which needs elements with ids that end in _long and _short.  Clicking the link to a file calls openModal, 
+           which needs the div that contains the modal.  Each target is looked up in the set of ids so the cost is linear in the size of the input.
+           Missing spans with value information only give a warning.  Everything else raises an exception.
+        """
+        for ref in self.references :
+            if ref[0]=="path" :
+               if ("span", ref[2]) not in self.element_ids : warnings.warn("Problems with generated as label hidden box for label " + ref[2] + " is missing")
+               if ("div", "value_details_" + ref[1]) not in self.element_ids : raise Exception("Generated html is invalid as there is no place to show data for " + ref[1])
+            elif ref[0]=="modal" :
+               if ("div", ref[1]) not in self.element_ids : raise Exception("Generated html is invalid as could not find modal " + ref[1])
+            else :
+               if (ref[0], ref[1] + "_long") not in self.element_ids : raise Exception("Generated html is invalid as could not find " + ref[1] + "_long")
+               if (ref[0], ref[1] + "_short") not in self.element_ids : raise Exception("Generated html is invalid as could not find " + ref[1] + "_short")
+
     def getCheckActionKeywords( self ) :
         return self.checkaction_keywords 
 
@@ -353,7 +564,5 @@ class PlumedFormatter(Formatter):
                self.checkaction_keywords.add( key )
             else : 
                # This makes sure we find numbered keywords
-               for kkkk in self.keyword_dict[self.checkaction]["syntax"] :
-                   if kkkk=="output" or self.keyword_dict[self.checkaction]["syntax"][kkkk]["multiple"]==0 : continue
-                   if kkkk in key : self.checkaction_keywords.add( kkkk )
+               self.checkaction_keywords.update( self.keyword_index.numberedKeywords( self.checkaction, key ) )
  
@@ -2,53 +2,226 @@ import subprocess
 import os
 import re
 import json
+import html
 import pathlib
 import zipfile
 import warnings
 import glob
-from lxml import etree
+import gzip
+import sys
+import time
+import signal
+import codecs
+import shutil
+import pickle
+import hashlib
+import tempfile
+import functools
+import contextlib
+import threading
+import collections
 from io import StringIO
-from bs4 import BeautifulSoup
-from contextlib import contextmanager
+import pygments
 from pygments import highlight
-from pygments.lexers import load_lexer_from_file
-from pygments.formatters import load_formatter_from_file 
 # Uncomment this line if it is required for tests  
 #from pygments.formatters import HtmlFormatter
 
+class InvalidJSONError(ValueError) :
+    """
+       Raised when the syntax.json file for a PLUMED installation is not valid json
+    """
+
 def zip(path):
     """ Zip a path removing the original file """
     with zipfile.ZipFile(path + ".zip", "w") as f_out:
         f_out.write(path)
     os.remove(path)
 
-@contextmanager
-def cd(newdir):
-    prevdir = os.getcwd()
-    os.chdir(os.path.expanduser(newdir))
-    try:
-        yield
-    finally:
-        os.chdir(prevdir)
+class _OutputCapture :
+    """
+       Write the output from one of the channels of a plumed process straight to an archive as it is read
+
+       The first maxlines lines are kept so they can be shown in the markdown page.  All the output is 
+       kept if keep is true so it can be stored in the cache.
+
+       Keyword arguments:
+       path -- The name of the file for the raw output.  The extension for the archive is added to this name 
+       archive -- How to store the output.  This can be zip, gzip or none.  If it is None nothing is written
+       compresslevel -- The compression level for the zip or gzip archive
+       maxlines -- The number of lines at the start of the output to keep
+       keep -- Set true to keep all the output
+    """
+    extensions = { "zip": ".zip", "gzip": ".gz", "none": "" }
+    descriptions = { "zip": "zipped ", "gzip": "gzipped ", "none": "" }
+
+    def __init__( self, path, archive="zip", compresslevel=None, maxlines=0, keep=False ) :
+        self.maxlines, self.head, self.partial = maxlines, [], ""
+        self.decoder = codecs.getincrementaldecoder("utf-8")( errors="replace" )
+        self.chunks = [] if keep else None
+        self.archive, self.stream = None, None
+        if archive=="zip" : 
+           # The name in the archive is the same as the name zipfile would use if the file was added to the archive 
+           arcname = os.path.normpath( os.path.splitdrive(path)[1] ).lstrip( os.sep )
+           self.archive = zipfile.ZipFile( path + ".zip", "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel )
+           self.stream = self.archive.open( arcname, "w", force_zip64=True )
+        elif archive=="gzip" : self.stream = gzip.open( path + ".gz", "wb", compresslevel=9 if compresslevel is None else compresslevel )
+        elif archive=="none" : self.stream = open( path, "wb" )
+
+    def write( self, data ) :
+        if self.stream is not None : self.stream.write( data )
+        if self.chunks is not None : self.chunks.append( data )
+        if len(self.head)>=self.maxlines : return
+        lines = ( self.partial + self.decoder.decode( data ) ).split("\n")
+        self.partial = lines.pop()
+        self.head.extend( lines[:self.maxlines-len(self.head)] )
+
+    def close( self ) :
+        if len(self.head)<self.maxlines : 
+           self.partial = self.partial + self.decoder.decode( b"", final=True )
+           if len(self.partial)>0 : self.head.append( self.partial )
+           self.partial = ""
+        if self.stream is not None : self.stream.close()
+        if self.archive is not None : self.archive.close()
+        self.stream, self.archive = None, None
+
+    def text( self ) :
+        """
+           Get all the output.  This only works if keep was true
+        """
+        return b"".join( self.chunks ).decode( errors="replace" )
+
+def _pump( pipe, capture ) :
+    """
+       Copy everything that is output on a pipe to a capture until the pipe is closed
+    """
+    for block in iter( lambda : pipe.read1( 65536 ), b"" ) : capture.write( block )
+    pipe.close()
 
-def getPlumedSyntax( plumedexe ) :
+def _killGroup( process ) :
+    """
+       Stop a command that was started in a new session and all the processes that it started (e.g. the ranks of mpirun)
+    """
+    try : os.killpg( process.pid, signal.SIGKILL )
+    except ProcessLookupError : pass
+    process.wait()
+
+class SubprocessBackend :
+    """
+       Run the plumed command line tools in a subprocess
+
+       This is the backend that is used by test_plumed and get_mermaid by default.  A backend is an object with a run method
+       that runs a plumed command line tool and returns its return code.  Other backends (e.g. PlumedModuleBackend) can be 
+       passed to test_plumed and get_mermaid with the keyword backend.
+    """
+    def run( self, cmd, captures, cmdTimeout=None, cwd=None ) :
+        """
+           Run a plumed command and return its return code or -1 if the command does not finish within cmdTimeout seconds
+
+           The command is started in a new session so that the processes that it starts are also stopped when it takes too long.
+
+           Keyword arguments:
+           cmd -- A list that contains the command to run
+           captures -- The _OutputCapture objects for the stdout and stderr of the command.  If this is None the output is discarded
+           cmdTimeout -- The maximum time that the command can run for
+           cwd -- The directory to run the command in
+        """
+        deadline = None if cmdTimeout is None else time.monotonic() + cmdTimeout
+        output = subprocess.PIPE if captures is not None else subprocess.DEVNULL
+        process = subprocess.Popen( cmd, stdout=output, stderr=output, cwd=cwd, start_new_session=True )
+        # The output is read from the pipes as it is produced and written straight to the archives
+        pumps = [] if captures is None else [ threading.Thread( target=_pump, args=( process.stdout, captures[0] ) ), threading.Thread( target=_pump, args=( process.stderr, captures[1] ) ) ]
+        for pump in pumps : pump.start()
+        try:
+            returnCode = process.wait( timeout=cmdTimeout )
+        except subprocess.TimeoutExpired:
+            _killGroup( process )
+            returnCode=-1
+        except BaseException :
+            _killGroup( process )
+            raise
+        for pump in pumps : 
+            pump.join( None if deadline is None else max( 0, deadline - time.monotonic() ) )
+            # Processes that were started by the command and that are still running keep the pipes open
+            if pump.is_alive() : 
+               _killGroup( process )
+               pump.join()
+               returnCode=-1
+        return returnCode
+
+_subprocess_backend = SubprocessBackend()
+
+# In-process memo of the syntax dictionaries that have been read in.  The keys are the paths 
+# of the syntax.json files and the values are (mtime, size, dictionary) tuples
+_syntax_cache = {}
+# Memo of the output of plumed info --root for each executible
+_root_cache = {}
+
+def _getPlumedRoot( executible ) :
+    """
+       Get the root directory of a plumed installation by running plumed info --root
+
+       The output is stored so that we only call plumed once for each executible.  If the executible
+       is modified (e.g. because PLUMED is reinstalled) plumed info --root is run again.
+
+       Keyword arguments:
+       executible -- A string that contains the command for running plumed
+    """
+    exepath = shutil.which( executible ) or executible
+    try : exestamp = os.stat( exepath ).st_mtime_ns
+    except OSError : exestamp = None
+    if executible in _root_cache and _root_cache[executible][0]==(exepath, exestamp) : return _root_cache[executible][1]
+    cmd = [executible, 'info', '--root']
+    plumed_info = subprocess.run(cmd, capture_output=True, text=True )
+    root = plumed_info.stdout.strip()
+    _root_cache[executible] = ( (exepath, exestamp), root )
+    return root
+
+def getPlumedSyntax( plumedexe, cachedir=None ) :
     """
        Get the plumed syntax information from the syntax.json file
 
        This function reurns a dictionary that contains all the information on the plumed syntax that was read in from the 
-       syntax.json file.
+       syntax.json file.  The dictionary is cached in memory and the cached version is reused until the modification time or the 
+       size of the syntax.json file changes.  The same dictionary is returned to all callers so it should not be modified.
 
        Keyword arguments:
        plumedexe -- The plumed executibles that were used.  The last one is the one whose syntax.json file we retrieve
+       cachedir -- A directory in which to store a pickled snapshot of the syntax dictionary that can be read quickly by later processes.  
+                   If this is None the environment variable PLUMEDTOHTML_CACHE_DIR is used.  If that is not set no snapshot is stored.
     """
-    cmd = [plumedexe[-1], 'info', '--root']
-    plumed_info = subprocess.run(cmd, capture_output=True, text=True )
-    keyfile = plumed_info.stdout.strip() + "/json/syntax.json"
-    with open(keyfile) as f :
-        try:
-           keyword_dict = json.load(f)
-        except ValueError as ve:
-           raise InvalidJSONError(ve)
+    keyfile = _getPlumedRoot( plumedexe[-1] ) + "/json/syntax.json"
+    fstat = os.stat( keyfile )
+    stamp = (fstat.st_mtime_ns, fstat.st_size)
+    if keyfile in _syntax_cache and _syntax_cache[keyfile][0]==stamp : return _syntax_cache[keyfile][1]
+
+    if cachedir is None : cachedir = os.environ.get("PLUMEDTOHTML_CACHE_DIR")
+    keyword_dict, snapshot = None, None
+    if cachedir :
+       # The name of the snapshot depends on the location of syntax.json and the python version
+       snaphash = hashlib.sha1( (os.path.abspath(keyfile) + sys.version).encode() ).hexdigest()
+       snapshot = os.path.join( cachedir, "syntax." + snaphash + ".pickle" ) 
+       try :
+          with open( snapshot, "rb" ) as f :
+               snapstamp, snapdata = pickle.load( f )
+          if snapstamp==stamp : keyword_dict = snapdata
+       except (OSError, pickle.UnpicklingError, EOFError, ValueError) : 
+          keyword_dict = None
+
+    if keyword_dict is None :
+       with open(keyfile) as f :
+           try:
+              keyword_dict = json.load(f)
+           except ValueError as ve:
+              raise InvalidJSONError("invalid json in " + keyfile + ": " + str(ve)) from ve
+       if snapshot is not None :
+          # Write to a tempory file and rename so that other processes never read a partial snapshot
+          os.makedirs( cachedir, exist_ok=True )
+          fd, tmpname = tempfile.mkstemp( dir=cachedir, suffix=".tmp" )
+          with os.fdopen( fd, "wb" ) as f : 
+               pickle.dump( (stamp, keyword_dict), f, protocol=pickle.HIGHEST_PROTOCOL )
+          os.replace( tmpname, snapshot )
+
+    _syntax_cache[keyfile] = ( stamp, keyword_dict )
     return keyword_dict  
 
 def test_and_get_html( inpt, name, actions=set({}), test_plumed_kwargs={}) :
@@ -70,20 +243,22 @@ def test_and_get_html( inpt, name, actions=set({}), test_plumed_kwargs={}) :
                if "FILENAME=" in word : filename, keepfile = word.replace("FILENAME=",""), True
     # Manage incomplete inputs
     test_inpt, incomplete = manage_incomplete_inputs( inpt )
-    # Write the plumed input to a file
-    iff = open( filename, "w+")
-    iff.write(test_inpt + "\n")
-    iff.close()
-    # Now do the test
-    broken = test_plumed( "plumed", filename, header="", printjson=True, **test_plumed_kwargs)
-    # Retrieve the html that is output by plumed
-    html = get_html( inpt, filename, filename, ("master",), (broken,), ("plumed",), actions=actions )
-    # Remove the tempory files that we created
-    if not keepfile : os.remove(filename)
-
+    # The input and json files are put in a directory that is only used by this call.  Plumed is still run in the directory 
+    # that contains filename so that the paths to any files that are read by the input are correct.  The files with the stdout 
+    # and stderr are output next to filename as the badges in the html link to them there.
+    rundir = str(pathlib.PurePosixPath(filename).parent)
+    with tempfile.TemporaryDirectory() as scratch :
+         testfile = filename if keepfile else os.path.join( scratch, os.path.basename(filename) )
+         # Write the plumed input to a file
+         with open( testfile, "w+") as iff : iff.write(test_inpt + "\n")
+         # Now do the test
+         broken = test_plumed( "plumed", testfile, header="", printjson=True, jsondir=scratch + "/", rundir=rundir, artifactname=filename, **test_plumed_kwargs)
+         # Retrieve the html that is output by plumed
+         html = get_html( inpt, filename, filename, ("master",), (broken,), ("plumed",), actions=actions, jsonname=os.path.join( scratch, os.path.basename(filename) ) )
     return html
 
-def test_plumed( executible, filename, header="", printjson=False, jsondir="./", cmdTimeout:"None|float"=None, ghmarkdown=True ) :
+def test_plumed( executible, filename, header="", printjson=False, jsondir="./", cmdTimeout:"None|float"=None, ghmarkdown=True, cache=None, rundir=None,
+        maxlines=1000, archive="zip", compresslevel=None, artifacts=True, backend=None, artifactname=None ) :
     """
         Test if plumed can parse this input file
 
@@ -96,9 +271,39 @@ def test_plumed( executible, filename, header="", printjson=False, jsondir="./",
         printjson    -- Set true if you want to used plumed to print the files containing the expansions of shortcuts and the value dictionary 
         jsondir      -- The directory in which to output the files containing the expansions of the shortcuts and the value dictionaries
         cmdTimeout   -- Set the timeout for the plumed test 
+        cache        -- A ResultCache that is used to store the results of the test so that plumed is not run again on the same input
+        rundir       -- The directory in which plumed is run.  By default this is the directory that contains filename
+        maxlines     -- The number of lines of stderr to show in the markdown page
+        archive      -- How to store the raw stdout and stderr.  This can be zip, gzip or none (for uncompressed text files)
+        compresslevel -- The compression level to use for the zip or gzip archives
+        artifacts    -- Set false to only get the return code.  No files with the stdout and stderr are output
+        backend      -- The object that runs plumed.  By default plumed is run in a subprocess (see SubprocessBackend)
+        artifactname -- The name to use in place of filename for the files that contain the stdout and stderr.  Use this if filename is a scratch file
+    """
+    if backend is None : backend = _subprocess_backend
+    test = _setup_test( executible, filename, printjson, jsondir, cache, rundir, maxlines, archive, compresslevel, artifacts, artifactname )
+    captures = _open_captures( test )
+    try :
+       if test["cached"] is not None : returnCode = _restore_test( test, captures )
+       else :
+          backups = set( glob.glob( os.path.join(test["run_folder"], "bck.*") ) )
+          returnCode = backend.run( test["cmd"], captures, cmdTimeout, test["run_folder"] )
+          _remove_backups( test["run_folder"], backups )
+    finally :
+       for capture in captures : capture.close()
+    _finish_test( test, returnCode, captures, header, ghmarkdown, cache )
+    return returnCode
+
+def _setup_test( executible, filename, printjson, jsondir, cache, rundir, maxlines=1000, archive="zip", compresslevel=None, artifacts=True, artifactname=None ) :
+    """
+       Get the command that test_plumed runs and the names of the files that are output
+
+       This function returns a dictionary that contains the command, the directory to run it in, the number of processes that 
+       the command uses, the names of the output files and the result from the cache if the test has been run before.
     """
     # Get the information for running the code
-    run_folder = str(pathlib.PurePosixPath(filename).parent)
+    if rundir is None : rundir = str(pathlib.PurePosixPath(filename).parent)
+    run_folder = os.path.expanduser( rundir )
     plumed_file = os.path.basename(filename)
     # Read in the plumed inpt
     nreplicas, natoms, ifile = 1, 100000, open( filename ) 
@@ -108,62 +313,101 @@ def test_plumed( executible, filename, header="", printjson=False, jsondir="./",
                 if "NREPLICAS=" in word : nreplicas = word.replace("NREPLICAS=","")
                 elif "NATOMS=" in word : natoms = word.replace("NATOMS=","")
     ifile.close()
-    cmd = [executible, 'driver', '--plumed', plumed_file, '--natoms', str(natoms), '--parse-only', '--kt', '2.49']
+    cmd = [executible, 'driver', '--plumed', os.path.relpath(filename, run_folder), '--natoms', str(natoms), '--parse-only', '--kt', '2.49']
     # Add everything to ensure we can run with replicas if needs be
     if int(nreplicas)>1 : cmd = ['mpirun', '--oversubscribe', '-np', str(nreplicas)] + cmd + ['--multi', str(nreplicas)]
     if printjson :
-       plumed_file = os.path.basename(filename)
        # Add the shortcutfile output if the user has asked for it 
        cmd = cmd + ['--shortcut-ofile', jsondir + plumed_file + ".json"]
        # Add the value dictionary if the user has asked for it
        cmd = cmd + ['--valuedict-ofile', jsondir + plumed_file + "_values.json"] 
-    # raw std output - to be zipped
-    outfile=filename + "." + executible + ".stdout.txt"
-    # raw std error - to be zipped
-    errtxtfile=filename + "." + executible + ".stderr.txt"
-    # std error markdown page (with only the first 1000 lines of stderr.txt)
-    errfile=filename + "." + executible + ".stderr.md"
-    with open(outfile,"w") as stdout:
-        with open(errtxtfile,"w") as stderr:
-             with cd(run_folder):
-                 for bkpf in glob.glob("bck.*") : 
-                     if os.path.isfile(bkpf) : os.remove(bkpf)
-                 try:
-                     plumed_out = subprocess.run(cmd, text=True, stdout=stdout, stderr=stderr, timeout=cmdTimeout )
-                     returnCode = plumed_out.returncode
-                 except subprocess.TimeoutExpired:
-                     returnCode=-1
+    test = { "executible": executible, "filename": filename, "plumed_file": plumed_file, "run_folder": run_folder, "cmd": cmd, "nprocs": int(nreplicas), "printjson": printjson }
+    # How the output is stored
+    test["maxlines"], test["archive"], test["compresslevel"], test["artifacts"] = maxlines, archive, compresslevel, artifacts
+    test["artifactname"] = filename if artifactname is None else artifactname
+    # raw std output - to be archived
+    test["outfile"] = test["artifactname"] + "." + executible + ".stdout.txt"
+    # raw std error - to be archived
+    test["errtxtfile"] = test["artifactname"] + "." + executible + ".stderr.txt"
+    # std error markdown page (with only the first maxlines lines of stderr.txt)
+    test["errfile"] = test["artifactname"] + "." + executible + ".stderr.md"
+    # json files that are output by plumed
+    test["jsonfiles"] = [ os.path.join(run_folder, jsondir + plumed_file + ".json"), os.path.join(run_folder, jsondir + plumed_file + "_values.json") ]
+    # Check if the result of this test is in the cache
+    test["cachekey"], test["cached"] = None, None
+    if cache is not None :
+       test["cachekey"] = cache.key( executible, filename, natoms, nreplicas, printjson, rundir=run_folder )
+       test["cached"] = cache.get( test["cachekey"] )
+    return test
+
+def _open_captures( test ) :
+    """
+       Get the captures for the stdout and stderr of a test
+    """
+    archive = test["archive"] if test["artifacts"] else None
+    # All the output is needed if the result is going to be stored in the cache
+    keep = test["cachekey"] is not None and test["cached"] is None
+    if archive not in [None, "zip", "gzip", "none"] : raise ValueError("archive should be zip, gzip or none not " + str(archive) )
+    outcapture = _OutputCapture( test["outfile"], archive, test["compresslevel"], 0, keep )
+    errcapture = _OutputCapture( test["errtxtfile"], archive, test["compresslevel"], test["maxlines"] if test["artifacts"] else 0, keep )
+    return outcapture, errcapture
+
+def _restore_test( test, captures ) :
+    """
+       Recreate the files that plumed would have output from a result in the cache and return the return code
+    """
+    cached = test["cached"]
+    captures[0].write( cached["stdout"].encode() )
+    captures[1].write( cached["stderr"].encode() )
+    for i in range(len(test["jsonfiles"])) : 
+        if test["printjson"] and cached["json"][i] is not None :
+           with open( test["jsonfiles"][i], "w" ) as jf : jf.write( cached["json"][i] )
+    return cached["returncode"]
+
+def _remove_backups( run_folder, backups ) :
+    """
+       Remove the backups of output files that plumed made during a test.  The files in backups were there before the test started
+    """
+    for bkpf in glob.glob( os.path.join(run_folder, "bck.*") ) : 
+        if bkpf in backups or not os.path.isfile(bkpf) : continue
+        # Another test that is running in the same directory may have removed the file already
+        try : os.remove(bkpf)
+        except FileNotFoundError : pass
+
+def _finish_test( test, returnCode, captures, header, ghmarkdown, cache ) :
+    """
+       Store the result of a test in the cache and write the markdown page with the stderr 
+    """
+    executible, filename, plumed_file = test["executible"], test["artifactname"], os.path.basename( test["artifactname"] )
+    errfile, maxlines = test["errfile"], test["maxlines"]
+    # Store the result in the cache.  Tests that timed out are not stored
+    if test["cachekey"] is not None and test["cached"] is None and returnCode!=-1 :
+       result = { "returncode": returnCode, "json": [] }
+       result["stdout"], result["stderr"] = captures[0].text(), captures[1].text()
+       for jfile in test["jsonfiles"] : 
+           if test["printjson"] and os.path.exists( jfile ) :
+              with open( jfile, "r" ) as jf : result["json"].append( jf.read() )
+           else : result["json"].append( None )
+       cache.put( test["cachekey"], result )
+    if not test["artifacts"] : return
                     
     # write header and preamble to errfile
+    ext = _OutputCapture.extensions[test["archive"]]
+    zipped = _OutputCapture.descriptions[test["archive"]]
     with open(errfile,"w") as stderr:
         if len(header)>0 : 
             print(header,file=stderr)
         print("Stderr for source: ",re.sub("^data/","",filename),"  ",file=stderr)
-        print("Download: [zipped raw stdout](" + plumed_file + "." + executible + ".stdout.txt.zip) - [zipped raw stderr](" + plumed_file + "." + executible + ".stderr.txt.zip) ",file=stderr)
+        print("Download: [" + zipped + "raw stdout](" + plumed_file + "." + executible + ".stdout.txt" + ext + ") - [" + zipped + "raw stderr](" + plumed_file + "." + executible + ".stderr.txt" + ext + ") ",file=stderr)
         if ghmarkdown : print("{% raw %}\n<pre style=\"overflow:scroll;\">",file=stderr)
         else : print("<pre style=\"overflow:scroll;\">",file=stderr)
-        # now we print the first 1000 lines of errtxtfile to errfile
-        with open(errtxtfile, "r") as stdtxterr:
-          # line counter
-          lc = 0
-          # print comment
-          print("#! Only the first 1000 rows of the error file are shown below", file=stderr)
-          print("#! To inspect the full error file, please download the zipped raw stderr file above", file=stderr)
-          while True:
-            lc += 1
-            # read line by line
-            line = stdtxterr.readline()
-            # if end of file or max number of lines reached, break
-            if(not line or lc>1000): break
-            # print line to stderr
-            print(line.strip(), file=stderr)
-          # close stderr
-          if ghmarkdown : print("</pre>\n{% endraw %}",file=stderr)
-          else : print("</pre>\n",file=stderr)
-    # compress both outfile and errtxtfile
-    zip(outfile)
-    zip(errtxtfile)
-    return returnCode
+        # now we print the first maxlines lines of the stderr that were kept by the capture
+        print("#! Only the first " + str(maxlines) + " rows of the error file are shown below", file=stderr)
+        print("#! To inspect the full error file, please download the " + zipped + "raw stderr file above", file=stderr)
+        for line in captures[1].head : print(line.strip(), file=stderr)
+        # close stderr
+        if ghmarkdown : print("</pre>\n{% endraw %}",file=stderr)
+        else : print("</pre>\n",file=stderr)
 
 def manage_incomplete_inputs( inpt ) :
    """
@@ -179,14 +423,797 @@ def manage_incomplete_inputs( inpt ) :
       inpt -- A string containing the incomplete and complete PLUMED inputs
    """
    if "__FILL__" in inpt :
-       insolution, complete, incomplete = False, "", ""
+       insolution, complete, incomplete = False, [], []
        for line in inpt.splitlines() :
            if "#SOLUTION" in line : insolution=True
-           elif insolution : complete += line + "\n"
-           elif not insolution : incomplete += line + "\n"
-       return complete, incomplete
+           elif insolution : complete.append( line + "\n" )
+           elif not insolution : incomplete.append( line + "\n" )
+       return "".join(complete), "".join(incomplete)
    return inpt, ""
 
+@functools.lru_cache(maxsize=None)
+def _loadClass( filename, classname ) :
+    """
+       Load a lexer or formatter class from one of the files in this directory
+
+       The file is only read and executed once.  Pygments compiles the regular expressions for a lexer the first time
+       an instance of the class is created so reusing the class ensures this expensive step is only performed once.
+
+       Keyword arguments:
+       filename -- The name of the file that contains the class
+       classname -- The name of the class to load from the file
+    """
+    custom_namespace = {}
+    with open( os.path.join(os.path.dirname(__file__), filename), "rb" ) as f :
+        exec( f.read(), custom_namespace )
+    return custom_namespace[classname]
+
+class _HtmlSink :
+    """
+       A file-like object that writes html to a stream and feeds it to a parser so the html can be checked without keeping a copy of it
+
+       The html is only parsed if parse is true.  lxml is only imported if the html is parsed
+    """
+    def __init__( self, out, parse=True ) :
+        self.out = out
+        self.parser = None
+        if parse :
+           from lxml import etree
+           self.parser = etree.HTMLParser(recover=False)
+        # Feeding the parser lots of small pieces is slow so the html is passed to it in blocks
+        self.buffer, self.buffered = [], 0
+
+    def write( self, text ) :
+        self.out.write( text )
+        if self.parser is None : return
+        self.buffer.append( text )
+        self.buffered = self.buffered + len(text)
+        if self.buffered>65536 : self.flush()
+
+    def flush( self ) :
+        if self.parser is not None and self.buffered>0 : self.parser.feed( "".join(self.buffer) )
+        self.buffer, self.buffered = [], 0
+
+    def close( self ) :
+        """
+           Finish parsing and return the root element of the html or None if the html is not parsed
+        """
+        if self.parser is None : return None
+        self.flush()
+        return self.parser.close()
+
+class CLToolDispatcher :
+    """
+       Find the PLUMED command line tool that some text is the input for with a single regular expression
+
+       The regular expression matches the commands that run a tool (plumed tool, plumed --no-mpi tool, plumed-runtime tool and 
+       mpirun -np N plumed tool) and the #TOOL=tool lines at the start of the input files for tools that read files.  Longer 
+       tool names are tried first so that a tool whose name starts with the name of another tool is found correctly.
+
+       Keyword arguments:
+       cltools -- The part of the syntax dictionary that describes the command line tools
+    """
+    def __init__( self, cltools ) :
+        names = sorted( cltools.keys(), key=len, reverse=True )
+        tools = "|".join( re.escape(name) for name in names )
+        filetools = "|".join( re.escape(name) for name in names if cltools[name]["inputtype"]=="file" )
+        alternatives = []
+        if len(tools)>0 : alternatives.append( r"(?P<launcher>mpirun\s+-np\s+[0-9]+\s+)?(?P<program>plumed-runtime|plumed)\s+(?P<nompi>--no-mpi\s+)?(?P<tool>" + tools + r")(?![\w-])" )
+        if len(filetools)>0 : alternatives.append( r"#TOOL\s*=\s*(?P<filetool>" + filetools + r")(?![\w-])" )
+        self.pattern = re.compile( "|".join(alternatives) ) if len(alternatives)>0 else None
+
+    def _result( self, match ) :
+        if match is None : return None
+        groups = match.groupdict()
+        if groups.get("filetool") is not None : return { "tool": groups["filetool"], "kind": "file", "launcher": None, "program": None, "nompi": False, "end": match.end() }
+        launcher = groups["launcher"].strip() if groups["launcher"] is not None else None
+        return { "tool": groups["tool"], "kind": "arg", "launcher": launcher, "program": groups["program"], "nompi": groups["nompi"] is not None, "end": match.end() }
+
+    def find( self, text ) :
+        """
+           Find the first command or #TOOL line in some text.  
+
+           A dictionary containing the name of the tool, the kind of input (arg for a command and file for an input file), 
+           the mpirun command that is used to run the tool, the plumed program that runs the tool, whether --no-mpi was used 
+           and the position of the end of the match is returned.  If there is no match None is returned.
+        """
+        if self.pattern is None : return None
+        return self._result( self.pattern.search( text ) )
+
+    def parse( self, command ) :
+        """
+           Get the tool that a command runs.  This is the same as find but the command must start with the match
+        """
+        if self.pattern is None : return None
+        return self._result( self.pattern.match( command.lstrip() ) )
+
+class PhaseTimer :
+    """
+       Add up the wall time that is spent in each of the phases of testing inputs and generating their html
+
+       A Renderer whose timer attribute is set to a PhaseTimer adds the time it spends lexing, formatting and validating inputs to 
+       the timer.  The same timer can be used by many threads at once so the totals are the sum of the times for all the threads.
+    """
+    def __init__( self ) :
+        self.totals = collections.Counter()
+        self.counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add( self, phase, seconds ) :
+        """
+           Add seconds to the time spent in phase
+        """
+        with self._lock :
+             self.totals[phase] = self.totals[phase] + seconds
+             self.counts[phase] = self.counts[phase] + 1
+
+    @contextlib.contextmanager
+    def measure( self, phase ) :
+        """
+           Add the time that is spent in a with block to the time spent in phase
+        """
+        start = time.perf_counter()
+        try :
+           yield
+        finally :
+           self.add( phase, time.perf_counter() - start )
+
+# The lexers that can be used to tokenize PLUMED inputs.  The regex lexer is the reference implementation and the
+# linear lexer gives the same tokens in a time that grows linearly with the length of the input
+_plumed_lexers = { "regex": ("PlumedLexer.py", "PlumedLexer"), "linear": ("PlumedTokenizer.py", "PlumedTokenizer") }
+
+def _getPlumedLexer( lexer ) :
+    """
+       Create the lexer for PLUMED inputs called lexer (see _plumed_lexers)
+    """
+    if lexer not in _plumed_lexers : raise ValueError("lexer should be " + ", ".join( _plumed_lexers.keys() ) + " not " + str(lexer) )
+    return _loadClass( *_plumed_lexers[lexer] )()
+
+class Renderer :
+    """
+       A session for generating the html representations of many PLUMED inputs
+
+       The renderer owns the plumed executibles, the syntax dictionary, the lexers and the formatter class so that all
+       the setup is only done once when many inputs are rendered.
+
+       Keyword arguments:
+       plumedexe -- The plumed executibles that are used to test inputs.  The last one is the one that is used to create the input file annotations
+       cachedir -- A directory in which to store a snapshot of the syntax dictionary (see getPlumedSyntax)
+       lexer -- The lexer to use for PLUMED inputs.  Either "regex" for the reference lexer or "linear" for the lexer whose time grows linearly with the length of the input
+       expansion_depth -- The number of levels of shortcuts in shortcuts whose expansions are shown.  By default all the levels are shown (see resolve_expansions)
+       expansion_size -- The number of characters in an input with its shortcuts expanded above which no more expansions are shown.  By default there is no limit
+    """
+    def __init__( self, plumedexe=("plumed",), cachedir=None, lexer="regex", expansion_depth=None, expansion_size=None ) :
+        self.plumedexe = tuple(plumedexe)
+        self.keyword_dict = getPlumedSyntax( self.plumedexe, cachedir )
+        self.plumed_lexer = _getPlumedLexer( lexer )
+        self.cltool_lexer = _loadClass( "PlumedCLtoolLexer.py", "PlumedCLtoolLexer" )()
+        self.clfile_lexer = _loadClass( "PlumedCLFileLexer.py", "PlumedCLFileLexer" )()
+        self.formatter_class = _loadClass( "PlumedFormatter.py", "PlumedFormatter" )
+        self.cltool_dispatcher = CLToolDispatcher( self.keyword_dict["cltools"] )
+        self.expansion_depth, self.expansion_size = expansion_depth, expansion_size
+        # A PhaseTimer that the time spent in each phase of rendering is added to
+        self.timer = None
+
+    def _measure( self, phase ) :
+        if self.timer is None : return contextlib.nullcontext()
+        return self.timer.measure( phase )
+
+    def _highlight( self, inpt, lexer, formatter, out=None ) :
+        """
+           Get the tokens from the lexer and format them (see pygments.highlight).  The time spent on each step is added to the timer
+        """
+        if self.timer is None : return highlight( inpt, lexer, formatter, out )
+        with self.timer.measure( "lexing" ) : tokens = list( lexer.get_tokens( inpt ) )
+        with self.timer.measure( "formatting" ) : return pygments.format( tokens, formatter, out )
+
+    def render_clfile( self, inpt, name, tooltips=None, delegated=False ) :
+        """
+           Generate an html representation of the input file for a PLUMED command line tool (see get_cltoolfile_html)
+
+           Keyword arguments:
+           inpt -- A string containing the input you want to get the html for
+           name -- The name to use for this input in the html
+           tooltips -- A dictionary to collect the tooltips in (see get_html)
+           delegated -- Set true to output data attributes instead of inline onclick handlers (see get_html)
+        """
+        # need to get the name of the command 
+        if inpt.splitlines()[0].split("=")[0]!="#TOOL" : raise Exception("could not find tool that this input file is for")
+        tool = inpt.splitlines()[0].split("=")[1]
+        defstr, keyword_dict = inpt, self.keyword_dict
+        # Find the default values in the dictionary
+        for key, dicti in keyword_dict["cltools"][tool]["syntax"].items() :
+            if "default" not in dicti.keys() or dicti["default"]=="off" or key in inpt : continue
+            defstr += "\n" + key + " " + dicti["default"]
+        if defstr!=inpt :
+            inpt = "#NODEFAULT plumed\n" + inpt + " \n#DEFAULT plumed\n" + defstr + " \n#ENDDEFAULT plumed\n"
+        # Setup the formatter 
+        valuedict, actions = {}, set()
+        plumed_formatter = self.formatter_class( keyword_dict=keyword_dict["cltools"], input_name=name, hasload=False, broken=False, auxinputs=[], auxinputlines=[], valuedict=valuedict, actions=actions, checkaction="", tooltips=tooltips, delegated=delegated )  
+        return self._delegate( name, self._highlight( inpt, self.clfile_lexer, plumed_formatter ), delegated )
+
+    def render_cltool( self, inpt, name, tooltips=None, delegated=False ) :
+        """
+           Generate an html representation of the input to PLUMED command line tool (see get_cltoolarg_html)
+
+           Keyword arguments:
+           inpt -- A string containing the input you want to get the html for
+           name -- The name to use for this input in the html
+           tooltips -- A dictionary to collect the tooltips in (see get_html)
+           delegated -- Set true to output data attributes instead of inline onclick handlers (see get_html)
+        """
+        # Get the cltool that we are using
+        command = self.cltool_dispatcher.parse( inpt )
+        if command is None or command["kind"]!="arg" :
+           raise Exception("first word in the command should be plumed or plumed-runtime and it should be followed by the name of a command line tool")
+        tool = command["tool"]
+        fileoutstr, defstr, keyword_dict = "", inpt, self.keyword_dict
+        if ">" in inpt :
+           fileoutstr = ">" + inpt.split(">")[1]
+           defstr = inpt.split(">")[0]
+        # Find the default values in the dictionary
+        options = inpt.lstrip()[command["end"]:].split()
+        ishelp = len(options)>0 and (options[0]=="-h" or options[0]=="--help")
+        if not ishelp and keyword_dict["cltools"][tool]["inputtype"]!="file" : 
+           for key, dicti in keyword_dict["cltools"][tool]["syntax"].items() :
+               if "default" not in dicti.keys() or dicti["default"]=="off" or key in inpt : continue
+               defstr += " " + key + " " + dicti["default"]
+           if (defstr+fileoutstr)!=inpt :
+               inpt = "#NODEFAULT plumed\n" + inpt + " \n#DEFAULT plumed\n" + defstr + fileoutstr + " \n#ENDDEFAULT plumed\n"
+        # Setup the formatter
+        valuedict, actions = {}, set()
+        plumed_formatter = self.formatter_class( keyword_dict=keyword_dict["cltools"], input_name=name, hasload=False, broken=False, auxinputs=[], auxinputlines=[], valuedict=valuedict, actions=actions, checkaction="", tooltips=tooltips, delegated=delegated )  
+        return self._delegate( name, self._highlight( inpt, self.cltool_lexer, plumed_formatter ), delegated )
+
+    def _delegate( self, name, html, delegated ) :
+        """
+           Put the html for the input to a command line tool in a container whose clicks are handled by the javascript in the header if delegated is true
+        """
+        if not delegated : return html
+        return '<div class="plumedInputContainer" data-plumed="' + name + '">' + html + '</div>'
+
+    def render_input( self, inpt, name, outloc, tested, broken, usejson=None, maxchecks=None, actions=None, ghmarkdown=True, checkaction="", checkactionkeywords=None, jsonname=None, out=None, validate="index", tooltips=None, auxmodals=None, lexer=None, delegated=False, expansion_depth=None, expansion_size=None ) :
+        """
+           Generate the html representation of a PLUMED input file (see get_html)
+
+           Keyword arguments:
+           inpt -- A string containing the PLUMED input
+           name -- The name to use for this input in the html
+           outloc -- The location of the output files that were generated by test_plumed relative to the file that contains the input
+           tested -- The versions of plumed that were testd
+           broken -- The outcome of running test plumed on the input
+           usejson -- Bool that tells you whether or not to look for json files that are generated by plumed driver
+           maxchecks -- Maximum number of checks to perform on plumed input.  Set this to reduce computational expense
+           actions -- Set to store all the actions that have been used in the input
+           jsonname -- The name of the file that was tested by test_plumed if the json files are not called name.json and name_values.json
+           out -- A stream to write the html to.  If this is None the html is returned as a string
+           validate -- How to check the html (see get_html)
+           tooltips -- A dictionary to collect the tooltips in (see get_html)
+           auxmodals -- A dictionary of the modals for the auxiliary input files that are on the page (see get_html)
+           lexer -- The lexer to use for this input instead of the lexer of the renderer (see Renderer)
+           delegated -- Set true to output data attributes instead of inline onclick handlers (see get_html)
+           expansion_depth -- The number of levels of shortcuts to expand instead of the limit for the renderer (see Renderer)
+           expansion_size -- The size of the expanded input to use instead of the limit for the renderer (see Renderer)
+        """
+        if validate not in ["index", "full", None] : raise ValueError("validate should be index, full or None not " + str(validate) )
+        plumed_lexer = self.plumed_lexer if lexer is None else _getPlumedLexer( lexer )
+        if actions is None : actions = set({})
+        if jsonname is None : jsonname = name
+        if expansion_depth is None : expansion_depth = self.expansion_depth
+        if expansion_size is None : expansion_size = self.expansion_size
+        if checkactionkeywords is None : checkactionkeywords = set({})
+
+        # Check if we are looking for json files
+        if usejson is None :
+           searchjson = False
+           if not any(broken) : searchjson = True
+        else : searchjson = usejson
+
+        # If we find the fill command then split up the input file to find the solution
+        inpt, incomplete = manage_incomplete_inputs( inpt )
+
+        # Create a list of all the auxiliary input files that are needed by the plumed input 
+        inputfiles, inputfilelines, nreplicas = [], [], 1
+        for line in inpt.splitlines() :
+            if "#SETTINGS" in line :
+               for word in line.split() :
+                   if "NREPLICAS=" in word : 
+                       nreplicas = int(word.replace("NREPLICAS=",""))
+                   elif "MOLFILE=" in word : 
+                       molfile = word.replace("MOLFILE=","")
+                       if os.path.isfile(molfile) : 
+                          # Show the first and last five lines of the file.  Only these lines are read from the file
+                          inputfiles.append(molfile)
+                          inputfilelines.append("1-5")
+                          inputfilelines.append("-5")
+                       else :
+                          warnings.warn("file " + molfile + " found in MOLFILE setting but file is not present")
+                   elif "INPUTFILES=" in word : 
+                       for n in word.replace("INPUTFILES=","").split(",") : 
+                          if os.path.isfile(n) : inputfiles.append( n )
+                          else : raise Exception("file " + n + " found in list of INPUTFILES but file is not present")
+                   elif "INPUTFILELINES=" in word : 
+                       inputfilelines = word.replace("INPUTFILELINES=","").split(",")
+
+        # Check for include files
+        foundincludedfiles, srcdir = True, str(pathlib.PurePosixPath(name).parent)
+        if not any(broken) and "INCLUDE" in inpt : foundincludedfiles, inpt = resolve_includes( srcdir, inpt, nreplicas, foundincludedfiles )
+
+        # Check if there is a LOAD command in the input
+        found_load = "LOAD " in inpt
+
+        # Check for shortcut file and build the modified input to read the shortcuts
+        if os.path.exists( jsonname + '.json' ) and searchjson :
+           # Read json file containing shortcuts
+           with open(jsonname + '.json') as f :
+               try:
+                  shortcutdata = json.load(f)
+               except json.JSONDecodeError as ve:
+                  raise Exception("invalid json for shortcut dictionary", ve)
+           # Put everything in to resolve the expansions.  Shortcuts in shortcuts are expanded up to the limits on the depth and size of the expansion
+           final_inpt = resolve_expansions( inpt, shortcutdata, maxdepth=expansion_depth, maxsize=expansion_size )
+        else : final_inpt = inpt  
+        # Remove the tempory files that we created
+        if os.path.exists( jsonname + '.json' ) : os.remove( jsonname + ".json")  
+
+        # Check for value dictionary to use to create labels
+        if os.path.exists( jsonname + '_values.json') and searchjson :
+           with open( jsonname + '_values.json') as f :
+               try:
+                  valuedict = json.load(f)
+               except json.JSONDecodeError as ve:
+                  raise Exception("invalid json for value dictionary", ve)
+        else : valuedict = {}
+        # Remove the tempory files that we created
+        if os.path.exists( jsonname + '_values.json') : os.remove( jsonname + "_values.json")
+
+        # Setup the formatter
+        plumed_formatter = self.formatter_class( keyword_dict=self.keyword_dict, input_name=name, hasload=found_load, broken=any(broken), auxinputs=inputfiles, auxinputlines=inputfilelines, valuedict=valuedict, actions=actions, checkaction=checkaction, tooltips=tooltips, auxmodals=auxmodals, delegated=delegated )
+
+        # Now generate html of input.  The html is written straight to out (or to a string if out is None).  If we
+        # are doing the full validation it is parsed as it is written so that we can check that it is valid
+        sink = _HtmlSink( StringIO() if out is None else out, parse=(validate=="full") )
+        # The html is only parsed by lxml for the full validation so the errors from the parser are only caught then
+        syntaxerrors = ()
+        if validate=="full" :
+           from lxml import etree
+           syntaxerrors = etree.XMLSyntaxError
+        try :
+           # The javascript in the header finds the containers for the inputs that use delegated handlers from the data-plumed attribute
+           if delegated : sink.write( f'<div class="plumedInputContainer" data-plumed="{name}">\n' )
+           else : sink.write( '<div class="plumedInputContainer">\n' )
+           sink.write( '<div class="plumedpreheader">\n' )
+           sink.write( f'<div class="headerInfo" id="value_details_{name}"> Click on the labels of the actions for more information on what each action computes </div>\n' )
+           plumed_formatter.addId( "div", "value_details_" + name )
+           sink.write( '<div class="containerBadge">\n' )
+           for i in range(len(tested)) :
+               sink.write( '<div class="headerBadge">' )
+               btype = 'passing-green.svg'
+               if broken[i] :
+                  btype = 'failed-red.svg'
+               #this if can be collapsed in a f'<a href="{"" if ghmarkdown else "../"}{outloc}.{self.plumedexe[i]}.stderr">'
+               #but like this it might be clearer, what do you think?
+               if ghmarkdown :
+                  sink.write( f'<a href="{outloc}.{self.plumedexe[i]}.stderr">' )
+               else :
+                  sink.write( f'<a href="../{outloc}.{self.plumedexe[i]}.stderr">' )
+               sink.write( f'<img src="https://img.shields.io/badge/{tested[i]}-{btype}" alt="tested on{tested[i]}" />' )
+               sink.write( '</a>' )
+               sink.write( '</div>\n' )
+
+           if found_load :
+              sink.write( '<div class="headerBadge">' )
+              sink.write( '<img src="https://img.shields.io/badge/with-LOAD-yellow.svg" alt="tested on master" />' )
+              sink.write( '</div>\n' )
+
+           if len(incomplete)>0 : 
+              sink.write( '<div class="headerBadge">' )
+              sink.write( f'<img class="toggler" src="https://img.shields.io/badge/{tested[-1]}-incomplete-yellow.svg" alt="tested on {tested[-1]}"' )
+              if delegated : sink.write( f' data-hold="{name}"/>' )
+              else : sink.write( f" onmouseup='toggleDisplay(\"{name}\")' onmousedown='toggleDisplay(\"{name}\")'/>" )
+              plumed_formatter.addReference( "div", name )
+              sink.write( "</div>\n" )
+
+           sink.write( '</div>\n</div>\n' )
+
+           if len(incomplete)>0 : 
+              # This creates the input with the __FILL__ 
+              sink.write( "<div id=\"" + name + "_short\">\n" )
+              plumed_formatter.addId( "div", name + "_short" )
+              self._highlight( incomplete, plumed_lexer, plumed_formatter, sink )
+              sink.write( "</div>\n" )
+              # This is the solution with the commplete input
+              sink.write( "<div style=\"display:none;\" id=\"" + name + "_long\">" )
+              plumed_formatter.addId( "div", name + "_long" )
+              plumed_formatter.egname = plumed_formatter.egname + "_sol"
+              self._highlight( final_inpt, plumed_lexer, plumed_formatter, sink )
+              sink.write( '</div>\n' )
+           else : 
+              self._highlight( final_inpt, plumed_lexer, plumed_formatter, sink )
+           #close the '<div class="plumedInputContainer">\n'
+           sink.write( '</div>\n' )
+           with self._measure( "validation" ) : root = sink.close()
+        # Test output is valid parsable html
+        except syntaxerrors as e:
+           raise Exception("Generated html is invalid as " + str(e.error_log) + " plumed input is \n\n" + final_inpt ) from e
+        # Now remove keywords that appear in examples
+        mykeywords = plumed_formatter.getCheckActionKeywords()
+        for key in mykeywords : 
+            if key in checkactionkeywords :
+               checkactionkeywords.remove(key)
+
+        # Check that everything that is shown when something is clicked is in the html using the ids that the formatter recorded
+        if validate=="index" : 
+           with self._measure( "validation" ) : plumed_formatter.checkReferences()
+        if validate!="full" : 
+           if out is None : return sink.out.getvalue()
+           return
+        with self._measure( "validation" ) : self._validate( root, maxchecks )
+        if out is None : return sink.out.getvalue()
+
+    def _validate( self, root, maxchecks ) :
+        """
+           Check that everything that is shown when something in the parsed html is clicked is in the html
+        """
+        from lxml import etree
+
+        # For the full validation find all the elements in the parsed html that have ids so we do not need to search the html for each one
+        elements, ids = list( root.iter( etree.Element ) ), set({})
+        for val in elements :
+            if "id" in val.attrib : ids.add( (val.tag, val.attrib["id"]) )
+        # Check everything that is marked as a clickable value has something that will appear
+        # when you click it
+        nchecks, bolds = 0, [val for val in elements if val.tag=="b"]
+        for val in bolds :
+            if "onclick" in val.attrib or "data-value" in val.attrib :
+               if "onclick" in val.attrib : vallabels = val.attrib["onclick"].split("\"")
+               # With delegated handlers the div for the value details is found from the container of the label
+               else : vallabels = [ "", next( (el.attrib["data-plumed"] for el in val.iterancestors() if "data-plumed" in el.attrib), "" ), "", val.attrib["data-value"] ]
+               nchecks = nchecks + 1
+               if maxchecks is not None and nchecks>maxchecks : 
+                  warnings.warn("Only checked the html for the first " + str(maxchecks) + " of the " + str(len(bolds)) + " labels in input file to reduce computational expense. The output is most likely fine but has not been checked as carefully as inputs with fewer values")
+                  break
+               if ("span", vallabels[3]) not in ids : warnings.warn("Problems with generated as label hidden box for label " + vallabels[3] + " is missing")
+               if ("div", "value_details_" + vallabels[1]) not in ids : raise Exception("Generated html is invalid as there is no place to show data for " + vallabels[1])
+
+        # Now check the togglers
+        nchecks, togglers = 0, [val for val in elements if "toggler" in val.attrib.get("class","").split()]
+        for val in togglers :
+            nchecks = nchecks + 1 
+            if maxchecks is not None and nchecks>maxchecks : 
+               warnings.warn("Only checked the html for the first " + str(maxchecks) + " of the " + str(len(togglers)) + " shortcuts in the input file to reduce computational expense. The output is most likely fine but has not been checked as carefully as inputs with fewer shortcuts")
+               break
+            if "onclick" in val.attrib or "data-toggle" in val.attrib :
+               switchval = val.attrib["onclick"].split("\"")[1] if "onclick" in val.attrib else val.attrib["data-toggle"]
+               if ("span", switchval + "_long") not in ids : raise Exception("Generated html is invalid as could not find " + switchval + "_long") 
+               if ("span", switchval + "_short") not in ids : raise Exception("Generated html is invalid as could not find " + switchval + "_short")
+            elif "onmousedown" in val.attrib or "data-hold" in val.attrib :
+               switchval = val.attrib["onmousedown"].split("\"")[1] if "onmousedown" in val.attrib else val.attrib["data-hold"]
+               if ("div", switchval + "_long") not in ids : raise Exception("Generated html is invalid as could not find " + switchval + "_long")
+               if ("div", switchval + "_short") not in ids : raise Exception("Generated html is invalid as could not find " + switchval + "_short")
+            else : raise Exception("Could not find toggler command for " + etree.tostring( val, encoding="unicode" ))
+
+    def process_markdown( self, inp, filename, plumed_names, actions, ofile, jsondir="./", ghmarkdown=True, checkaction="ignore", checkactionkeywords=None,
+            *,max_workers=1,test_plumed_kwargs={},compact_tooltips=False,manifest=None,delegated=False ) :
+        """
+           Process a string of markdown that contains PLUMED input files (see processMarkdownString)
+
+           The markdown is read one line at a time.  The tests on each PLUMED input are started on a pool of max_workers threads as soon as the 
+           end of the input is found.  The html for each input is output as soon as its tests are complete and the inputs before it have been 
+           output so the output does not depend on the number of workers.  The output is flushed after each input.  At most 
+           2*max_workers inputs are waiting to be output at any time so the memory that is used does not depend on the length of the markdown.
+
+           Keyword arguments:
+           inp -- the string that contains the plumed input file or an iterable of the lines of the markdown
+           filename -- a name to use for the plumed inputs we create 
+           plumed_names -- the names of the plumed executibles to use in the badges
+           actions -- names of actions used in the plumed inputs in this markdown file
+           ofile -- the file on which to output the processed markdown
+           jsondir -- The directory in which to output the files containing the expansions of the shortcuts and the value dictionaries 
+           max_workers -- The number of plumed tests that are run at the same time.  If this is 1 the tests are run one after the other
+           test_plumed_kwargs -- a dictionary of extra keywords to pass to the test_plumed utility, only "header" and "cmdTimeout" works
+           compact_tooltips -- Set true to output each tooltip description once in a table at the end of the markdown
+           manifest -- A BuildManifest that stores the output for each input so that inputs that have not changed are not tested or rendered again
+           delegated -- Set true to output data attributes instead of inline onclick handlers (see get_html)
+        """
+        if isinstance( inp, str ) : inp = inp.splitlines()
+        if checkactionkeywords is None : checkactionkeywords = set({})
+        if manifest is not None :
+           # Everything else that changes the output for an input is part of the key of its entry in the manifest
+           initialkeywords = set( checkactionkeywords )
+           options = repr( ( plumed_names, jsondir, ghmarkdown, checkaction, sorted(initialkeywords), compact_tooltips, delegated, self.expansion_depth, self.expansion_size,
+                             sorted( (k, v) for k, v in test_plumed_kwargs.items() if k not in ["cache", "backend"] ) ) )
+        import concurrent.futures
+        pool = concurrent.futures.ThreadPoolExecutor( max_workers=max_workers ) if max_workers is None or max_workers>1 else None
+        window = 2*( max_workers or os.cpu_count() or 1 )
+        nfail, tooltips, auxmodals = len(self.plumedexe)*[0], {} if compact_tooltips else None, {}
+        # The lines and inputs that are waiting to be output and the tests that have been started
+        pending, nblocks, tests, groups = collections.deque(), 0, {}, {}
+        def submit( func, *args, **kwargs ) :
+            if pool is not None : return pool.submit( func, *args, **kwargs )
+            future = concurrent.futures.Future()
+            future.set_result( func( *args, **kwargs ) )
+            return future
+        def run_after( previous, key ) :
+            # Tests with the same executible and input write to the same output files so they are run one after the other
+            if previous is not None : previous.result()
+            return test_plumed( key[0], key[1], printjson=key[2], jsondir=key[3], ghmarkdown=ghmarkdown, **test_plumed_kwargs )
+        def write_front() :
+            block, futures, graph = pending.popleft()
+            if isinstance( block, str ) : return ofile.write( block )
+            results = { key: future.result() for key, future in futures.items() }
+            graphs = { block["index"]: graph.result() } if graph is not None else {}
+            if manifest is None : return self._write_block( block, results, graphs, plumed_names, actions, ofile, jsondir, ghmarkdown, checkaction, checkactionkeywords, nfail, tooltips, auxmodals, delegated )
+            entry = block["entry"]
+            if entry is None :
+               entry = self._render_entry( block, results, graphs, plumed_names, jsondir, ghmarkdown, checkaction, initialkeywords, compact_tooltips, test_plumed_kwargs, delegated )
+               manifest.put( filename, block["key"], entry )
+            self._splice_entry( entry, actions, ofile, checkactionkeywords, nfail, tooltips, auxmodals )
+
+        try :
+           markdown = self._iter_markdown( inp, filename, jsondir )
+           while True :
+               try : item = next( markdown )
+               except StopIteration as stop :
+                  ninputs = stop.value
+                  break
+               if isinstance( item, str ) :
+                  if len(pending)==0 : ofile.write( item )
+                  else : pending.append( ( item, {}, None ) )
+                  continue
+               futures, graph, spliced = {}, None, False
+               if manifest is not None :
+                  item["key"] = manifest.key( filename, item, self.plumedexe, options )
+                  item["entry"] = manifest.get( filename, item["key"] )
+                  spliced = item["entry"] is not None
+               # Start the tests and the mermaid graph for this input unless its output is in the manifest
+               if item["graph"] is not None and not spliced : graph = submit( get_mermaid, *item["graph"], test_plumed_kwargs=test_plumed_kwargs )
+               if not spliced :
+                  for key in item["tests"] :
+                      # Inputs that share a solution file only need to be tested once
+                      if key not in tests : tests[key] = groups[key[:2]] = submit( run_after, groups.get( key[:2] ), key )
+                      futures[key] = tests[key]
+               pending.append( ( item, futures, graph ) )
+               nblocks = nblocks + 1
+               # Output everything that is ready in the order it appeared in the markdown.  If there are too many inputs waiting we wait for the first one
+               while len(pending)>0 and ( nblocks>window or all( f.done() for f in list(pending[0][1].values()) + [pending[0][2]] if f is not None ) ) :
+                   if isinstance( pending[0][0], dict ) : nblocks = nblocks - 1
+                   write_front()
+               ofile.flush()
+           while len(pending)>0 : write_front()
+        finally :
+           if pool is not None : 
+              # The tests and graphs that have not started are cancelled if there was an error.  shutdown cannot do this before python 3.9
+              for future in list( tests.values() ) + [ item[2] for item in pending if item[2] is not None ] : future.cancel()
+              pool.shutdown( wait=True )
+        self._write_tables( ofile, ghmarkdown, tooltips, auxmodals )
+        if manifest is not None : manifest.collect( filename )
+        return ninputs, nfail
+
+    def _write_markdown( self, chunks, results, graphs, plumed_names, actions, ofile, jsondir, ghmarkdown, checkaction, checkactionkeywords, compact_tooltips=False, delegated=False ) :
+        """
+           Output the markdown once all the tests have been run and all the mermaid graphs have been created and return the number of failures
+        """
+        if checkactionkeywords is None : checkactionkeywords = set({})
+        tooltips, auxmodals = {} if compact_tooltips else None, {}
+        nfail = len(self.plumedexe)*[0]
+        for block in chunks :
+            # Just copy any line that isn't part of a plumed input
+            if isinstance( block, str ) : ofile.write( block )
+            else : self._write_block( block, results, graphs, plumed_names, actions, ofile, jsondir, ghmarkdown, checkaction, checkactionkeywords, nfail, tooltips, auxmodals, delegated )
+        self._write_tables( ofile, ghmarkdown, tooltips, auxmodals )
+        return nfail
+
+    def _write_block( self, block, results, graphs, plumed_names, actions, ofile, jsondir, ghmarkdown, checkaction, checkactionkeywords, nfail, tooltips, auxmodals, delegated=False ) :
+        """
+           Output the html for one of the PLUMED inputs in the markdown once its tests have been run and add its failures to nfail
+        """
+        plumedexe = self.plumedexe
+        # Create mermaid graphs from PLUMED inputs if this has been requested
+        if block["index"] in graphs :
+           if ghmarkdown : ofile.write("```mermaid\n" + graphs[block["index"]] + "\n```\n")
+           else : ofile.write("<pre class=\"mermaid\">\n" + graphs[block["index"]] + "\n</pre>\n")
+        # Check if this is the input for a command line tool and render accordingly
+        if block["cltool"] :
+            html = self.render_cltool( block["input"], "cltool" + str(block["index"]), tooltips, delegated )
+            if ghmarkdown : ofile.write( "{% raw %}\n" + html + "\n {% endraw %} \n" )
+            else : ofile.write( html )
+        # Check if this the input file for a command line tool and render accordingly
+        if block["clfile"] :
+            html = self.render_clfile( block["input"], "cltool" + str(block["index"]), tooltips, delegated )
+            if ghmarkdown : ofile.write( "{% raw %}\n" + html + "\n {% endraw %} \n" )
+            else : ofile.write( html )
+        if not block["test"] : return
+        success = [ results[key] for key in self._markdown_tests( block, jsondir ) ]
+        for i in range(len(plumedexe)) :
+            if(success[i]!=0 and success[i]!="custom") : nfail[i] = nfail[i] + 1
+        # Use PlumedToHTML to write the input with all the bells and whistles straight to the output
+        if ghmarkdown : ofile.write( "{% raw %}\n" )
+        self.render_input(block["input"],
+                          block["solutionfile"],
+                          os.path.basename(block["solutionfile"]),
+                          plumed_names,
+                          success,
+                          usejson=(not success[-1]),
+                          actions=actions,
+                          ghmarkdown=ghmarkdown,
+                          checkaction=checkaction,
+                          checkactionkeywords=checkactionkeywords,
+                          out=ofile,
+                          tooltips=tooltips,
+                          auxmodals=auxmodals,
+                          delegated=delegated )
+        if ghmarkdown : ofile.write( "\n {% endraw %} \n" )
+
+    def _render_entry( self, block, results, graphs, plumed_names, jsondir, ghmarkdown, checkaction, checkactionkeywords, compact_tooltips, test_plumed_kwargs, delegated=False ) :
+        """
+           Output the html for one of the PLUMED inputs in the markdown on its own and get the entry for the input in a BuildManifest
+
+           The input is rendered with its own actions, keywords, tooltips and modals so that the entry does not depend on the inputs 
+           before it in the markdown.  The files containing the stdout and stderr of the tests are stored in the entry.
+        """
+        html, keywords = StringIO(), set( checkactionkeywords )
+        entry = { "index": block["index"], "nfail": len(self.plumedexe)*[0], "actions": set({}), "tooltips": {} if compact_tooltips else None, "auxmodals": {}, "artifacts": {} }
+        self._write_block( block, results, graphs, plumed_names, entry["actions"], html, jsondir, ghmarkdown, checkaction, keywords, entry["nfail"], entry["tooltips"], entry["auxmodals"], delegated )
+        entry["html"], entry["keywords"] = html.getvalue(), checkactionkeywords - keywords
+        if not block["test"] : return entry
+        ext = _OutputCapture.extensions[ test_plumed_kwargs.get("archive","zip") ]
+        for key in self._markdown_tests( block, jsondir ) :
+            for name in [ key[1] + "." + key[0] + ".stdout.txt" + ext, key[1] + "." + key[0] + ".stderr.txt" + ext, key[1] + "." + key[0] + ".stderr.md" ] :
+                if not os.path.isfile( name ) : continue
+                with open( name, "rb" ) as f : entry["artifacts"][name] = f.read()
+        return entry
+
+    def _splice_entry( self, entry, actions, ofile, checkactionkeywords, nfail, tooltips, auxmodals ) :
+        """
+           Output the html for a PLUMED input from its entry in a BuildManifest and recreate the files that were output by its tests
+        """
+        for name, content in entry["artifacts"].items() :
+            with open( name, "wb" ) as f : f.write( content )
+        ofile.write( entry["html"] )
+        for i in range(len(nfail)) : nfail[i] = nfail[i] + entry["nfail"][i]
+        actions.update( entry["actions"] )
+        checkactionkeywords.difference_update( entry["keywords"] )
+        if tooltips is not None :
+           for desc, tid in entry["tooltips"].items() : tooltips.setdefault( desc, tid )
+        for modalid, modal in entry["auxmodals"].items() : auxmodals.setdefault( modalid, modal )
+
+    def _write_tables( self, ofile, ghmarkdown, tooltips, auxmodals ) :
+        """
+           Output the modals for the auxiliary input files and the descriptions for all the tooltips if the tooltips are compact once at the end of the markdown
+        """
+        tables = ( get_modal_table( auxmodals ) if auxmodals else "" ) + ( get_tooltip_table( tooltips ) if tooltips else "" )
+        if tables=="" : return
+        if ghmarkdown : ofile.write( "{% raw %}\n" + tables + "\n {% endraw %} \n" )
+        else : ofile.write( tables )
+
+    def _markdown_tests( self, block, jsondir ) :
+        """
+           Get the (executible, solutionfile, printjson, jsondir) tuples that describe the tests that are run on an input from a markdown file
+        """
+        keys = []
+        for i in range(len(self.plumedexe)) :
+            # Json files are put in directory one up from us to ensure that
+            # PlumedToHTML finds them when we do get_html (i.e. these will be in
+            # the data directory where the calculation is run)
+            if i==len(self.plumedexe)-1 and not block["incomplete"] : keys.append( (self.plumedexe[i], block["solutionfile"], True, jsondir) )
+            else : keys.append( (self.plumedexe[i], block["solutionfile"], False, "./") )
+        return keys
+
+    def _collect_markdown( self, inp, filename, jsondir="./" ) :
+        """
+           Find the PLUMED inputs in a string of markdown
+
+           This function returns a list that contains the lines of text that are not part of PLUMED inputs and dictionaries that 
+           describe each of the PLUMED inputs and the number of PLUMED inputs (see _iter_markdown).
+
+           Keyword arguments:
+           inp -- the string that contains the plumed input file
+           filename -- a name to use for the plumed inputs we create 
+           jsondir -- The directory in which to output the files containing the expansions of the shortcuts and the value dictionaries 
+        """
+        chunks, markdown = [], self._iter_markdown( inp.splitlines(), filename, jsondir )
+        while True :
+            try : chunks.append( next( markdown ) )
+            except StopIteration as stop : return chunks, stop.value
+
+    def _iter_markdown( self, lines, filename, jsondir="./" ) :
+        """
+           Find the PLUMED inputs in the lines of some markdown
+
+           This generator yields the lines of text that are not part of PLUMED inputs and dictionaries that describe each of the 
+           PLUMED inputs in the order they appear in the markdown and returns the number of PLUMED inputs.  The files containing the 
+           inputs that plumed will test are written here.  The dictionary for each input contains the keys for the tests that must 
+           be run on it (see _markdown_tests) and the arguments for get_mermaid if a graph is required.
+
+           Keyword arguments:
+           lines -- an iterable of the lines of markdown without the newline characters
+           filename -- a name to use for the plumed inputs we create 
+           jsondir -- The directory in which to output the files containing the expansions of the shortcuts and the value dictionaries 
+        """
+        dirname = os.path.dirname(filename)
+        if dirname=="" : dirname = "." 
+
+        ninputs = 0
+        inplumed = False
+        plumed_inp = ""
+        solutionfile = None
+        incomplete = False
+        usemermaid = ""
+        for line in lines :
+           # Detect and copy plumed input files 
+           if "```plumed" in line :
+              inplumed = True
+              plumed_inp = ""
+              solutionfile = None
+              incomplete = False
+              ninputs = ninputs + 1 
+    
+           # Collect plumed input files that have been found in tutorial 
+           elif inplumed and "```" in line :
+              inplumed = False
+              block = { "index": ninputs, "mermaid": usemermaid, "incomplete": incomplete }
+              if usemermaid!="" and usemermaid!="value" and usemermaid!="force" :
+                 raise RuntimeError(usemermaid + "is invalid instruction for use mermaid")
+              usemermaid = ""
+              # Check if this is the input for a command line tool or the input file for a command line tool
+              command = self.cltool_dispatcher.find( plumed_inp )
+              block["cltool"] = command is not None and command["kind"]=="arg"
+              block["clfile"] = command is not None and command["kind"]=="file"
+              block["test"] = block["mermaid"]=="" and not block["cltool"] and not block["clfile"]
+
+              if incomplete :
+                    if solutionfile:
+                       # Read solution from solution file
+                       try:
+                          with open( dirname + "/" + solutionfile, "r" ) as sf:
+                             solution = sf.read()
+                             plumed_inp += "#SOLUTION \n" + solution
+                          solutionfile = dirname + "/" + solutionfile
+                       except:
+                          raise RuntimeError(f"error in opening {solutionfile} as solution"
+                                            f" for an incomplete input from file {filename}")
+                    else:
+                       raise RuntimeError(f"an incomplete input from file {filename}"
+                                         " does not have its solution file")
+              # Create the full input for PlumedToHTML formatter 
+              else :
+                    solutionfile = filename + "_working_" + str(ninputs) + ".dat"
+                    with open( solutionfile, "w+" ) as sf:
+                       sf.write( plumed_inp )
+              block["input"], block["solutionfile"] = plumed_inp, solutionfile
+              block["tests"] = self._markdown_tests( block, jsondir ) if block["test"] else []
+              block["graph"] = ( self.plumedexe[-1], plumed_inp, block["mermaid"]=="force" ) if block["mermaid"]!="" else None
+              yield block
+           # This finds us the solution file
+           elif inplumed and "#SOLUTIONFILE=" in line :
+              solutionfile=line.strip().replace("#SOLUTIONFILE=","")
+           elif inplumed and "#MERMAID=" in line :
+              usemermaid = line.replace("#MERMAID=","").strip()
+           elif inplumed :
+              if "__FILL__" in line :
+                 incomplete = True
+              plumed_inp += line + "\n"
+           # Just copy any line that isn't part of a plumed input
+           elif not inplumed :
+              yield line + "\n"
+
+        return ninputs
+
+# The renderers that are used by the functions below.  There is one for each tuple of plumed executibles
+_default_renderers = {}
+
+def _getDefaultRenderer( plumedexe ) :
+    """
+       Get the renderer that is used when the free functions in this module are called with plumedexe
+
+       A new renderer is created if the syntax dictionary for the installation has changed.
+    """
+    plumedexe = tuple(plumedexe)
+    if plumedexe not in _default_renderers or _default_renderers[plumedexe].keyword_dict is not getPlumedSyntax( plumedexe ) :
+       _default_renderers[plumedexe] = Renderer( plumedexe )
+    return _default_renderers[plumedexe]
+
 def get_cltoolfile_html( inpt, name, plumedexe ) :
     """
        Generate an html representation of the input file for a PLUMED command line tool
@@ -197,26 +1224,8 @@ def get_cltoolfile_html( inpt, name, plumedexe ) :
        inpt -- A string containing the input you want to get the html for
        name -- The name to use for this input in the html
        plumedexe -- The plumed executibles that were used.  The last one is the one that is used to create the input file annotations
-    """ 
-    # need to get the name of the command 
-    if inpt.splitlines()[0].split("=")[0]!="#TOOL" : raise Exception("could not find tool that this input file is for")
-    tool = inpt.splitlines()[0].split("=")[1]
-    # Create the lexer that will generate the pretty plumed input
-    lexerfile = os.path.join(os.path.dirname(__file__),"PlumedCLFileLexer.py")
-    plumed_lexer = load_lexer_from_file(lexerfile, "PlumedCLFileLexer" )
-     # Get the plumed syntax file
-    defstr, keyword_dict = inpt, getPlumedSyntax( plumedexe )
-    # Find the default values in the dictionary
-    for key, dicti in keyword_dict["cltools"][tool]["syntax"].items() :
-        if "default" not in dicti.keys() or dicti["default"]=="off" or key in inpt : continue
-        defstr += "\n" + key + " " + dicti["default"]
-    if defstr!=inpt :
-        inpt = "#NODEFAULT plumed\n" + inpt + " \n#DEFAULT plumed\n" + defstr + " \n#ENDDEFAULT plumed\n"
-    # Setup the formatter 
-    formatfile = os.path.join(os.path.dirname(__file__),"PlumedFormatter.py")
-    valuedict, actions = {}, set()
-    plumed_formatter = load_formatter_from_file(formatfile, "PlumedFormatter", keyword_dict=keyword_dict["cltools"], input_name=name, hasload=False, broken=False, auxinputs=[], auxinputlines=[], valuedict=valuedict, actions=actions, checkaction="" )  
-    return highlight( inpt, plumed_lexer, plumed_formatter )
+    """
+    return _getDefaultRenderer( plumedexe ).render_clfile( inpt, name )
 
 def get_cltoolarg_html( inpt, name, plumedexe ) :
     """
@@ -229,40 +1238,9 @@ def get_cltoolarg_html( inpt, name, plumedexe ) :
        name -- The name to use for this input in the html
        plumedexe -- The plumed executibles that were used.  The last one is the one that is used to create the input file annotations
     """
-    # Get the cltool that we are using
-    pl, tool = inpt.split()[0], inpt.split()[1]
-    if re.search(r"^mpirun\s+-np\s+[0-9]+\s+plumed",inpt) : 
-       tool = inpt.split()[4]
-       pl = inpt.split()[3]
-    if re.search(r"^plumed\s+\--no-mpi\s+", inpt) :
-       tool = inpt.split()[2]  
-    if pl!="plumed" and pl!="plumed-runtime" :
-       raise Exception("first word in the command should be plumed or plumed-runtime")
-    # Create the lexer that will generate the pretty plumed input
-    lexerfile = os.path.join(os.path.dirname(__file__),"PlumedCLtoolLexer.py")
-    plumed_lexer = load_lexer_from_file(lexerfile, "PlumedCLtoolLexer" )
-    # Get the plumed syntax file
-    fileoutstr, defstr, keyword_dict = "", inpt, getPlumedSyntax( plumedexe )
-    if ">" in inpt :
-       fileoutstr = ">" + inpt.split(">")[1]
-       defstr = inpt.split(">")[0]
-    # Find the default values in the dictionary
-    ishelp = False
-    if len(inpt.split())>2 and (inpt.split()[2]=="-h" or inpt.split()[2]=="--help") :
-       ishelp = True 
-    if not ishelp and keyword_dict["cltools"][tool]["inputtype"]!="file" : 
-       for key, dicti in keyword_dict["cltools"][tool]["syntax"].items() :
-           if "default" not in dicti.keys() or dicti["default"]=="off" or key in inpt : continue
-           defstr += " " + key + " " + dicti["default"]
-       if (defstr+fileoutstr)!=inpt :
-           inpt = "#NODEFAULT plumed\n" + inpt + " \n#DEFAULT plumed\n" + defstr + fileoutstr + " \n#ENDDEFAULT plumed\n"
-    # Setup the formatter
-    formatfile = os.path.join(os.path.dirname(__file__),"PlumedFormatter.py")
-    valuedict, actions = {}, set()
-    plumed_formatter = load_formatter_from_file(formatfile, "PlumedFormatter", keyword_dict=keyword_dict["cltools"], input_name=name, hasload=False, broken=False, auxinputs=[], auxinputlines=[], valuedict=valuedict, actions=actions, checkaction="" )  
-    return highlight( inpt, plumed_lexer, plumed_formatter )
-
-def get_html( inpt, name, outloc, tested, broken, plumedexe, usejson=None, maxchecks=None, actions=set({}), ghmarkdown=True, checkaction="", checkactionkeywords=set({}) ) :
+    return _getDefaultRenderer( plumedexe ).render_cltool( inpt, name )
+
+def get_html( inpt, name, outloc, tested, broken, plumedexe, usejson=None, maxchecks=None, actions=set({}), ghmarkdown=True, checkaction="", checkactionkeywords=set({}), jsonname=None, out=None, validate="index", tooltips=None, auxmodals=None, lexer=None, delegated=False, expansion_depth=None, expansion_size=None ) :
     """
        Generate the html representation of a PLUMED input file
 
@@ -281,174 +1259,56 @@ def get_html( inpt, name, outloc, tested, broken, plumedexe, usejson=None, maxch
        usejson -- Bool that tells you whether or not to look for json files that are generated by plumed driver
        maxchecks -- Maximum number of checks to perform on plumed input.  Set this to reduce computational expense
        actions -- Set to store all the actions that have been used in the input
+       jsonname -- The name of the file that was tested by test_plumed if the json files are not called name.json and name_values.json
+       out -- A stream to write the html to.  If this is given nothing is returned as the html is written directly to the stream 
+       validate -- How to check the html.  With "index" the formatter checks that every element that is shown when something is clicked is present.  
+                   With "full" the html is also parsed to check that it is valid and maxchecks limits the number of clickable elements that are checked.  
+                   With None no checks are done
+       tooltips -- A dictionary that is used to collect the descriptions in the tooltips.  If this is given each tooltip only contains a reference to its 
+                   description and the table of descriptions that is returned by get_tooltip_table(tooltips) must be included in the page once 
+       auxmodals -- A dictionary that is used to collect the modals that show the auxiliary input files.  If this is given the modals are not output with the 
+                    input and the html that is returned by get_modal_table(auxmodals) must be included in the page once outside all the inputs.  Pass the 
+                    same dictionary for all the inputs on a page to output only one modal for each file on the page
+       lexer -- The lexer to use for the input.  Either "regex" for the reference lexer or "linear" for the lexer whose time grows linearly with the length 
+                of the input.  By default the regex lexer is used
+       delegated -- Set true to output data attributes that are read by one listener for each input instead of an inline onclick handler on every element that 
+                    can be clicked.  The labels are then highlighted by adding a class to the elements for the label so the time taken to handle a click 
+                    does not depend on the size of the page
+       expansion_depth -- The number of levels of shortcuts in shortcuts whose expansions are shown.  Deeper shortcuts are shown with a comment in place of 
+                          their expansion.  By default all the levels are shown
+       expansion_size -- The number of characters in the input with its shortcuts expanded above which the expansions of the remaining shortcuts are not shown.  
+                         By default there is no limit
     """
-    
-    # Check if we are looking for json files
-    if usejson is None :
-       searchjson = False
-       if not any(broken) : searchjson = True
-    else : searchjson = usejson
+    return _getDefaultRenderer( plumedexe ).render_input( inpt, name, outloc, tested, broken, usejson=usejson, maxchecks=maxchecks, actions=actions,
+            ghmarkdown=ghmarkdown, checkaction=checkaction, checkactionkeywords=checkactionkeywords, jsonname=jsonname, out=out, validate=validate, tooltips=tooltips, auxmodals=auxmodals, lexer=lexer, delegated=delegated,
+            expansion_depth=expansion_depth, expansion_size=expansion_size )
 
-    # If we find the fill command then split up the input file to find the solution
-    inpt, incomplete = manage_incomplete_inputs( inpt )
+def get_tooltip_table( tooltips ) :
+    """
+       Get the html for the table of tooltip descriptions that were collected by get_html
 
-    # Create a list of all the auxiliary input files that are needed by the plumed input 
-    inputfiles, inputfilelines, nreplicas = [], [], 1
-    for line in inpt.splitlines() :
-        if "#SETTINGS" in line :
-           for word in line.split() :
-               if "NREPLICAS=" in word : 
-                   nreplicas = int(word.replace("NREPLICAS=",""))
-               elif "MOLFILE=" in word : 
-                   molfile = word.replace("MOLFILE=","")
-                   if os.path.isfile(molfile) : 
-                      iff = open( molfile, 'r' )
-                      content = iff.read()
-                      iff.close()
-                      inputfiles.append(molfile)
-                      inputfilelines.append("1-5")
-                      inputfilelines.append( str(len(content.splitlines())-4) + "-" + str(len(content.splitlines())) ) 
-                   else :
-                      warnings.warn("file " + molfile + " found in MOLFILE setting but file is not present")
-               elif "INPUTFILES=" in word : 
-                   for n in word.replace("INPUTFILES=","").split(",") : 
-                      if os.path.isfile(n) : inputfiles.append( n )
-                      else : raise Exception("file " + n + " found in list of INPUTFILES but file is not present")
-               elif "INPUTFILELINES=" in word : 
-                   inputfilelines = word.replace("INPUTFILELINES=","").split(",")
-
-    # Check for include files
-    foundincludedfiles, srcdir = True, str(pathlib.PurePosixPath(name).parent)
-    if not any(broken) and "INCLUDE" in inpt : foundincludedfiles, inpt = resolve_includes( srcdir, inpt, nreplicas, foundincludedfiles )
-
-    # Check if there is a LOAD command in the input
-    found_load = "LOAD " in inpt
-
-    # Check for shortcut file and build the modified input to read the shortcuts
-    if os.path.exists( name + '.json' ) and searchjson :
-       # Read json file containing shortcuts
-       with open(name + '.json') as f :
-           try:
-              shortcutdata = json.load(f)
-           except json.JSONDecodeError as ve:
-              raise Exception("invalid json for shortcut dictionary", ve)
-       # Put everything in to resolve the expansions.  We call this function recursively just in case there are shortcuts in shortcuts
-       final_inpt = resolve_expansions( inpt, shortcutdata )
-    else : final_inpt = inpt  
-    # Remove the tempory files that we created
-    if os.path.exists( name + '.json' ) : os.remove( name + ".json")  
-
-    # Check for value dictionary to use to create labels
-    if os.path.exists( name + '_values.json') and searchjson :
-       with open( name + '_values.json') as f :
-           try:
-              valuedict = json.load(f)
-           except json.JSONDecodeError as ve:
-              raise Exception("invalid json for value dictionary", ve)
-    else : valuedict = {}
-    # Remove the tempory files that we created
-    if os.path.exists( name + '_values.json') : os.remove( name + "_values.json")
-
-    # Create the lexer that will generate the pretty plumed input
-    lexerfile = os.path.join(os.path.dirname(__file__),"PlumedLexer.py")
-    plumed_lexer = load_lexer_from_file(lexerfile, "PlumedLexer" )
-    # Get the plumed syntax file
-    keyword_dict = getPlumedSyntax( plumedexe )
-    # Setup the formatter
-    formatfile = os.path.join(os.path.dirname(__file__),"PlumedFormatter.py")
-    plumed_formatter = load_formatter_from_file(formatfile, "PlumedFormatter", keyword_dict=keyword_dict, input_name=name, hasload=found_load, broken=any(broken), auxinputs=inputfiles, auxinputlines=inputfilelines, valuedict=valuedict, actions=actions, checkaction=checkaction )
-
-    # Now generate html of input
-    html = '<div class="plumedInputContainer">\n'
-    html += '<div class="plumedpreheader">\n'
-    html += f'<div class="headerInfo" id="value_details_{name}"> Click on the labels of the actions for more information on what each action computes </div>\n'
-    html += '<div class="containerBadge">\n'
-    for i in range(len(tested)) :
-        html +='<div class="headerBadge">'
-        btype = 'passing-green.svg'
-        if broken[i] :
-           btype = 'failed-red.svg'
-        #this if can be collapsed in a f'<a href="{"" if ghmarkdown else "../"}{outloc}.{plumedexe[i]}.stderr">'
-        #but like this it might be clearer, what do you think?
-        if ghmarkdown :
-           html += f'<a href="{outloc}.{plumedexe[i]}.stderr">'
-        else :
-           html += f'<a href="../{outloc}.{plumedexe[i]}.stderr">'
-        html += f'<img src="https://img.shields.io/badge/{tested[i]}-{btype}" alt="tested on{tested[i]}" />'
-        html += '</a>'
-        html += '</div>\n'
-
-    if found_load :
-       html += '<div class="headerBadge">'
-       html += '<img src="https://img.shields.io/badge/with-LOAD-yellow.svg" alt="tested on master" />'
-       html += '</div>\n'
-
-    if len(incomplete)>0 : 
-       html += '<div class="headerBadge">'
-       html += f'<img class="toggler" src="https://img.shields.io/badge/{tested[-1]}-incomplete-yellow.svg" alt="tested on {tested[-1]}"'
-       html += f" onmouseup='toggleDisplay(\"{name}\")' onmousedown='toggleDisplay(\"{name}\")'/>"
-       html += "</div>\n"
-
-    html += '</div>\n</div>\n' 
-
-    if len(incomplete)>0 : 
-       # This creates the input with the __FILL__ 
-       html += "<div id=\"" + name + "_short\">\n"
-       # html += highlight( final_inpt, plumed_lexer, HtmlFormatter() )
-       html += highlight( incomplete, plumed_lexer, plumed_formatter )
-       html += "</div>\n"
-       # This is the solution with the commplete input
-       html += "<div style=\"display:none;\" id=\"" + name + "_long\">"
-       plumed_formatter.egname = plumed_formatter.egname + "_sol"
-       # html += highlight( final_inpt, plumed_lexer, HtmlFormatter() )
-       html += highlight( final_inpt, plumed_lexer, plumed_formatter )
-       html += '</div>\n'
-    else : 
-       # html += highlight( final_inpt, plumed_lexer, HtmlFormatter() )
-       html += highlight( final_inpt, plumed_lexer, plumed_formatter )
-    #close the html = '<div class="plumedInputContainer">\n'
-    html += '</div>\n'
-    # Now remove keywords that appear in examples
-    mykeywords = plumed_formatter.getCheckActionKeywords()
-    for key in mykeywords : 
-        if key in checkactionkeywords :
-           checkactionkeywords.remove(key)
-
-    # Test output is valid parsable html
-    try :
-       etree.parse(StringIO(html), etree.HTMLParser(recover=False))
-    except etree.XMLSyntaxError as e:
-       raise Exception("Generated html is invalid as " + str(e.error_log) + " plumed input is \n\n" + final_inpt ) from e
-
-    # Check everything that is marked as a clickable value has something that will appear
-    # when you click it
-    nchecks, soup = 0, BeautifulSoup( html, "html.parser" )
-    for val in soup.find_all("b") :
-        if "onclick" in val.attrs.keys() :
-           nchecks, vallabels = nchecks + 1, val.attrs["onclick"].split("\"")
-           if maxchecks is not None and nchecks>maxchecks : 
-              warnings.warn("Only checked the html for the first " + str(maxchecks) + " of the " + str(len(soup.find_all("b"))) + " labels in input file to reduce computational expense. The output is most likely fine but has not been checked as carefully as inputs with fewer values")
-              break
-           if not soup.find("span", {"id": vallabels[3]}) : warnings.warn("Problems with generated as label hidden box for label " + vallabels[3] + " is missing")
-           if not soup.find("div", {"id": "value_details_" + vallabels[1]}) : raise Exception("Generated html is invalid as there is no place to show data for " + vallabell[1])
-
-    # Now check the togglers
-    nchecks = 0 
-    for val in soup.find_all(attrs={'class': 'toggler'}) :
-        nchecks = nchecks + 1 
-        if maxchecks is not None and nchecks>maxchecks : 
-           warnings.warn("Only checked the html for the first " + str(maxchecks) + " of the " + str(len(soup.find_all(attrs={'class': 'toggler'}))) + " shortcuts in the input file to reduce computational expense. The output is most likely fine but has not been checked as carefully as inputs with fewer shortcuts")
-           break
-        if "onclick" in val.attrs.keys() :
-           switchval = val.attrs["onclick"].split("\"")[1]
-           if not soup.find("span",{"id": switchval + "_long"} ) : raise Exception("Generated html is invalid as could not find " + switchval + "_long") 
-           if not soup.find("span",{"id": switchval + "_short"} ) : raise Exception("Generated html is invalid as could not find " + switchval + "_short")
-        elif "onmousedown" in val.attrs.keys() :
-           switchval = val.attrs["onmousedown"].split("\"")[1]
-           if not soup.find("div",{"id": switchval + "_long"} ) : raise Exception("Generated html is invalid as could not find " + switchval + "_long")
-           if not soup.find("div",{"id": switchval + "_short"} ) : raise Exception("Generated html is invalid as could not find " + switchval + "_short")
-        else : raise Exception("Could not find toggler command for " + val)
-    return html
+       The table is hidden. The javascript in the header copies a description from the table into a tooltip
+       when the mouse is moved over it for the first time.
+
+       Keyword arguments:
+       tooltips -- The dictionary that was passed to get_html
+    """
+    table = ['<div class="plumedtooltips" style="display:none;">\n']
+    for desc, tid in tooltips.items() : table.append( '<template id="' + tid + '">' + desc + '<i></i></template>\n' )
+    table.append( '</div>\n' )
+    return "".join(table)
+
+def get_modal_table( auxmodals ) :
+    """
+       Get the html for the modals that show the auxiliary input files that were collected by get_html
+
+       The modals are hidden until a link to one of the files is clicked.  They are output once for the page outside all the inputs so they can be
+       opened from inputs or parts of inputs that are hidden.
+
+       Keyword arguments:
+       auxmodals -- The dictionary that was passed to get_html
+    """
+    return '<div class="plumedmodals">\n' + "".join( modal + "\n" for modal in auxmodals.values() ) + '</div>\n'
 
 def get_mermaid( executible, inpt, force,*, test_plumed_kwargs={} ) :
     """
@@ -457,32 +1317,31 @@ def get_mermaid( executible, inpt, force,*, test_plumed_kwargs={} ) :
      Keyword arguments:
      inpt -- A string containing the PLUMED input
      force -- Bool that if true ensures we show the graph for the backwards pass through the action list
-     test_plumed_kwargs -- a dictionary of extra keywords to pass to the test_plumed utility, useful for passing an"header"
-    """
-    # Write the plumed input to a file
-    iff = open( "mermaid_plumed.dat", "w+")
-    iff.write(inpt+ "\n")
-    iff.close()
-    # Now check the input is OK
-    broken = test_plumed( executible, "mermaid_plumed.dat",**test_plumed_kwargs)
-    if broken!=0 : raise Exception("invalid plumed input file -- cannot create mermaid graph")
-    # Run mermaid
-    cmd = [executible, 'show_graph', '--plumed', 'mermaid_plumed.dat', '--out', 'mermaid.md']
-    if force : cmd.append("--force")
-    plumed_out = subprocess.run(cmd, text=True, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT )
-    if plumed_out.returncode!=0 : raise Exception("error running plumed show_graph")
-    mf = open("mermaid.md")
-    mermaid = mf.read()
-    mf.close()
-    # Remove stuff that was created
-    os.remove("mermaid_plumed.dat")
-    os.remove("mermaid.md")
+     test_plumed_kwargs -- a dictionary of extra keywords to pass to the test_plumed utility, useful for passing an"header".  The backend 
+                           in this dictionary is also used to run plumed show_graph
+    """
+    backend = test_plumed_kwargs.get("backend")
+    if backend is None : backend = _subprocess_backend
+    # The files are written in a directory that is only used by this call.  Plumed is run in the 
+    # current directory so that the paths to any files that are read by the input are correct
+    with tempfile.TemporaryDirectory() as scratch :
+         plumedfile, mermaidfile = os.path.join( scratch, "mermaid_plumed.dat" ), os.path.join( scratch, "mermaid.md" )
+         # Write the plumed input to a file
+         with open( plumedfile, "w+") as iff : iff.write(inpt+ "\n")
+         # Now check the input is OK
+         broken = test_plumed( executible, plumedfile, rundir=".", **test_plumed_kwargs)
+         if broken!=0 : raise Exception("invalid plumed input file -- cannot create mermaid graph")
+         # Run mermaid
+         cmd = [executible, 'show_graph', '--plumed', plumedfile, '--out', mermaidfile]
+         if force : cmd.append("--force")
+         if backend.run( cmd, None )!=0 : raise Exception("error running plumed show_graph")
+         with open(mermaidfile) as mf : mermaid = mf.read()
     return mermaid 
 
 def resolve_includes( srcdir, inpt, nreplicas, foundfiles ) :
     if not foundfiles or "INCLUDE" not in inpt : return foundfiles, inpt
 
-    incontinuation, final_inpt, clines = False, "", "" 
+    incontinuation, final_inpt, clines = False, [], "" 
     for line in inpt.splitlines() :
         # Empty the buffer that holds the input for this line if we are not in a continuation
         if not incontinuation : clines = ""
@@ -502,138 +1361,236 @@ def resolve_includes( srcdir, inpt, nreplicas, foundfiles ) :
                if "#" in w and filename=="" : iscomment=True
                elif "FILE=" in w : filename = w.replace("FILE=","") 
            if iscomment : 
-              final_inpt += clines 
+              final_inpt.append( clines )
               continue
            if filename=="" : raise Exception("could not find name of file to include")
            if not os.path.exists(filename) : foundfiles = False 
            splitname = filename.rsplit(".",1)
            if len(splitname)>2 : raise Exception("cannot deal with included file named " + filename )
 
-           final_inpt += "#SHORTCUT " + filename + "\n" + clines + "#EXPANSION " + filename + "\n# The command:\n"
-           final_inpt += "# " + clines+ "# ensures PLUMED loads the contents of the file called " + filename + "\n" 
+           final_inpt.append( "#SHORTCUT " + filename + "\n" + clines + "#EXPANSION " + filename + "\n# The command:\n" )
+           final_inpt.append( "# " + clines+ "# ensures PLUMED loads the contents of the file called " + filename + "\n" )
            if nreplicas>1 and os.path.exists( srcdir + "/" + splitname[0] + ".0." + splitname[1] ) :
-              final_inpt += "# There are different versions of this file on each replica\n"
+              final_inpt.append( "# There are different versions of this file on each replica\n" )
               for i in range(nreplicas) : 
                   f = open( srcdir + "/" + splitname[0] + "." + str(i) + "." + splitname[1], "r" )
                   include_contents = f.read()
                   f.close() 
-                  final_inpt += "# The contents of the version of this file (" + splitname[0] + "." + str(i) + "." + splitname[1] + ") on replica " + str(i) + " is shown below.\n"
+                  final_inpt.append( "# The contents of the version of this file (" + splitname[0] + "." + str(i) + "." + splitname[1] + ") on replica " + str(i) + " is shown below.\n" )
                   foundfiles, parsed_inpt = resolve_includes( srcdir, include_contents, nreplicas, foundfiles )
-                  final_inpt += parsed_inpt
-              final_inpt += "#(click the red comment to hide this expanded text).\n"
-              if final_inpt.endswith("\n") : final_inpt += "#ENDEXPANSION " + filename + "\n"
-              else : final_inpt += "\n#ENDEXPANSION " + filename + "\n"
+                  final_inpt.append( parsed_inpt )
+              final_inpt.append( "#(click the red comment to hide this expanded text).\n" )
+              final_inpt.append( "#ENDEXPANSION " + filename + "\n" )
            else : 
               f = open( srcdir + "/" + filename, "r" )
               include_contents = f.read()
               f.close()
-              final_inpt += "# The contents of this file are shown below (click the red comment to hide them).\n" 
+              final_inpt.append( "# The contents of this file are shown below (click the red comment to hide them).\n" )
               foundfiles, parsed_inpt = resolve_includes( srcdir, include_contents, nreplicas, foundfiles )
-              if parsed_inpt.endswith("\n") : final_inpt += parsed_inpt + "#ENDEXPANSION " + filename + "\n"
-              else : final_inpt += parsed_inpt + "\n#ENDEXPANSION " + filename + "\n"
-        else : final_inpt += clines         
-    return foundfiles, final_inpt
-
+              final_inpt.append( parsed_inpt )
+              if parsed_inpt.endswith("\n") : final_inpt.append( "#ENDEXPANSION " + filename + "\n" )
+              else : final_inpt.append( "\n#ENDEXPANSION " + filename + "\n" )
+        else : final_inpt.append( clines )
+    return foundfiles, "".join(final_inpt)
 
-def resolve_expansions( inpt, jsondata ) :
-    # Stop expanding if we have reached the bottom 
-    if len(jsondata.keys())==0 : return inpt + "\n"
 
-    incontinuation, final_inpt, clines = False, "", ""
-    for line in inpt.splitlines() :        
-        # Empty the buffer that holds the input for this line if we are not in a continuation
-        if not incontinuation : clines = ""
+def _iter_actions( inpt ) :
+    """
+       Get the text of each action in a PLUMED input.  The lines of an action that is split over a continuation block are returned together
+    """
+    incontinuation, clines = False, []
+    for line in inpt.splitlines() :
         # Check for start and end of continuation
-        if "..." in line and incontinuation : incontinuation=False
-        elif "..." in line and not incontinuation : incontinuation=True
-        # Build up everythign that forms part of input for one action
-        clines += line + "\n"
-        # Just continue if we don't have the full line
+        if "..." in line : incontinuation = not incontinuation
+        clines.append( line + "\n" )
         if incontinuation : continue
-        # Find the label of this line if it has one
-        label = ""
-        if "LABEL=" in clines :
-           afterlab = clines[clines.index("LABEL=") + len("LABEL="):]
-           label = afterlab.split()[0]
-        elif clines.find(":") : label = clines.split(":")[0].strip()
-        if len(label)>0 and label in jsondata :
-           if "expansion" in jsondata[label] :
-              final_inpt += "#SHORTCUT " + label + "\n"
-              if "defaults" in jsondata[label] : final_inpt += "#NODEFAULT " + label + "\n" + clines
-              else : final_inpt += clines
-              # Add long version with defaults to input 
-              if "defaults" in jsondata[label] and "..." in clines :
-                 alldat, bef = clines.split("\n"), ""
-                 for i in range(len(alldat)-2) : bef += alldat[i] + "\n"
-                 final_inpt += "#DEFAULT " + label + "\n" + bef + jsondata[label]["defaults"] + "\n" + alldat[-2] + "\n#ENDDEFAULT " + label + "\n"
-              elif "defaults" in jsondata[label]  : final_inpt += "#DEFAULT " + label + "\n" + clines.strip() + " " + jsondata[label]["defaults"] + "\n#ENDDEFAULT " + label + "\n"
-              # Add stuff for long version of input in collapsible
-              final_inpt += "#EXPANSION " + label + "\n# PLUMED interprets the command:\n"
-              for gline in clines.splitlines() : final_inpt += "# " + gline + "\n"
-              local_json = dict(jsondata[label]) 
-              local_json.pop("expansion", "defaults" )
-              final_inpt += "# as follows (Click the red comment above to revert to the short version of the input):\n" + resolve_expansions( jsondata[label]["expansion"], local_json )
-              final_inpt += "#ENDEXPANSION " + label + "\n"
-           elif "defaults" in jsondata[label] :
-              final_inpt += "#NODEFAULT " + label + "\n" + clines
-              if "..." in clines :
-                 alldat, bef = clines.split("\n"), ""
-                 for i in range(len(alldat)-2) : bef += alldat[i] + "\n"
-                 final_inpt += "#DEFAULT " + label + "\n" + bef + jsondata[label]["defaults"] + "\n" + alldat[-2] + "\n#ENDDEFAULT " + label + "\n"
-              else : final_inpt += "#DEFAULT " + label + "\n" + clines.strip() + " " + jsondata[label]["defaults"] + "\n#ENDDEFAULT " + label + "\n"
-        else : final_inpt += clines
-    return final_inpt
+        yield "".join( clines )
+        clines = []
+
+def _action_label( clines ) :
+    """
+       Get the label of an action from its text
+    """
+    if "LABEL=" in clines : return clines[clines.index("LABEL=") + len("LABEL="):].split()[0]
+    if clines.startswith(":") : return ""
+    return clines.split(":",1)[0].strip()
+
+def _with_defaults( label, clines, defaults ) :
+    """
+       Get the long version of an action with the default values of its keywords for the #DEFAULT block
+    """
+    if "..." not in clines : return "#DEFAULT " + label + "\n" + clines.strip() + " " + defaults + "\n#ENDDEFAULT " + label + "\n"
+    # The defaults go before the line that closes the continuation
+    alldat = clines.split("\n")
+    return "#DEFAULT " + label + "\n" + "".join( line + "\n" for line in alldat[:-2] ) + defaults + "\n" + alldat[-2] + "\n#ENDDEFAULT " + label + "\n"
+
+def resolve_expansions( inpt, jsondata, out=None, maxdepth=None, maxsize=None ) :
+    """
+       Add the expansions of the shortcuts and the default values of keywords to a PLUMED input so they can be shown in the html
+
+       The dictionary of shortcuts is walked with a stack rather than by recursion so the time taken grows linearly with the length of the 
+       output however deeply the shortcuts are nested.  Each part of the output is written once.  If a limit is set the expansion of a 
+       shortcut that is too deep or too large is replaced by a comment that says it is not shown.  The shortcut can still be clicked.
+
+       Keyword arguments:
+       inpt -- A string containing the PLUMED input
+       jsondata -- The dictionary of shortcuts in the format that is output by plumed driver --shortcut-ofile
+       out -- A stream to write the input to.  If this is None the input is returned as a string
+       maxdepth -- The number of levels of shortcuts in shortcuts that are expanded.  By default all the levels are expanded
+       maxsize -- The expansion of a shortcut is not shown if the input that has been output before it and the expansion are longer than this number of characters.  
+                  The lines that close the expansions that are open and the rest of the input are still output.  By default all the expansions are shown
+    """
+    parts, size = [], 0
+    def write( text ) :
+        nonlocal size
+        size = size + len(text)
+        if out is None : parts.append( text )
+        else : out.write( text )
+    if len(jsondata.keys())==0 : write( inpt + "\n" )
+    # Each item in the stack holds the actions in an input that is being expanded, the shortcuts that are used in it and the label of the shortcut
+    stack = [ ( _iter_actions( inpt ), jsondata, None ) ] if len(jsondata.keys())>0 else []
+    while len(stack)>0 :
+        actions, shortcuts, parent = stack[-1]
+        clines = next( actions, None )
+        if clines is None :
+           stack.pop()
+           if parent is not None : write( "#ENDEXPANSION " + parent + "\n" )
+           continue
+        label = _action_label( clines )
+        data = shortcuts.get( label ) if len(label)>0 else None
+        if not isinstance( data, dict ) or ( "expansion" not in data and "defaults" not in data ) :
+           write( clines )
+           continue
+        if "defaults" in data : short = "#NODEFAULT " + label + "\n" + clines + _with_defaults( label, clines, data["defaults"] )
+        else : short = clines
+        if "expansion" not in data :
+           write( short )
+           continue
+        # Add stuff for long version of input in collapsible
+        head = "#SHORTCUT " + label + "\n" + short + "#EXPANSION " + label + "\n# PLUMED interprets the command:\n" + "".join( "# " + gline + "\n" for gline in clines.splitlines() )
+        head += "# as follows (Click the red comment above to revert to the short version of the input):\n"
+        if ( maxdepth is not None and len(stack)>maxdepth ) or ( maxsize is not None and size + len(head) + len(data["expansion"])>maxsize ) :
+           write( head + "# --- The input for " + label + " is not shown here as it is too large --- \n#ENDEXPANSION " + label + "\n" )
+        # Inputs without any shortcuts or defaults in them are copied
+        elif len(data)==1 : write( head + data["expansion"] + "\n#ENDEXPANSION " + label + "\n" )
+        else :
+           write( head )
+           stack.append( ( _iter_actions( data["expansion"] ), data, label ) )
+    if out is None : return "".join( parts )
+
+@functools.lru_cache(maxsize=None)
+def _getAssets() :
+    """
+       Read the header and split it into the css and the javascript.  The file is only read and parsed once
+    """
+    with open( os.path.join(os.path.dirname(__file__),"assets/header.html") ) as hfile : codes = hfile.read()
+    parts = {}
+    for tag, name in [("style", "css"), ("script", "javascript")] :
+        inscript, parts[name] = False, ""
+        for line in codes.splitlines() :
+            if "</" + tag + ">" in line and inscript :
+                inscript = False
+                break
+            elif "<" + tag + ">" in line :
+                inscript = True
+            elif inscript :
+                if ("<style>" in line) or ("</style>" in line) or ("<script>" in line) or ("</script>" in line) : 
+                   raise Exception('found invalid html tag in ' + name + ' line ' + line)
+                parts[name] += line + "\n"
+    return codes, parts["css"], parts["javascript"]
 
 def get_html_header() :
     """
        Get the information that needs to go in the header of the html file to make the interactive PLUMED
        inputs work
     """
-    headerfilename = os.path.join(os.path.dirname(__file__),"assets/header.html")
-    hfile = open( headerfilename )
-    codes = hfile.read()
-    hfile.close()
-    return codes
+    return _getAssets()[0]
 
 def get_javascript() :
     """
        Get the javascript from the header of the html file to make the interactive PLUMED inputs work
     """
-    inscript, fullheader, jscode = False, get_html_header().splitlines(), ""
-    for line in fullheader :
-        if "</script>" in line and inscript :
-            inscript = False
-            break
-        elif "<script>" in line :
-            inscript = True
-        elif inscript :
-            if ("<style>" in line) or ("</style>" in line) or ("<script>" in line) or ("</script>" in line) : 
-               raise Exception('found invalid html tag in javascript line ' + line)
-            jscode += line + "\n"
-    return jscode
+    return _getAssets()[2]
 
 def get_css() :
     """
        Get the css from the header of the html file to make the interactive PLUMED inputs work
     """
-    inscript, fullheader, css = False, get_html_header().splitlines(), ""
-    for line in fullheader :
-        if "</style>" in line and inscript :
-            inscript = False
-            break
-        elif "<style>" in line :
-            inscript = True
-        elif inscript :
-            if ("<style>" in line) or ("</style>" in line) or ("<script>" in line) or ("</script>" in line) : 
-               raise Exception('found invalid html tag in css line ' + line)
-            css += line + "\n"               
-    return css 
+    return _getAssets()[1]
+
+def _minify_css( css ) :
+    """
+       Remove the comments and the space that is not needed from css
+    """
+    css = re.sub( r"/\*.*?\*/", "", css, flags=re.DOTALL )
+    css = re.sub( r"\s+", " ", css )
+    css = re.sub( r"\s*([{};,])\s*", r"\1", css )
+    # The space after the colon is only removed in declarations as a space before a colon in a selector changes its meaning
+    css = re.sub( r"([{;])([\w-]+):\s+", r"\1\2:", css )
+    return css.replace( ";}", "}" ).strip() + "\n"
+
+def _minify_javascript( javascript ) :
+    """
+       Remove the indentation and blank lines from javascript.  The line breaks are kept so statements without semicolons still end
+    """
+    lines = [ line.strip() for line in javascript.splitlines() ]
+    return "\n".join( line for line in lines if line!="" and not line.startswith("//") ) + "\n"
+
+@functools.lru_cache(maxsize=None)
+def _getAssetFiles( minify ) :
+    """
+       Get the names and contents of the files containing the css and the javascript.  The names contain a hash of the contents
+    """
+    files = []
+    for ext, content in [ ("css", get_css()), ("js", get_javascript()) ] :
+        if minify : content = _minify_css( content ) if ext=="css" else _minify_javascript( content )
+        files.append( ( "plumedtohtml." + hashlib.sha256( content.encode() ).hexdigest()[:16] + "." + ext, content ) )
+    return tuple( files )
+
+def _umask() :
+    """
+       Get the umask of the process.  The umask can only be read by setting it so it is set back straight away
+    """
+    mask = os.umask( 0o022 )
+    os.umask( mask )
+    return mask
+
+def write_assets( directory, url=None, minify=False ) :
+    """
+       Write the css and javascript that make the interactive PLUMED inputs work to files and get the tags that load them
+
+       The names of the files contain a hash of their contents so browsers can cache them for as long as they like and the
+       files for a new version of this package never replace the files for an older version.  Files that already exist
+       are not written again.  The tags that are returned should be included in the header of each html page instead of the 
+       output from get_html_header.
+
+       Keyword arguments:
+       directory -- The directory to write the files to
+       url -- The url of the directory in the html pages.  By default the name of the directory is used
+       minify -- Set true to remove comments and space that is not needed from the css and javascript
+    """
+    if url is None : url = directory
+    if len(url)>0 and not url.endswith("/") : url = url + "/"
+    os.makedirs( directory, exist_ok=True )
+    files = _getAssetFiles( minify )
+    for fname, content in files :
+        path = os.path.join( directory, fname )
+        if os.path.isfile( path ) : continue
+        # Write to a tempory file and rename so that a page is never served a partial file.  The temporary file can only be read 
+        # by us so it is given the permissions of a file that is created in the normal way so a web server can read the asset
+        fd, tmpname = tempfile.mkstemp( dir=directory, suffix=".tmp" )
+        with os.fdopen( fd, "w" ) as f : f.write( content )
+        os.chmod( tmpname, 0o666 & ~_umask() )
+        os.replace( tmpname, path )
+    (cssname, css), (jsname, js) = files
+    return '<link rel="stylesheet" href="' + html.escape( url + cssname ) + '">\n<script src="' + html.escape( url + jsname ) + '"></script>\n'
 
 def compare_to_reference( output, reference ) :
     """
       Compare the html that is output by PlumedFormatter with the reference data.  This function is used for 
       testing PlumedToHMTL
     """
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup( output, "html.parser" ) 
     # Check that comments in PLUMED input have been detected correctly
     if "comment" in reference.keys() :
@@ -660,32 +1617,46 @@ def compare_to_reference( output, reference ) :
     return True
 
 def processMarkdown( filename, plumedexe, plumed_names, actions, jsondir="./", ghmarkdown=True,
-        *,test_plumed_kwargs={} ) :
+        *,max_workers=1,test_plumed_kwargs={},compact_tooltips=False,manifest=None,delegated=False ) :
     """
         Process a markdown file that contains PLUMED input files using PlumedtoHTML
 
+        The markdown is read one line at a time and the output is written to a temporary file in the same directory.  The markdown 
+        file is only replaced by the output once all of it has been processed so the markdown file is left unchanged if there is an error.
+
         Keyword arguments:
         filename -- the name of the markdown file
         plumedexe -- a tuple of plumed executible names for testing plumed.
         plumed_names -- the names of the plumed executibles to use in the badges
         actions -- names of actions used in the plumed inputs in this markdown file
         jsondir -- The directory in which to output the files containing the expansions of the shortcuts and the value dictionaries 
+        max_workers -- The number of plumed tests that are run at the same time
         test_plumed_kwargs -- a dictionary of extra keywords to pass to the test_plumed utility, only "header" and "cmdTimeout" works
+        compact_tooltips -- Set true to output each tooltip description once in a table at the end of the markdown
+        manifest -- A BuildManifest that stores the output for each input so that inputs that have not changed are not tested or rendered again
+        delegated -- Set true to output data attributes instead of inline onclick handlers (see get_html)
     """
     if not os.path.exists(filename) :
        raise RuntimeError("Found no file called " + filename + " in lesson")
 
     with open( filename, "r" ) as f:
-       inp = f.read()
-
-    with open( filename, "w+" ) as ofile: 
-       ninputs, nfail = processMarkdownString( inp, filename, plumedexe, plumed_names,
-               actions, ofile, jsondir, ghmarkdown, test_plumed_kwargs=test_plumed_kwargs )
+       with tempfile.NamedTemporaryFile( "w", dir=os.path.dirname( os.path.abspath(filename) ), prefix="." + os.path.basename(filename) + ".", suffix=".tmp", delete=False ) as ofile :
+            try :
+               lines = ( part for line in f for part in line.splitlines() )
+               ninputs, nfail = _getDefaultRenderer( plumedexe ).process_markdown( lines, filename, plumed_names, actions, ofile, jsondir, ghmarkdown, 
+                       max_workers=max_workers, test_plumed_kwargs=test_plumed_kwargs, compact_tooltips=compact_tooltips, manifest=manifest, delegated=delegated )
+            except BaseException :
+               ofile.close()
+               os.remove( ofile.name )
+               raise
+    # Replace the markdown file with the output 
+    shutil.copymode( filename, ofile.name )
+    os.replace( ofile.name, filename )
     return ninputs, nfail
 
 def processMarkdownString( inp, filename, plumedexe, plumed_names, actions, ofile,
         jsondir="./", ghmarkdown=True, checkaction="ignore", checkactionkeywords=set({}),
-        *,test_plumed_kwargs={}) :
+        *,max_workers=1,test_plumed_kwargs={},compact_tooltips=False,manifest=None,delegated=False) :
     """
        Process a string of markdown that contains LUMED input files using PlumedtoHTML
 
@@ -698,140 +1669,11 @@ def processMarkdownString( inp, filename, plumedexe, plumed_names, actions, ofil
         dirname -- the directory in which to find solution files
         ofile -- the file on which to output the processed markdown
         jsondir -- The directory in which to output the files containing the expansions of the shortcuts and the value dictionaries 
+        max_workers -- The number of plumed tests that are run at the same time.  The output does not depend on this number
         test_plumed_kwargs -- a dictionary of extra keywords to pass to the test_plumed utility, only "header" and "cmdTimeout" works
+        compact_tooltips -- Set true to output each tooltip description once in a table at the end of the markdown rather than in every tooltip
+        manifest -- A BuildManifest that stores the output for each input so that inputs that have not changed are not tested or rendered again
+        delegated -- Set true to output data attributes instead of inline onclick handlers (see get_html)
     """
-    dirname = os.path.dirname(filename)
-    if dirname=="" : dirname = "." 
-
-    ninputs = 0
-    nfail = len(plumedexe)*[0]
-    inplumed = False
-    plumed_inp = ""
-    solutionfile = None
-    incomplete = False
-    usemermaid = ""
-    # Create a collection of cltools to regexp for
-    plumed_syntax = getPlumedSyntax( plumedexe )
-    cltoolregexps = []
-    clfileregexps = []
-    for key, data in plumed_syntax["cltools"].items() :
-        cltoolregexps.append(r"plumed\s+" + key )
-        cltoolregexps.append(r"plumed\s+--no-mpi\s+" + key )
-        cltoolregexps.append(r"plumed-runtime\s+" + key )
-        if data["inputtype"]=="file" :
-           clfileregexps.append( r"#TOOL\s*=\s*" + key )
-
-    for line in inp.splitlines() :
-       # Detect and copy plumed input files 
-       if "```plumed" in line :
-          inplumed = True
-          plumed_inp = ""
-          solutionfile = None
-          incomplete = False
-          ninputs = ninputs + 1 
-    
-       # Test plumed input files that have been found in tutorial 
-       elif inplumed and "```" in line :
-          skipplumedfile, inplumed = False, False
-          # Create mermaid graphs from PLUMED inputs if this has been requested
-          if usemermaid!="" :
-             skipplumedfile, mermaidinpt = True, ""
-             if usemermaid=="value" :
-                mermaidinpt = get_mermaid( plumedexe[-1], plumed_inp, False,
-                        test_plumed_kwargs=test_plumed_kwargs)
-             elif usemermaid=="force" :
-                mermaidinpt = get_mermaid( plumedexe[-1], plumed_inp, True,
-                        test_plumed_kwargs=test_plumed_kwargs)
-             else :
-                raise RuntimeError(usemermaid + "is invalid instruction for use mermaid")
-             if ghmarkdown : ofile.write("```mermaid\n" + mermaidinpt + "\n```\n")
-             else : ofile.write("<pre class=\"mermaid\">\n" + mermaidinpt + "\n</pre>\n")
-             usemermaid = ""
-
-          # Check if this is the input for a command line tool and render accordingly
-          for tool in cltoolregexps :
-              if re.search( tool, plumed_inp ) :
-                 html = get_cltoolarg_html( plumed_inp, "cltool" + str(ninputs), plumedexe )
-                 if ghmarkdown : ofile.write( "{% raw %}\n" + html + "\n {% endraw %} \n" )
-                 else : ofile.write( html )
-                 skipplumedfile = True
-
-          # Check if this the input file for a command line tool and render accordingly
-          for tool in clfileregexps :
-              if re.search( tool, plumed_inp ) :
-                 html = get_cltoolfile_html( plumed_inp, "cltool" + str(ninputs), plumedexe )
-                 if ghmarkdown : ofile.write( "{% raw %}\n" + html + "\n {% endraw %} \n" )
-                 else : ofile.write( html )
-                 skipplumedfile = True 
-
-          if incomplete :
-                if solutionfile:
-                   # Read solution from solution file
-                   try:
-                      with open( dirname + "/" + solutionfile, "r" ) as sf:
-                         solution = sf.read()
-                         plumed_inp += "#SOLUTION \n" + solution
-                      solutionfile = dirname + "/" + solutionfile
-                   except:
-                      raise RuntimeError(f"error in opening {solutionfile} as solution"
-                                        f" for an incomplete input from file {filename}")
-                else:
-                   raise RuntimeError(f"an incomplete input from file {filename}"
-                                     " does not have its solution file")
-          # Create the full input for PlumedToHTML formatter 
-          else :
-                solutionfile = filename + "_working_" + str(ninputs) + ".dat"
-                with open( solutionfile, "w+" ) as sf:
-                   sf.write( plumed_inp )
-    
-          # Test whether the input solution can be parsed
-          if not skipplumedfile : 
-             success = len(plumedexe)*[False] 
-             for i in range(len(plumedexe)) : 
-                 if i==len(plumedexe)-1 : 
-                    # Json files are put in directory one up from us to ensure that
-                    # PlumedToHTML finds them when we do get_html (i.e. these will be in
-                    # the data directory where the calculation is run)
-                    if incomplete :
-                       success[i]=test_plumed(plumedexe[i], solutionfile, ghmarkdown=ghmarkdown,
-                               **test_plumed_kwargs)
-                    else :                        
-                       success[i]=test_plumed(plumedexe[i], solutionfile,
-                                                  printjson=True, jsondir=jsondir, ghmarkdown=ghmarkdown,
-                                                  **test_plumed_kwargs)
-                 else : 
-                    success[i]=test_plumed( plumedexe[i],
-                            solutionfile,
-                            ghmarkdown=ghmarkdown,
-                            **test_plumed_kwargs,)
-                 if(success[i]!=0 and success[i]!="custom") : nfail[i] = nfail[i] + 1
-             # Use PlumedToHTML to create the input with all the bells and whistles
-             html = get_html(plumed_inp,
-                               solutionfile,
-                               os.path.basename(solutionfile),
-                               plumed_names,
-                               success,
-                               plumedexe, 
-                               usejson=(not success[-1]),
-                               actions=actions,
-                               ghmarkdown=ghmarkdown,
-                               checkaction=checkaction,
-                               checkactionkeywords=checkactionkeywords )
-             # Print the html for the solution
-             if ghmarkdown : ofile.write( "{% raw %}\n" + html + "\n {% endraw %} \n" )
-             else : ofile.write( html )
-       # This finds us the solution file
-       elif inplumed and "#SOLUTIONFILE=" in line :
-          solutionfile=line.strip().replace("#SOLUTIONFILE=","")
-       elif inplumed and "#MERMAID=" in line :
-          usemermaid = line.replace("#MERMAID=","").strip()
-       elif inplumed :
-          if "__FILL__" in line :
-             incomplete = True
-          plumed_inp += line + "\n"
-       # Just copy any line that isn't part of a plumed input
-       elif not inplumed :
-          ofile.write( line + "\n")
-
-    return ninputs, nfail 
-
+    return _getDefaultRenderer( plumedexe ).process_markdown( inp, filename, plumed_names, actions, ofile, jsondir, ghmarkdown, checkaction, checkactionkeywords,
+            max_workers=max_workers, test_plumed_kwargs=test_plumed_kwargs, compact_tooltips=compact_tooltips, manifest=manifest, delegated=delegated )
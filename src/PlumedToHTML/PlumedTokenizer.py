@@ -0,0 +1,305 @@
+import re
+from bisect import bisect_left, bisect_right
+from pygments.lexer import Lexer
+from pygments.token import Text, Comment, Literal, Keyword, Name, Generic, String, Error
+
+_space = re.compile(r'\s*')
+_word = re.compile(r'\w+')
+_nonspace = re.compile(r'\S*')
+_nonspaceword = re.compile(r'\S+\b')
+_label = re.compile(r'[Ll][Aa][Bb][Ee][Ll]=')
+_endplumed = re.compile(r'[Ee][Nn][Dd][Pp][Ll][Uu][Mm][Ee][Dd]')
+_vim = re.compile(r'#\s*vim:\s*ft=plumed')
+# The comments that mark the parts of the input with the shortcuts and the defaults.  These run to the end of the line
+_directives = [ ("#SHORTCUT", Comment.Preproc), ("#NODEFAULT", Comment.Special), ("#DEFAULT", Comment.Special), ("#ENDDEFAULT", Comment.Special),
+                ("#EXPANSION", Comment.Special), ("#ENDEXPANSION", Comment.Special) ]
+
+def _first( positions, lo ) :
+    """
+       Get the index of the first position that is greater than or equal to lo or None if there is no such position
+    """
+    i = bisect_left( positions, lo )
+    return i if i<len(positions) else None
+
+def _last( positions, lo, hi ) :
+    """
+       Get the index of the last position that is between lo and hi (inclusive) or None if there is no such position
+    """
+    i = bisect_right( positions, hi ) - 1
+    return i if i>=0 and positions[i]>=lo else None
+
+class _TextIndex :
+    """
+       The positions in the text that are needed by the rules that search forwards or backwards from the current position
+
+       The rules in PlumedLexer that look for the end of a value in braces or for the colon after a label search through the
+       text with regular expressions that backtrack.  Here all the places where these searches can end are found once so
+       each search is a binary search in one of the lists below.
+    """
+    def __init__( self, text ) :
+        self.text = text
+        self.newlines = [ m.start() for m in re.finditer( r'\n', text ) ]
+        # The characters that cannot be part of a label that is followed by a colon
+        self.stops = [ m.start() for m in re.finditer( r'[#^\n]', text ) ]
+        self.closes = [ m.start() for m in re.finditer( r'\}', text ) ]
+        self.doublecloses = [ m.start() for m in re.finditer( r'(?=\}\})', text ) ]
+        self.pairs, self.pairends = [], []
+        for m in re.finditer( r'(?=(\}\s*\}))', text ) :
+            self.pairs.append( m.start() )
+            self.pairends.append( m.end(1) )
+        # Colons that are followed by space and __FILL__
+        self.fills, self.fillstarts = [], []
+        for m in re.finditer( r':(?=(\s+)__FILL__)', text ) :
+            self.fills.append( m.start() )
+            self.fillstarts.append( m.end(1) )
+        # Colons that are followed by space and the name of an action
+        self.labels, self.labelgroups = [], []
+        for m in re.finditer( r':(?=(\s+)([^\s#]+\b))', text ) :
+            self.labels.append( m.start() )
+            self.labelgroups.append( (m.end(1), m.end(2)) )
+        # Colons that are followed by the dots that start a continuation and the name of an action on a later line
+        self.continuations, self.continuationgroups = [], []
+        for m in re.finditer( r':(?=\s+\.\.\.)', text ) :
+            start = _space.match( text, m.end() ).end() + 3
+            action = _space.match( text, start ).end()
+            # The name of the action must be on a later line
+            if "\n" not in text[start:action] : continue
+            name = _nonspaceword.match( text, action )
+            if name is None : continue
+            self.continuations.append( m.start() )
+            self.continuationgroups.append( (action, name.end()) )
+
+    def lineEnd( self, pos ) :
+        """
+           Get the position of the end of the line that contains pos
+        """
+        i = _first( self.newlines, pos )
+        return len(self.text) if i is None else self.newlines[i]
+
+class PlumedTokenizer(Lexer):
+    """
+       A lexer for PLUMED input files that gives the same tokens as PlumedLexer in a time that grows linearly with the length of the input
+
+       PlumedLexer tries every one of its regular expressions at each position in the input.  Some of these expressions search to
+       the end of the line or the end of the input and backtrack so lexing long lines or inputs with unbalanced braces can be very
+       slow.  This lexer applies the same rules in the same order.  The work that is done for each rule is proportional to the
+       length of the runs of space and non-space characters at the current position and the searches are binary searches
+       in lists of positions that are found once for the whole input (see _TextIndex).  Adjacent Text tokens are merged.  Tokens of
+       the other types are not merged as PlumedFormatter treats each of them as a separate blank line, keyword, label or marker for
+       a shortcut.  PlumedLexer is the reference implementation for this lexer.
+    """
+    name = 'plumed'
+    aliases = ['plumed']
+    filenames = ['*.plmd']
+
+    def get_tokens_unprocessed( self, text ) :
+        index, pos, incontinuation = _TextIndex( text ), 0, False
+        merged = None
+        while pos<len(text) :
+            result = None
+            if not incontinuation : result = self._root( index, pos )
+            if result is None : result = self._defaults( index, pos )
+            if result is None and not incontinuation : result = self._rootEnd( index, pos )
+            if result is None and incontinuation : result = self._continuation( index, pos )
+            if result is None :
+               # Nothing matches so output an error for this character
+               tokens, end, state = [ (pos, Error, text[pos]) ], pos + 1, None
+            else : tokens, end, state = result
+            if state is not None : incontinuation = state
+            pos = end
+            for token in tokens :
+                if len(token[2])==0 : continue
+                if merged is not None and merged[1] is Text and token[1] is Text : merged = ( merged[0], Text, merged[2] + token[2] )
+                else :
+                   if merged is not None : yield merged
+                   merged = token
+        if merged is not None : yield merged
+
+    def _root( self, index, pos ) :
+        """
+           The rules that are only used outside continuations and that are tried before the rules in _defaults
+        """
+        text = index.text
+        atline, char = pos==0 or text[pos-1]=="\n", text[pos]
+        if atline and char=="\n" : return [ (pos, Text.Whitespace, "\n") ], pos + 1, None
+        if atline and char=="#" :
+           if text.startswith( "# The command:\n", pos ) :
+              second = pos + len("# The command:\n")
+              third = index.lineEnd( second ) + 1
+              prefix = "# ensures PLUMED loads the contents of the file called "
+              if third - second>=3 and text[second]=="#" and text.startswith( prefix, third ) :
+                 end = index.lineEnd( third )
+                 if end - third>len(prefix) : return [ (pos, Comment, text[pos:second]), (second, Comment.Hashbang, text[second:third]), (third, Comment, text[third:end]) ], end, None
+           if text.startswith( "# PLUMED interprets the command:\n", pos ) :
+              second = pos + len("# PLUMED interprets the command:\n")
+              end = index.lineEnd( second )
+              if end - second>=2 and text[second]=="#" : return [ (pos, Comment, text[pos:second]), (second, Comment.Hashbang, text[second:end]) ], end, None
+        if atline :
+           start = _space.match( text, pos ).end()
+           if _endplumed.match( text, start ) : return [ (pos, Text, text[pos:start]), (start, Keyword, text[start:start+9]), (start+9, Comment, text[start+9:]) ], len(text), None
+        if char!="#" : return None
+        for directive, tokentype in _directives :
+            if text.startswith( directive, pos ) :
+               end = index.lineEnd( pos )
+               if end<len(text) : return [ (pos, tokentype, text[pos:end+1]) ], end + 1, None
+        for directive in ["#HIDDEN", "#ENDHIDDEN"] :
+            if text.startswith( directive, pos ) :
+               start = pos + len(directive)
+               newline = text.rfind( "\n", start, _space.match( text, start ).end() )
+               if newline>=0 : return [ (pos, Comment.Special, text[pos:newline+1]) ], newline + 1, None
+        vim = _vim.match( text, pos )
+        if vim : return [ (pos, Literal, vim.group()) ], vim.end(), None
+        return None
+
+    def _defaults( self, index, pos ) :
+        """
+           The rules that are used both inside and outside continuations
+        """
+        text = index.text
+        char = text[pos]
+        if char.isspace() :
+           # Space that runs to the end of a line
+           end = _space.match( text, pos ).end()
+           if end<len(text) : end = text.rfind( "\n", pos + 1, end )
+           if end>pos : return [ (pos, Text, text[pos:end]) ], end, None
+           return None
+        if char=="#" :
+           end = index.lineEnd( pos )
+           return [ (pos, Comment, text[pos:end]) ], end, None
+        if text.startswith( "__FILL__=", pos ) :
+           value = _nonspaceword.match( text, pos + 9 )
+           if value : return [ (pos, Literal, "__FILL__"), (pos+8, Text, "="), (pos+9, Generic, value.group()) ], value.end(), None
+        word = _word.match( text, pos )
+        equals = word.end() if word and word.end()<len(text) and text[word.end()]=="=" else None
+        if equals is not None and text.startswith( "__FILL__", equals + 1 ) : return [ (pos, Name.Attribute, text[pos:equals]), (equals, Text, "="), (equals+1, Literal, "__FILL__") ], equals + 9, None
+        if text.startswith( "__FILL__", pos ) : return [ (pos, Literal, "__FILL__") ], pos + 8, None
+        if _label.match( text, pos ) :
+           value = _nonspaceword.match( text, pos + 6 )
+           if value : return [ (pos, Name.Attribute, text[pos:pos+5]), (pos+5, Text, "="), (pos+6, String.Double, value.group()) ], value.end(), None
+        if equals is None : return None
+        start = equals + 1
+        attribute = [ (pos, Name.Attribute, text[pos:equals]), (equals, Text, "=") ]
+        if text.startswith( "@", start ) :
+           replica = self._replica( index, pos, equals, attribute )
+           if replica is not None : return replica
+        if text.startswith( "{@", start ) :
+           # Replica syntax with braces around the whole value
+           run = _nonspace.match( text, start + 1 ).end()
+           colon = text.rfind( ":{", start + 3, run )
+           while colon>=0 :
+               close = _first( index.doublecloses, colon + 2 )
+               if close is not None :
+                  close = index.doublecloses[close]
+                  return [ (pos, Name.Attribute, text[pos:equals]), (equals, Text, "={"), (start+1, Name.Constant, text[start+1:colon+1]), (colon+1, Generic, text[colon+1:close+1]), (close+1, Text, "}") ], close + 2, None
+               colon = text.rfind( ":{", start + 3, colon + 1 )
+        if text.startswith( "@", start ) :
+           replica = self._replicaValue( index, equals, attribute )
+           if replica is not None : return replica
+        if text.startswith( "{", start ) :
+           close = _first( index.closes, start + 1 )
+           if close is not None :
+              close = index.closes[close]
+              return attribute + [ (start, Generic, text[start:close+1]) ], close + 1, None
+        run = _nonspace.match( text, start ).end()
+        if run==start : return None
+        comment = text.rfind( "#", start + 1, run )
+        if comment>=0 :
+           end = index.lineEnd( comment )
+           return attribute + [ (start, Generic, text[start:comment]), (comment, Comment, text[comment:end]) ], end, None
+        end = _space.match( text, run ).end()
+        return attribute + [ (start, Generic, text[start:run]), (run, Text, text[run:end]) ], end, None
+
+    def _replica( self, index, pos, equals, attribute ) :
+        """
+           The rules for the special replica syntax where the values are given in a list in braces or as __FILL__
+        """
+        text, start = index.text, equals + 1
+        run = _nonspace.match( text, start ).end()
+        colon = text.rfind( ":__FILL__", start + 2, run )
+        if colon>=0 : return attribute + [ (start, Name.Constant, text[start:colon+1]), (colon+1, Literal, "__FILL__") ], colon + 9, None
+        return None
+
+    def _replicaValue( self, index, equals, attribute ) :
+        """
+           The rules for the special replica syntax with or without braces around the values
+        """
+        text, start = index.text, equals + 1
+        run = _nonspace.match( text, start ).end()
+        # The values for the replicas are in nested braces
+        colon = text.rfind( ":{", start + 2, run )
+        while colon>=0 :
+            inner = _space.match( text, colon + 2 ).end()
+            if text.startswith( "{", inner ) :
+               close = _first( index.pairs, inner + 1 )
+               if close is not None :
+                  end = index.pairends[close]
+                  return attribute + [ (start, Name.Constant, text[start:colon+1]), (colon+1, Generic, text[colon+1:end]) ], end, None
+            colon = text.rfind( ":{", start + 2, colon + 1 )
+        # The values for the replicas are in braces
+        colon = text.rfind( ":{", start + 2, run )
+        while colon>=0 :
+            close = _first( index.closes, colon + 2 )
+            if close is not None :
+               close = index.closes[close]
+               return attribute + [ (start, Name.Constant, text[start:colon+1]), (colon+1, Generic, text[colon+1:close+1]) ], close + 1, None
+            colon = text.rfind( ":{", start + 2, colon + 1 )
+        # There are no braces around the values
+        value = _nonspaceword.match( text, start )
+        if value is None : return None
+        colon = text.rfind( ":", start + 2, value.end() - 1 )
+        if colon>=0 : return attribute + [ (start, Name.Constant, text[start:colon+1]), (colon+1, Generic, text[colon+1:value.end()]) ], value.end(), None
+        return None
+
+    def _rootEnd( self, index, pos ) :
+        """
+           The rules that are only used outside continuations and that are tried after the rules in _defaults
+        """
+        text = index.text
+        char = text[pos]
+        if char!="\n" :
+           end = index.lineEnd( pos )
+           # Find label: __FILL__ using the last colon on the line that is followed by __FILL__
+           colon = _last( index.fills, pos + 1, end - 1 )
+           if colon is not None :
+              fill, colon = index.fillstarts[colon], index.fills[colon]
+              return [ (pos, String, text[pos:colon]), (colon, Text, text[colon:fill]), (fill, Literal, "__FILL__") ], fill + 8, None
+           # Find label: ACTION using the first colon that is followed by the name of an action before any # or ^
+           if char not in "#^" :
+              stop = _first( index.stops, pos )
+              stop = len(text) if stop is None else index.stops[stop]
+              colon = _first( index.labels, pos + 1 )
+              if colon is not None and index.labels[colon]<stop :
+                 (action, end), colon = index.labelgroups[colon], index.labels[colon]
+                 return [ (pos, String, text[pos:colon]), (colon, Text, text[colon:action]), (action, Keyword, text[action:end]) ], end, None
+           # Find label: ... ACTION using the last colon on the line
+           colon = _last( index.continuations, pos + 1, end - 1 )
+           if colon is not None :
+              (action, end), colon = index.continuationgroups[colon], index.continuations[colon]
+              return [ (pos, String, text[pos:colon]), (colon, Text, text[colon:action]), (action, Keyword, text[action:end]) ], end, True
+        if text.startswith( "...", pos ) : return [ (pos, Text, "...") ], pos + 3, True
+        if pos==0 or text[pos-1]=="\n" :
+           start = _space.match( text, pos ).end()
+           word = _word.match( text, start )
+           if word : return [ (pos, Keyword, text[pos:word.end()]) ], word.end(), None
+        word = _word.match( text, pos )
+        if word : return [ (pos, Name.Attribute, word.group()) ], word.end(), None
+        if char.isspace() :
+           end = _space.match( text, pos ).end()
+           return [ (pos, Text, text[pos:end]) ], end, None
+        return None
+
+    def _continuation( self, index, pos ) :
+        """
+           The rules that are only used inside continuations and that are tried after the rules in _defaults
+        """
+        text = index.text
+        word = _word.match( text, pos )
+        if word : return [ (pos, Name.Attribute, word.group()) ], word.end(), None
+        if text[pos].isspace() :
+           end = _space.match( text, pos ).end()
+           return [ (pos, Text, text[pos:end]) ], end, None
+        if text.startswith( "...", pos ) :
+           end = index.lineEnd( pos )
+           if end>pos + 3 : return [ (pos, Text, text[pos:end]) ], end, False
+           return [ (pos, Text, "...") ], pos + 3, False
+        return None
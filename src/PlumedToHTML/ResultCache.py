@@ -0,0 +1,192 @@
+import os
+import re
+import glob
+import zlib
+import pickle
+import shutil
+import hashlib
+import functools
+import tempfile
+import threading
+import subprocess
+
+class ResultCache :
+    """
+       An on-disk cache for the results of test_plumed
+
+       The results are stored in files whose names are hashes of everything that can change the result of the test.  That is the
+       contents of the input file, the number of atoms and replicas, the contents of any files that are read by the input and the
+       identity of the plumed executible (path, output of plumed info --version and modification time).  For each test the return code,
+       the raw stdout and stderr and the json files containing the shortcuts and value dictionaries are stored.  When there is a hit
+       test_plumed recreates all the files that would have been output by running plumed.  The least recently used results are removed
+       when the total size of the cache exceeds max_size.  The size of the cache and the number of results are kept up to date as results 
+       are stored so the directory is only scanned when the cache is opened and when the size exceeds max_size.
+
+       Keyword arguments:
+       directory -- The directory in which to store the results
+       max_size -- The maximum size of the cache in bytes
+    """
+    def __init__( self, directory, max_size=256*1024*1024 ) :
+        self.directory = directory
+        self.max_size = max_size
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        self._lock = threading.Lock()
+        os.makedirs( directory, exist_ok=True )
+        # The total size of the stored results and the number of results
+        self.size, self.count = 0, 0
+        self._scan()
+
+    def _scan( self ) :
+        """
+           Get the modification time, size and name of all the stored results and update the size and number of results
+        """
+        entries = []
+        for path in glob.glob( os.path.join( self.directory, "*.pkl" ) ) :
+            try :
+               st = os.stat( path )
+               entries.append( (st.st_mtime_ns, st.st_size, path) )
+            except OSError : continue
+        with self._lock : self.size, self.count = sum( e[1] for e in entries ), len(entries)
+        return entries
+
+    def executible_identity( self, executible ) :
+        """
+           Get a string that identifies a plumed executible.  plumed info --version is only run once for each executible
+        """
+        return executibleIdentity( executible )
+
+    def key( self, executible, filename, natoms, nreplicas, printjson, rundir=None ) :
+        """
+           Get the key for the result of running test_plumed on an input file
+
+           Keyword arguments:
+           executible -- A string that contains the command for running plumed
+           filename -- The name of the plumed input file
+           natoms -- The number of atoms that plumed driver is run with
+           nreplicas -- The number of replicas that plumed driver is run with
+           printjson -- Whether or not the json files with the shortcuts and value dictionaries are output
+           rundir -- The directory that plumed is run in.  By default this is the directory that contains filename
+        """
+        run_folder = os.path.dirname( filename ) if rundir is None else rundir
+        sha = hashlib.sha256()
+        for item in [ self.executible_identity( executible ), str(natoms), str(nreplicas), str(printjson) ] :
+            sha.update( item.encode() + b"\0" )
+        with open( filename, "rb" ) as f : sha.update( f.read() + b"\0" )
+        for name, content in _readFiles( run_folder, filename, int(nreplicas), set() ) :
+            sha.update( name.encode() + b"\0" + content + b"\0" )
+        return sha.hexdigest()
+
+    def _path( self, key ) :
+        return os.path.join( self.directory, key + ".pkl" )
+
+    def get( self, key ) :
+        """
+           Get the stored result for key or None if there is no result for this key
+        """
+        try :
+           with open( self._path(key), "rb" ) as f : result = pickle.loads( zlib.decompress( f.read() ) )
+           # Update the modification time as this is used to find the least recently used results
+           os.utime( self._path(key) )
+        except (OSError, EOFError, ValueError, zlib.error, pickle.UnpicklingError) :
+           with self._lock : self.misses = self.misses + 1
+           return None
+        with self._lock : self.hits = self.hits + 1
+        return result
+
+    def put( self, key, result ) :
+        """
+           Store the result for key
+
+           Keyword arguments:
+           key -- The key that was returned by the key method
+           result -- A dictionary containing the returncode, the stdout, the stderr and the contents of the json files
+        """
+        # Write to a tempory file and rename so other processes never read a partial result
+        fd, tmpname = tempfile.mkstemp( dir=self.directory, suffix=".tmp" )
+        with os.fdopen( fd, "wb" ) as f : f.write( zlib.compress( pickle.dumps( result, protocol=pickle.HIGHEST_PROTOCOL ) ) )
+        size = os.path.getsize( tmpname )
+        # A result that is already stored is replaced so its size is no longer part of the size of the cache
+        try : oldsize = os.path.getsize( self._path(key) )
+        except OSError : oldsize = None
+        os.replace( tmpname, self._path(key) )
+        with self._lock :
+             if oldsize is None : self.size, self.count = self.size + size, self.count + 1
+             else : self.size = self.size - oldsize + size
+             full = self.size>self.max_size
+        if full : self.evict()
+
+    def evict( self ) :
+        """
+           Remove the least recently used results until the size of the cache is less than max_size
+        """
+        # The directory is scanned as other processes may have stored results in it
+        entries = self._scan()
+        for mtime, size, path in sorted( entries ) :
+            if self.size<=self.max_size : break
+            try : os.remove( path )
+            except FileNotFoundError : pass
+            with self._lock : self.size, self.count, self.evictions = self.size - size, self.count - 1, self.evictions + 1
+
+    def stats( self ) :
+        """
+           Get a dictionary that contains the number of hits, misses and evictions and the number of entries and bytes in the cache
+        """
+        with self._lock :
+             return { "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": self.count, "size": self.size }
+
+    def clear( self ) :
+        """
+           Remove all the stored results
+        """
+        for path in glob.glob( os.path.join( self.directory, "*.pkl" ) ) :
+            try : os.remove( path )
+            except FileNotFoundError : pass
+        with self._lock : self.size, self.count = 0, 0
+
+def executibleIdentity( executible ) :
+    """
+       Get a string that identifies a plumed executible from its path, the output of plumed info --version and its modification time
+
+       plumed info --version is only run again if the executible is modified (e.g. because PLUMED is reinstalled)
+
+       Keyword arguments:
+       executible -- A string that contains the command for running plumed
+    """
+    exepath = shutil.which( executible ) or executible
+    try : exestamp = os.stat( exepath ).st_mtime_ns
+    except OSError : exestamp = None
+    return _versionIdentity( executible, exepath, exestamp )
+
+@functools.lru_cache( maxsize=None )
+def _versionIdentity( executible, exepath, exestamp ) :
+    plumed_info = subprocess.run( [executible, 'info', '--version'], capture_output=True, text=True )
+    return exepath + "\n" + plumed_info.stdout.strip() + "\n" + str(exestamp)
+
+def _readFiles( run_folder, filename, nreplicas, seen ) :
+    """
+       Find the contents of all the files that are read in by a plumed input file
+
+       All the values of keywords in the input that are the names of files are found.  The files that are read by the inputs in files
+       that are passed using FILE (e.g. INCLUDE FILE=name) are also found.  When there are replicas the files with names like name.0.ext are also found.
+
+       Keyword arguments:
+       run_folder -- The directory that plumed is run in
+       filename -- The name of the plumed input file
+       nreplicas -- The number of replicas
+       seen -- A set containing the names of files that have already been read
+    """
+    with open( filename, "rb" ) as f : content = f.read().decode( errors="replace" )
+    files = []
+    for keyword, value in re.findall( r"(\w+)=(\S+)", content ) :
+        for name in value.split(",") :
+            candidates = [ name ]
+            splitname = name.rsplit(".",1)
+            if nreplicas>1 and len(splitname)==2 : candidates += [ splitname[0] + "." + str(i) + "." + splitname[1] for i in range(nreplicas) ]
+            for candidate in candidates :
+                path = os.path.join( run_folder, candidate )
+                if path in seen or not os.path.isfile( path ) : continue
+                seen.add( path )
+                with open( path, "rb" ) as f : files.append( (candidate, f.read()) )
+                # Included files can read other files
+                if keyword.upper()=="FILE" : files = files + _readFiles( run_folder, path, nreplicas, seen )
+    return files
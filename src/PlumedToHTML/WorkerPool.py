@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import queue
+import select
+import struct
+import pickle
+import shutil
+import tempfile
+import subprocess
+from .PlumedToHTML import SubprocessBackend, _OutputCapture
+
+def _sendMessage( stream, message ) :
+    """
+       Send an object to a worker or back from a worker.  The pickled object is sent after its length
+    """
+    data = pickle.dumps( message )
+    stream.write( struct.pack( "!Q", len(data) ) + data )
+    stream.flush()
+
+def _readMessage( stream ) :
+    """
+       Read an object that was sent with _sendMessage.  None is returned if the stream is closed
+    """
+    header = stream.read( 8 )
+    if len(header)<8 : return None
+    size = struct.unpack( "!Q", header )[0]
+    data = stream.read( size )
+    if len(data)<size : return None
+    return pickle.loads( data )
+
+def _worker_main() :
+    """
+       The main loop of a process in a WorkerPool
+
+       The worker reads the function that creates its backend and then jobs from stdin.  For each job it sends back the
+       return code, the stdout and stderr of the command, the time it took to run and the exception that was raised by the backend
+       if the command could not be run.  The worker stops when stdin is closed.
+    """
+    jobs, results = sys.stdin.buffer, os.fdopen( os.dup(1), "wb" )
+    # Anything that is written to stdout must not get mixed up with the results
+    devnull = os.open( os.devnull, os.O_WRONLY )
+    os.dup2( devnull, 1 )
+    os.close( devnull )
+    # Each worker has its own scratch directory for temporary files
+    scratch = tempfile.mkdtemp( prefix="plumedworker" )
+    os.environ["TMPDIR"], tempfile.tempdir = scratch, scratch
+    os.chdir( scratch )
+    try :
+       backend = _readMessage( jobs )()
+       # The pool stops a worker whose command takes too long so a backend that cannot enforce the timeout itself does not have to
+       backend.timeout_enforced = True
+       while True :
+           job = _readMessage( jobs )
+           if job is None : break
+           cmd, cwd, cmdTimeout = job
+           captures = [ _OutputCapture( None, None, keep=True ), _OutputCapture( None, None, keep=True ) ]
+           start, error = time.perf_counter(), None
+           # Errors such as a missing executible are sent back so they are raised by WorkerPool.run in the same way as they are by the backend
+           try : returnCode = backend.run( cmd, captures, cmdTimeout, cwd )
+           except Exception as e : returnCode, error = -1, e
+           elapsed = time.perf_counter() - start
+           for capture in captures : capture.close()
+           try : 
+              _sendMessage( results, ( returnCode, b"".join( captures[0].chunks ), b"".join( captures[1].chunks ), elapsed, error ) )
+           except ( pickle.PicklingError, TypeError, AttributeError ) :
+              _sendMessage( results, ( returnCode, b"".join( captures[0].chunks ), b"".join( captures[1].chunks ), elapsed, RuntimeError( repr(error) ) ) )
+    finally :
+       shutil.rmtree( scratch, ignore_errors=True )
+
+class WorkerPool :
+    """
+       A pool of long-lived python processes that run the plumed commands for test_plumed and get_mermaid
+
+       Each worker has its own scratch directory and environment and creates its backend once when it starts.  Jobs are sent 
+       to the workers when run is called so the pool can be passed to test_plumed and get_mermaid as a backend.  run waits 
+       until a worker is free so no more than nworkers commands are run at the same time.  If a worker does not finish a job
+       within the timeout for the job or if it crashes the worker is replaced with a new one and the return code is -1.  Exceptions that
+       are raised by the backend in a worker (e.g. because the executible does not exist) are raised again by run.
+
+       Keyword arguments:
+       nworkers -- The number of worker processes.  By default there is one worker per cpu
+       backend -- A function or class that is called in each worker to create the backend that runs the commands (e.g. PlumedModuleBackend)
+       env -- A dictionary of environment variables to set in the workers
+       grace -- The number of seconds that a worker is given on top of the timeout for a job before it is stopped
+       timer -- A PhaseTimer.  The time that the workers spend running the commands is added to the plumed phase and the time that run 
+                waits for a free worker is added to the queue phase
+    """
+    def __init__( self, nworkers=None, backend=SubprocessBackend, env=None, grace=10, timer=None ) :
+        if nworkers is None : nworkers = os.cpu_count() or 1
+        if nworkers<1 : raise ValueError("number of workers must be at least one")
+        self.nworkers, self.backend, self.grace, self.timer = nworkers, backend, grace, timer
+        self.env = dict( os.environ, **(env or {}) )
+        self.respawns, self._closed = 0, False
+        self._idle = queue.Queue()
+        for n in range(nworkers) : self._idle.put( self._startWorker() )
+
+    def _startWorker( self ) :
+        # The worker imports this module from the package that was imported here
+        path = os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) )
+        code = "import sys, importlib; sys.path.insert(0, " + repr(path) + "); importlib.import_module(" + repr(__name__) + ")._worker_main()"
+        worker = subprocess.Popen( [sys.executable, "-c", code], stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=self.env )
+        _sendMessage( worker.stdin, self.backend )
+        return worker
+
+    def _stopWorker( self, worker ) :
+        worker.kill()
+        worker.wait()
+        worker.stdin.close()
+        worker.stdout.close()
+
+    def run( self, cmd, captures, cmdTimeout=None, cwd=None ) :
+        """
+           Run a plumed command on one of the workers and return its return code (see SubprocessBackend.run)
+        """
+        if self._closed : raise RuntimeError("worker pool has been closed")
+        start = time.perf_counter()
+        worker = self._idle.get()
+        sent = time.perf_counter()
+        try :
+           try :
+              _sendMessage( worker.stdin, ( cmd, os.path.abspath( cwd if cwd is not None else "." ), cmdTimeout ) )
+              timeout = None if cmdTimeout is None else cmdTimeout + self.grace
+              ready = select.select( [worker.stdout], [], [], timeout )[0]
+              result = _readMessage( worker.stdout ) if ready else None
+           except BrokenPipeError :
+              result = None
+           if result is None :
+              # The worker took too long or crashed so it is replaced 
+              self._stopWorker( worker )
+              worker, self.respawns = self._startWorker(), self.respawns + 1
+              result = ( -1, b"", b"PlumedToHTML: the worker that was running this command timed out or crashed\n", time.perf_counter() - sent, None )
+        finally :
+           self._idle.put( worker )
+        if self.timer is not None :
+           self.timer.add( "queue", sent - start )
+           self.timer.add( "plumed", result[3] )
+        if result[4] is not None : raise result[4]
+        if captures is not None :
+           captures[0].write( result[1] )
+           captures[1].write( result[2] )
+        return result[0]
+
+    def close( self ) :
+        """
+           Stop all the workers once the jobs that are running have finished
+        """
+        if self._closed : return
+        self._closed = True
+        for n in range(self.nworkers) : 
+            worker = self._idle.get()
+            worker.stdin.close()
+            worker.wait()
+            worker.stdout.close()
+
+    def __enter__( self ) :
+        return self
+
+    def __exit__( self, *args ) :
+        self.close()
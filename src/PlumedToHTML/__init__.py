@@ -1 +1,6 @@
-from .PlumedToHTML import test_plumed, test_and_get_html, get_html, get_html_header, compare_to_reference, get_mermaid, processMarkdown, processMarkdownString, get_javascript, get_css, getPlumedSyntax, get_cltoolarg_html, get_cltoolfile_html
+from .PlumedToHTML import test_plumed, test_and_get_html, get_html, get_html_header, compare_to_reference, get_mermaid, processMarkdown, processMarkdownString, get_javascript, get_css, write_assets, getPlumedSyntax, get_cltoolarg_html, get_cltoolfile_html, get_tooltip_table, get_modal_table, Renderer, PhaseTimer, SubprocessBackend
+from .ResultCache import ResultCache
+from .BuildManifest import BuildManifest
+from .PlumedBackend import PlumedModuleBackend
+from .WorkerPool import WorkerPool
+from .AsyncPlumedToHTML import ProcessSlots, async_test_plumed, async_get_mermaid, async_process_markdown_string
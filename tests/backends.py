@@ -0,0 +1,9 @@
+import PlumedToHTML
+
+class RecordingBackend(PlumedToHTML.SubprocessBackend) :
+   def __init__(self) :
+       self.commands = []
+
+   def run(self, cmd, captures, cmdTimeout=None, cwd=None) :
+       self.commands.append( cmd[1] )
+       return PlumedToHTML.SubprocessBackend.run( self, cmd, captures, cmdTimeout, cwd )
@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+import io
+import json
+import time
+import asyncio
+import PlumedToHTML
+
+class FailingGraphBackend :
+   def run(self, cmd, captures, cmdTimeout=None, cwd=None) :
+       if cmd[1]=="show_graph" : raise RuntimeError("show_graph failed")
+       # The test of the input for the graph finishes quickly and the other test is still running when the graph fails
+       if "mermaid" not in cmd[3] : time.sleep( 1 )
+       return PlumedToHTML.SubprocessBackend().run( cmd, captures, cmdTimeout, cwd )
+
+class TestPlumedToHTMLAsync(TestCase):
+   def testProcessMarkdown(self) :
+       with open("tdata/tests.json") as f : tests = json.load(f)
+       inp = "# TEST MARKDOWN \n\n"
+       for item in tests["regtests"] :
+           if "__FILL__" in item["input"] : continue
+           inp += "Some text before \n```plumed\n" + item["input"] + "\n```\n"
+       inp += "```plumed\n#MERMAID=value\nd1: DISTANCE ATOMS=1,2\nPRINT ARG=d1 FILE=colvar\n```\n"
+       # Get the output from the blocking version
+       sync_actions, sync_out = set({}), io.StringIO()
+       sync_result = PlumedToHTML.processMarkdownString( inp, "asyncsync.md", ("plumed",), ("master",), sync_actions, sync_out )
+       # And the output from the asynchronous version with only two plumed processes at a time
+       async_actions, async_out = set({}), io.StringIO()
+       async def run() :
+           slots = PlumedToHTML.ProcessSlots( 2 )
+           return await PlumedToHTML.async_process_markdown_string( inp, "asyncsync.md", ("plumed",), ("master",), async_actions, async_out, slots=slots )
+       async_result = asyncio.run( run() )
+       self.assertTrue( sync_result==async_result )
+       self.assertTrue( sync_actions==async_actions )
+       self.assertTrue( sync_out.getvalue()==async_out.getvalue() )
+
+   def testSlots(self) :
+       async def run() :
+           slots, running, maxrunning = PlumedToHTML.ProcessSlots( 4 ), [0], [0]
+           async def job( n ) :
+               async with slots.hold( n ) as taken :
+                    running[0] = running[0] + taken
+                    maxrunning[0] = max( maxrunning[0], running[0] )
+                    await asyncio.sleep( 0.01 )
+                    running[0] = running[0] - taken
+           # A job that needs more slots than there are is run on its own
+           await asyncio.gather( *[ job( n ) for n in [1, 2, 3, 1, 8, 2] ] )
+           return maxrunning[0], slots.free
+       maxrunning, free = asyncio.run( run() )
+       self.assertTrue( maxrunning<=4 )
+       self.assertTrue( free==4 )
+
+   def testMermaid(self) :
+       inpt = "d1: DISTANCE ATOMS=1,2\n rr: RESTRAINT ARG=d1 KAPPA=10 AT=1"
+       self.assertTrue( asyncio.run( PlumedToHTML.async_get_mermaid( "plumed", inpt, True ) )==PlumedToHTML.get_mermaid( "plumed", inpt, True ) )
+
+   def testCancelOnError(self) :
+       inp = "```plumed\nd1: DISTANCE ATOMS=1,2\n```\n```plumed\n#MERMAID=value\nd1: DISTANCE ATOMS=1,2\nPRINT ARG=d1 FILE=colvar\n```\n"
+       async def run() :
+           with self.assertRaises( RuntimeError ) :
+                await PlumedToHTML.async_process_markdown_string( inp, "asyncfail.md", ("plumed",), ("master",), set({}), io.StringIO(), slots=PlumedToHTML.ProcessSlots( 2 ), test_plumed_kwargs={"backend": FailingGraphBackend()} )
+           # The tests that were still running when the graph failed should have been stopped
+           return [ task for task in asyncio.all_tasks() if task is not asyncio.current_task() ]
+       self.assertTrue( asyncio.run( run() )==[] )
@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+import io
+import json
+import concurrent.futures
+import PlumedToHTML
+from backends import RecordingBackend
+
+class TestPlumedBackend(TestCase):
+   def testPluggable(self) :
+       backend = RecordingBackend()
+       inpt = "d1: DISTANCE ATOMS=1,2\n rr: RESTRAINT ARG=d1 KAPPA=10 AT=1"
+       # The backend should be used for the tests and the graphs and the output should not change
+       self.assertTrue( PlumedToHTML.test_and_get_html( inpt, "backendtest", test_plumed_kwargs={"backend": backend} )==PlumedToHTML.test_and_get_html( inpt, "backendtest" ) )
+       self.assertTrue( PlumedToHTML.get_mermaid( "plumed", inpt, True, test_plumed_kwargs={"backend": backend} )==PlumedToHTML.get_mermaid( "plumed", inpt, True ) )
+       self.assertTrue( backend.commands==["driver", "driver", "show_graph"] )
+
+   def testPlumedModule(self) :
+       try : backend = PlumedToHTML.PlumedModuleBackend()
+       except ImportError : self.skipTest("the plumed python module is not available")
+       # The in-process backend should give the same results as running plumed in a subprocess
+       with open("tdata/tests.json") as f : tests = json.load(f)
+       for item in tests["regtests"] :
+           with self.subTest(item=item):
+                name = "backend" + str(item["index"])
+                self.assertTrue( PlumedToHTML.test_and_get_html( item["input"], name, test_plumed_kwargs={"backend": backend} )==PlumedToHTML.test_and_get_html( item["input"], name ) )
+       # Other threads cannot use the backend as it changes the file descriptors and working directory of the process
+       with concurrent.futures.ThreadPoolExecutor( max_workers=1 ) as pool :
+            self.assertRaises( RuntimeError, pool.submit( backend.run, ["plumed", "info", "--root"], None ).result )
+       # Commands for other executibles are run in a subprocess
+       self.assertTrue( backend.run( ["sh", "-c", "exit 3"], None )==3 )
+
+   def testWorkerPool(self) :
+       with open("tdata/tests.json") as f : tests = json.load(f)
+       inp = "".join( "```plumed\n" + item["input"] + "\n```\n" for item in tests["regtests"] if "__FILL__" not in item["input"] )
+       serial = io.StringIO()
+       PlumedToHTML.processMarkdownString( inp, "workerpool.md", ("plumed",), ("master",), set({}), serial )
+       with PlumedToHTML.WorkerPool( 2 ) as pool :
+            # The output should be the same when the tests are run by the workers
+            pooled = io.StringIO()
+            PlumedToHTML.processMarkdownString( inp, "workerpool.md", ("plumed",), ("master",), set({}), pooled, max_workers=4, test_plumed_kwargs={"backend": pool} )
+            self.assertTrue( serial.getvalue()==pooled.getvalue() )
+            # Commands that take too long fail and workers that crash are replaced
+            self.assertTrue( pool.run( ["sleep", "10"], None, 0.1 )==-1 )
+            self.assertTrue( pool.run( ["sh", "-c", "kill -9 $PPID"], None )==-1 )
+            self.assertTrue( pool.respawns==1 )
+            self.assertTrue( pool.run( ["plumed", "info", "--root"], None )==0 )
+            # Errors from the backend in the worker are raised in the same way as they are by the backend and the worker is not replaced
+            self.assertRaises( FileNotFoundError, pool.run, ["plumed_does_not_exist", "info"], None )
+            self.assertTrue( pool.respawns==1 )
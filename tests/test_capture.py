@@ -0,0 +1,53 @@
+from unittest import TestCase
+
+import os
+import gzip
+import time
+import tempfile
+import zipfile
+import PlumedToHTML
+from PlumedToHTML.PlumedToHTML import _OutputCapture
+
+class TestPlumedCapture(TestCase):
+   def outputFiles(self, name) :
+       return [ name + ext for ext in [".plumed.stdout.txt", ".plumed.stderr.txt"] ]
+
+   def testArchives(self) :
+       rundir = tempfile.TemporaryDirectory()
+       self.addCleanup( rundir.cleanup )
+       name = os.path.join( rundir.name, "capturetest.dat" )
+       with open(name, "w") as f : f.write("d1: DISTANCE ATOMS=1,2\nBROKEN ARG=d1\n")
+       # Get the output in uncompressed text files
+       reference = PlumedToHTML.test_plumed( "plumed", name, archive="none" )
+       raw = []
+       for fname in self.outputFiles( name ) :
+           with open(fname, "rb") as f : raw.append( f.read() )
+           os.remove( fname )
+       with open(name + ".plumed.stderr.md") as f : lines = f.read().splitlines()
+       self.assertTrue( len(lines[lines.index("<pre style=\"overflow:scroll;\">")+3:lines.index("</pre>")])==min(1000,len(raw[1].splitlines())) )
+       # The zip and gzip archives should contain the same output
+       self.assertTrue( PlumedToHTML.test_plumed( "plumed", name, compresslevel=9 )==reference )
+       for n, fname in enumerate(self.outputFiles( name )) :
+           with zipfile.ZipFile(fname + ".zip") as zf : self.assertTrue( zf.read(zf.namelist()[0])==raw[n] )
+           os.remove( fname + ".zip" )
+       self.assertTrue( PlumedToHTML.test_plumed( "plumed", name, archive="gzip" )==reference )
+       for n, fname in enumerate(self.outputFiles( name )) :
+           with gzip.open(fname + ".gz") as gf : self.assertTrue( gf.read()==raw[n] )
+           os.remove( fname + ".gz" )
+       # Only the first line of stderr should be in the markdown page
+       PlumedToHTML.test_plumed( "plumed", name, maxlines=1, archive="none" )
+       with open(name + ".plumed.stderr.md") as f : lines = f.read().splitlines()
+       self.assertTrue( lines[lines.index("</pre>")-1]==raw[1].decode().splitlines()[0].strip() )
+       for fname in self.outputFiles( name ) + [name + ".plumed.stderr.md"] : os.remove( fname )
+       # Nothing but the return code is output if we do not want the artifacts
+       self.assertTrue( PlumedToHTML.test_plumed( "plumed", name, artifacts=False )==reference )
+       for fname in self.outputFiles( name ) + [name + ".plumed.stderr.md"] : self.assertFalse( any( os.path.exists( fname + ext ) for ext in ["", ".zip", ".gz"] ) )
+       self.assertRaises( ValueError, PlumedToHTML.test_plumed, "plumed", name, archive="rar" )
+       os.remove( name )
+
+   def testTimeout(self) :
+       # The timeout should also stop the processes that are started by the command as they keep the pipes open
+       captures = [ _OutputCapture( None, None, keep=True ), _OutputCapture( None, None, keep=True ) ]
+       start = time.perf_counter()
+       self.assertTrue( PlumedToHTML.SubprocessBackend().run( ["sh", "-c", "sleep 10 & sleep 10"], captures, 0.5 )==-1 )
+       self.assertTrue( time.perf_counter() - start<5 )
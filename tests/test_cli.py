@@ -0,0 +1,33 @@
+from unittest import TestCase
+
+import io
+import os
+import tempfile
+import contextlib
+from PlumedToHTML.CommandLine import main, findInputs
+
+class TestPlumedToHTMLCommandLine(TestCase):
+   def testBatch(self) :
+       with tempfile.TemporaryDirectory() as tmpdir :
+            os.makedirs( os.path.join( tmpdir, "lesson" ) )
+            with open( os.path.join( tmpdir, "lesson", "lesson.md" ), "w" ) as of :
+                 of.write("# TEST MARKDOWN \n\n```plumed\nd1: DISTANCE ATOMS=1,2\nPRINT ARG=d1 FILE=colvar\n```\nSome text\n```plumed\nt1: TORSION ATOMS=1,2,3,4\n```\n")
+            with open( os.path.join( tmpdir, "input.dat" ), "w" ) as of : of.write("d1: DISTANCE ATOMS=1,2\n")
+            report = io.StringIO()
+            with contextlib.redirect_stdout( report ) : returncode = main( [tmpdir, "-j", "2", "--no-progress"] )
+            self.assertTrue( returncode==0 )
+            # Both the markdown and the input file should have been processed
+            with open( os.path.join( tmpdir, "lesson", "lesson.md" ) ) as f : self.assertTrue( f.read().count("{% raw %}")==2 )
+            with open( os.path.join( tmpdir, "input.dat.html" ) ) as f : self.assertTrue( "plumedInputContainer" in f.read() )
+            report = report.getvalue()
+            self.assertTrue( "Processed 2 inputs" in report )
+            for phase in ["plumed", "queue", "lexing", "formatting", "validation"] : self.assertTrue( "  " + phase in report )
+            # The files that were created by the first run should not be processed when the directory is processed again
+            self.assertTrue( any( f.endswith(".stderr.md") for f in os.listdir( os.path.join( tmpdir, "lesson" ) ) ) )
+            self.assertTrue( findInputs( [tmpdir] )==[ os.path.join( tmpdir, "input.dat" ), os.path.join( tmpdir, "lesson", "lesson.md" ) ] )
+            report = io.StringIO()
+            with contextlib.redirect_stdout( report ) : self.assertTrue( main( [tmpdir, "-j", "2", "--no-progress"] )==0 )
+            self.assertTrue( "Processed 2 inputs" in report.getvalue() )
+            # A broken input is reported as a failure
+            with open( os.path.join( tmpdir, "input.dat" ), "w" ) as of : of.write("d1: DISTANCE ATOMS=1,2 NOTAKEYWORD\n")
+            with contextlib.redirect_stdout( io.StringIO() ) : self.assertTrue( main( [os.path.join( tmpdir, "input.dat" ), "--no-progress"] )==1 )
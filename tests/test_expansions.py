@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+import io
+from PlumedToHTML.PlumedToHTML import resolve_expansions
+
+def chain( depth ) :
+   # A shortcut that is expanded into a shortcut that is expanded in the same way depth times
+   data = { "expansion": "c" + str(depth) + ": BIASVALUE ARG=d1\n" }
+   for level in range(depth-1, 0, -1) :
+       label = "c" + str(level+1)
+       data = { "expansion": label + ": RESTRAINT ARG=d1 AT=0.1\n", "defaults": "SLOPE=0.0", label: data }
+   return "d1: DISTANCE ATOMS=1,2\nc1: RESTRAINT ARG=d1 AT=0.1\n", { "c1": data }
+
+class TestExpansions(TestCase):
+   def testExpansion(self) :
+       inpt = "r: RESTRAINT ...\n   ARG=d1\n...\nPRINT ARG=r.bias FILE=colvar\n"
+       shortcuts = { "r": { "expansion": "r_bias: BIASVALUE ARG=d1\n", "defaults": "SLOPE=0.0" } }
+       expected = "#SHORTCUT r\n#NODEFAULT r\nr: RESTRAINT ...\n   ARG=d1\n...\n#DEFAULT r\nr: RESTRAINT ...\n   ARG=d1\nSLOPE=0.0\n...\n#ENDDEFAULT r\n"
+       expected += "#EXPANSION r\n# PLUMED interprets the command:\n# r: RESTRAINT ...\n#    ARG=d1\n# ...\n# as follows (Click the red comment above to revert to the short version of the input):\n"
+       expected += "r_bias: BIASVALUE ARG=d1\n#ENDEXPANSION r\nPRINT ARG=r.bias FILE=colvar\n"
+       self.assertTrue( resolve_expansions( inpt, shortcuts )==expected )
+       out = io.StringIO()
+       self.assertTrue( resolve_expansions( inpt, shortcuts, out=out ) is None )
+       self.assertTrue( out.getvalue()==expected )
+
+   def testDeepShortcuts(self) :
+       # Shortcuts that are nested more deeply than the recursion limit should be expanded
+       inpt, shortcuts = chain( 3000 )
+       final = resolve_expansions( inpt, shortcuts )
+       self.assertTrue( final.count("#EXPANSION ")==3000 and final.count("#ENDEXPANSION ")==3000 )
+       self.assertTrue( "c3000: BIASVALUE" in final )
+
+   def testLimits(self) :
+       inpt, shortcuts = chain( 50 )
+       # Only the first three levels are expanded and the expansion of the fourth is replaced by a comment
+       final = resolve_expansions( inpt, shortcuts, maxdepth=3 )
+       self.assertTrue( final.count("#EXPANSION ")==4 and final.count("#ENDEXPANSION ")==4 )
+       self.assertTrue( "# --- The input for c4 is not shown here as it is too large --- \n#ENDEXPANSION c4" in final )
+       self.assertTrue( resolve_expansions( inpt, shortcuts, maxdepth=0 ).count("is not shown here")==1 )
+       # The expansions stop once the input would be longer than maxsize
+       final = resolve_expansions( inpt, shortcuts, maxsize=5000 )
+       self.assertTrue( final.count("is not shown here")==1 and final.rindex( "#SHORTCUT ", 0, final.index("is not shown here") )<5000 )
+       self.assertTrue( final.count("#SHORTCUT ")==final.count("#ENDEXPANSION ") )
@@ -7,7 +7,7 @@ import subprocess
 from bs4 import BeautifulSoup
 from PlumedToHTML.PlumedLexer import PlumedLexer
 from PlumedToHTML.PlumedFormatter import PlumedFormatter
-from PlumedToHTML import compare_to_reference
+from PlumedToHTML import compare_to_reference, get_modal_table
 from PlumedToHTML import getPlumedSyntax
 
 class TestPlumedFormatter(TestCase):
@@ -43,3 +43,83 @@ class TestPlumedFormatter(TestCase):
                       switchval = val.attrs["onclick"].split("\"")[1]
                       if not soup.find("span",{"id": switchval + "_long"} ) : raise Exception("Generated html is invalid as could not find " + switchval + "_long")
                       if not soup.find("span",{"id": switchval + "_short"} ) : raise Exception("Generated html is invalid as could not find " + switchval + "_short")
+
+   def testReferences(self) :
+       keydict = getPlumedSyntax( ("plumed",) )
+       f = PlumedFormatter( keyword_dict=keydict, input_name="testref", hasload=False, broken=False, actions=set({}), valuedict=dict({}), auxinputs=[], auxinputlines=[], checkaction="" )
+       inpt = "#HIDDEN\nd1: DISTANCE ATOMS=1,2\n#ENDHIDDEN\nPRINT ARG=d1 FILE=colvar\n"
+       f.format( list(PlumedLexer().get_tokens(inpt)), StringIO() )
+       # The div that shows the value details is output by get_html
+       self.assertRaises( Exception, f.checkReferences )
+       f.addId( "div", "value_details_testref" )
+       f.checkReferences()
+       # A toggler for something that is not in the html should be found
+       f.addReference( "span", "testrefmissing" )
+       self.assertRaises( Exception, f.checkReferences )
+
+   def testKeywordIndex(self) :
+       from PlumedToHTML.PlumedFormatter import KeywordIndex
+       keydict = { "ACT": { "description": "An action", "hyperlink": "act.html", "syntax": { 
+                     "output": {}, 
+                     "ATOMS": { "description": "The atoms. More", "multiple": 1 }, 
+                     "ARG": { "description": "The arguments. More", "multiple": 0, "actionlink": "OTHER" } } },
+                   "OTHER": { "description": "Another action", "hyperlink": "other.html", "syntax": {} } }
+       index = KeywordIndex( keydict )
+       self.assertTrue( index.lookup( "ACT", "atoms" )==("ATOMS", "The atoms", "") )
+       self.assertTrue( index.lookup( "ACT", "ATOMS12" )==("ATOMS", "The atoms", "") )
+       self.assertTrue( index.lookup( "ACT", "ARG" )[2].find("other.html")>0 )
+       # Keywords that can only be used once cannot be numbered
+       self.assertTrue( index.lookup( "ACT", "ARG1" ) is None )
+       self.assertTrue( index.numberedKeywords( "ACT", "ATOMS3" )==["ATOMS"] )
+       # The indexes are reused for the same dictionary and only the most recently used ones are kept
+       from PlumedToHTML.PlumedFormatter import getKeywordIndex, _keyword_indexes, _max_keyword_indexes
+       self.assertTrue( getKeywordIndex( keydict ) is getKeywordIndex( keydict ) )
+       for i in range(2*_max_keyword_indexes) : getKeywordIndex( dict( keydict ) )
+       self.assertTrue( len(_keyword_indexes)==_max_keyword_indexes )
+       # The indexes can be used by many threads at once
+       import concurrent.futures
+       with concurrent.futures.ThreadPoolExecutor( max_workers=8 ) as pool :
+            indexes = list( pool.map( lambda d : getKeywordIndex( d ).keyword_dict is d, [ dict( keydict ) for i in range(200) ] ) )
+       self.assertTrue( all( indexes ) )
+
+   def testAuxFiles(self) :
+       from PlumedToHTML.PlumedFormatter import getAuxFileExtract
+       with open("auxtest.pdb", "w") as f : 
+            for i in range(1000) : f.write("ATOM " + str(i+1) + "\n")
+       self.addCleanup( os.remove, "auxtest.pdb" )
+       # Only the first and last lines are shown
+       extract = getAuxFileExtract( "auxtest.pdb", ["1-5", "-5"] )
+       self.assertTrue( extract=="".join( "ATOM " + str(i) + "\n" for i in range(1,6) ) + "...\n" + "".join( "ATOM " + str(i) + "\n" for i in range(996,1001) ) )
+       self.assertTrue( getAuxFileExtract( "auxtest.pdb", ["2-3"] )=="ATOM 2\nATOM 3\n" )
+       # The extract is created again if the file changes
+       with open("auxtest.pdb", "a") as f : f.write("ATOM 1001\n")
+       self.assertTrue( getAuxFileExtract( "auxtest.pdb", ["-1"] )=="ATOM 1001\n" )
+       # A range from -0 gives no lines rather than the whole file
+       self.assertTrue( getAuxFileExtract( "auxtest.pdb", ["-0"] )=="" )
+       # Every use of a file has its own modal if the modals are output with the input
+       keydict = getPlumedSyntax( ("plumed",) )
+       tokens = list(PlumedLexer().get_tokens("MOLINFO STRUCTURE=auxtest.pdb\nMOLINFO STRUCTURE=auxtest.pdb\n"))
+       f = PlumedFormatter( keyword_dict=keydict, input_name="testaux", hasload=False, broken=False, actions=set({}), valuedict=dict({}), auxinputs=["auxtest.pdb"], auxinputlines=["1-5", "-5"], checkaction="" )
+       out = StringIO()
+       f.format( tokens, out )
+       self.assertTrue( out.getvalue().count('class="plumedmodal"')==2 )
+       # Only one modal is collected for a file that is used more than once on a page and it is output outside the inputs
+       auxmodals = {}
+       for name in ["testaux1", "testaux2"] :
+           f = PlumedFormatter( keyword_dict=keydict, input_name=name, hasload=False, broken=False, actions=set({}), valuedict=dict({}), auxinputs=["auxtest.pdb"], auxinputlines=["1-5", "-5"], checkaction="", auxmodals=auxmodals )
+           out = StringIO()
+           f.format( tokens, out )
+           self.assertTrue( 'class="plumedmodal"' not in out.getvalue() )
+           self.assertTrue( out.getvalue().count('openModal("' + list(auxmodals.keys())[0] + '")')==2 )
+       self.assertTrue( len(auxmodals)==1 )
+       self.assertTrue( get_modal_table( auxmodals ).count('class="plumedmodal"')==1 )
+
+   def testCppExtract(self) :
+       from PlumedToHTML.PlumedFormatter import getAuxFileExtract
+       with open("auxtest.cpp", "w") as f : 
+            for i in range(20) : f.write("int a" + str(i) + " = " + str(i) + " < 3;\n")
+       self.addCleanup( os.remove, "auxtest.cpp" )
+       # The end of a cpp file is highlighted and escaped in the same way as the start
+       extract = getAuxFileExtract( "auxtest.cpp", ["1-2", "-2"] )
+       self.assertTrue( extract.count("&lt;")==3 and " < " not in extract and extract.endswith("</pre></div>\n") )
+       self.assertTrue( "a19" in extract and "a5" not in extract )
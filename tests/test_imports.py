@@ -0,0 +1,11 @@
+from unittest import TestCase
+
+import sys
+import subprocess
+
+class TestImports(TestCase):
+   def testLazyImports(self) :
+       # The dependencies that are only needed for validation, C++ files and testing should not be loaded when the package is imported
+       code = "import sys, PlumedToHTML; print( ' '.join( m for m in ['lxml', 'bs4', 'requests', 'asyncio', 'pygments.lexers.c_cpp', 'pygments.formatters.html'] if m in sys.modules ) )"
+       loaded = subprocess.run( [sys.executable, "-c", code], capture_output=True, text=True, check=True ).stdout.split()
+       self.assertTrue( loaded==[] )
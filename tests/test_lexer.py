@@ -5,6 +5,7 @@ import json
 from io import StringIO
 from PlumedToHTML.PlumedLexer import PlumedLexer
 from pygments.formatters import HtmlFormatter
+from pygments.token import Text
 
 class TestPlumedLexer(TestCase):
    def testSimple(self) :
@@ -27,3 +28,23 @@ class TestPlumedLexer(TestCase):
                print( item["input"] )
                print( json.dumps( data, indent=3 ) )
                self.assertTrue( output.getvalue()==item["output"] )
+
+   def testLinearLexer(self) :
+       from PlumedToHTML.PlumedTokenizer import PlumedTokenizer
+       with open("tdata/lexertests.json") as f : tests = json.load(f)
+       f = HtmlFormatter()
+       # The linear lexer should give the same tokens as the reference lexer with adjacent Text tokens merged
+       for item in tests["regtests"] :
+           with self.subTest(item=item):
+               reference = []
+               for tokentype, value in PlumedLexer().get_tokens(item["input"]) :
+                   if len(reference)>0 and reference[-1][0] is Text and tokentype is Text : reference[-1] = (Text, reference[-1][1] + value)
+                   elif len(value)>0 : reference.append( (tokentype, value) )
+               tokensource = list(PlumedTokenizer().get_tokens(item["input"]))
+               self.assertTrue( tokensource==reference )
+               output = StringIO()
+               f.format( tokensource, output )
+               self.assertTrue( output.getvalue()==item["output"] )
+       # Inputs that make the reference lexer backtrack a lot should still be tokenized and nothing should be lost
+       for inpt in [ "d1: DISTANCE " + 20000*"a " + "\n", "c1: COORDINATION " + "".join( "A" + str(i) + "=@r:{1 2 " for i in range(2000) ) + "\n" ] :
+           self.assertTrue( "".join( value for tokentype, value in PlumedTokenizer().get_tokens(inpt) )==inpt )
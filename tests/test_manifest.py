@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+import os
+import io
+import tempfile
+import PlumedToHTML
+from backends import RecordingBackend
+
+class TestPlumedBuildManifest(TestCase):
+   def build(self, manifest, inputs) :
+       markdown = "# TEST MARKDOWN \n\n" + "".join( "Some text\n```plumed\n" + inpt + "\n```\n" for inpt in inputs )
+       backend, actions, out = RecordingBackend(), set({}), io.StringIO()
+       result = PlumedToHTML.processMarkdownString( markdown, "manifesttest.md", ("plumed",), ("master",), actions, out, manifest=manifest, test_plumed_kwargs={"backend": backend} )
+       return result, actions, out.getvalue(), backend.commands
+
+   def testIncrementalBuild(self) :
+       inputs = [ "d1: DISTANCE ATOMS=1,2\nPRINT ARG=d1 FILE=colvar", "t1: TORSION ATOMS=1,2,3,4", "d2: DISTANCE ATOMS=3,4\nrr: RESTRAINT ARG=d2 AT=1 KAPPA=1" ]
+       with tempfile.TemporaryDirectory() as tmpdir :
+            path = os.path.join( tmpdir, "manifest" )
+            with PlumedToHTML.BuildManifest( path ) as manifest : first = self.build( manifest, inputs )
+            self.assertTrue( manifest.stats()=={ "hits": 0, "misses": 3, "removed": 0, "entries": 3 } )
+            # The output should be the same as the output without a manifest
+            self.assertTrue( first[:3]==self.build( None, inputs )[:3] )
+            # Nothing is run when nothing has changed
+            with PlumedToHTML.BuildManifest( path ) as manifest : second = self.build( manifest, inputs )
+            self.assertTrue( manifest.stats()["hits"]==3 and second[3]==[] )
+            self.assertTrue( first[:3]==second[:3] )
+            # Only the input that has changed is tested again
+            inputs[1] = "t1: TORSION ATOMS=5,6,7,8"
+            with PlumedToHTML.BuildManifest( path ) as manifest : third = self.build( manifest, inputs )
+            self.assertTrue( manifest.stats()=={ "hits": 2, "misses": 1, "removed": 1, "entries": 3 } and third[3]==["driver"] )
+            self.assertTrue( third[:3]==self.build( None, inputs )[:3] )
+            # Entries for inputs that have been removed are removed from the manifest
+            with PlumedToHTML.BuildManifest( path ) as manifest : self.build( manifest, inputs[:2] )
+            self.assertTrue( manifest.stats()=={ "hits": 2, "misses": 0, "removed": 1, "entries": 2 } )
+            # And so are the entries for markdown files that are no longer part of the site
+            with PlumedToHTML.BuildManifest( path ) as manifest : manifest.prune( ["othertest.md"] )
+            self.assertTrue( PlumedToHTML.BuildManifest( path ).stats()["entries"]==0 )
@@ -1,7 +1,9 @@
 from unittest import TestCase
 
 import os
+import re
 import json
+import tempfile
 import PlumedToHTML
 from bs4 import BeautifulSoup
 
@@ -59,6 +61,34 @@ class TestPlumedToHTML(TestCase):
        self.assertTrue( actions==set(["DISTANCE"]) )
 
 
+   def testParallel(self) :
+       # Put all the inputs in one markdown file
+       f = open("tdata/tests.json")
+       tests = json.load(f)
+       f.close()
+       markdown = "# TEST MARKDOWN \n\n"
+       for item in tests["regtests"] :
+           if "__FILL__" in item["input"] : continue
+           markdown += "Some text before\n```plumed\n" + item["input"] + "\n```\nSome text after\n"
+       # The output should not depend on the number of workers
+       outputs = []
+       self.addCleanup( os.remove, "testparallel.md" )
+       for nworkers in [1,4] :
+           with open("testparallel.md", "w") as of : of.write( markdown )
+           actions = set()
+           ninputs, nfail = PlumedToHTML.processMarkdown( "testparallel.md", ("plumed",), ("master",), actions, max_workers=nworkers )
+           with open("testparallel.md", "r") as f : outputs.append( (f.read(), ninputs, nfail, actions) )
+       self.assertTrue( outputs[0]==outputs[1] )
+
+   def testAtomicRewrite(self) :
+       # The markdown file should not be changed if there is an error part of the way through
+       markdown = "# TEST MARKDOWN \n\n```plumed\nd1: DISTANCE ATOMS=1,2\n```\nSome text\n```plumed\nd: DISTANCE __FILL__=1,2\n```\n"
+       with open("testatomic.md", "w") as of : of.write( markdown )
+       self.addCleanup( os.remove, "testatomic.md" )
+       self.assertRaises( RuntimeError, PlumedToHTML.processMarkdown, "testatomic.md", ("plumed",), ("master",), set() )
+       with open("testatomic.md", "r") as f : self.assertTrue( f.read()==markdown )
+       self.assertFalse( any( fname.startswith(".testatomic.md") for fname in os.listdir(".") ) )
+
    def testHeader(self) :
        #checks that the header has been installed
        #assuming that we are in /tests
@@ -80,3 +110,27 @@ class TestPlumedToHTML(TestCase):
        reference += "</script>\n"
        print( reference )
        self.assertTrue( codes==reference )
+
+   def testAssets(self) :
+       # The header should only be read once
+       self.assertTrue( PlumedToHTML.get_html_header() is PlumedToHTML.get_html_header() )
+       with tempfile.TemporaryDirectory() as directory :
+            tags = PlumedToHTML.write_assets( directory, url="/static" )
+            files = sorted( os.listdir( directory ) )
+            self.assertTrue( len(files)==2 )
+            mask = os.umask( 0o022 )
+            os.umask( mask )
+            for fname in files : self.assertTrue( os.stat( os.path.join( directory, fname ) ).st_mode & 0o777==0o666 & ~mask )
+            for fname in files :
+                self.assertTrue( re.match( r"plumedtohtml\.[0-9a-f]+\.(css|js)$", fname ) )
+                content = PlumedToHTML.get_css() if fname.endswith(".css") else PlumedToHTML.get_javascript()
+                self.assertTrue( '"/static/' + fname + '"' in tags )
+                with open( os.path.join( directory, fname ) ) as f : self.assertTrue( f.read()==content )
+            # Writing the assets again should not add any files
+            self.assertTrue( PlumedToHTML.write_assets( directory, url="/static" )==tags )
+            self.assertTrue( sorted( os.listdir( directory ) )==files )
+            # The minified files have different names and are smaller
+            minified = PlumedToHTML.write_assets( directory, url="/static", minify=True )
+            self.assertTrue( minified!=tags and len( os.listdir( directory ) )==4 )
+            for fname in os.listdir( directory ) :
+                if fname not in files : self.assertTrue( os.path.getsize( os.path.join( directory, fname ) )<len( PlumedToHTML.get_css() if fname.endswith(".css") else PlumedToHTML.get_javascript() ) )
@@ -0,0 +1,39 @@
+from unittest import TestCase
+
+import os
+import json
+import tempfile
+import concurrent.futures
+import PlumedToHTML
+
+class TestPlumedToHTMLReentrant(TestCase):
+   def testThreads(self) :
+       # Open the json file and read it in
+       with open("tdata/tests.json") as f : tests = json.load(f)
+       inputs = [ item["input"] for item in tests["regtests"] ]
+       graphs = [ ("d1: DISTANCE ATOMS=1,2\n PRINT ARG=d1 FILE=colvar", False), ("d1: DISTANCE ATOMS=1,2\n rr: RESTRAINT ARG=d1 KAPPA=10 AT=1", True) ]
+
+       # Get the reference output by doing everything one after the other
+       serial = [ PlumedToHTML.test_and_get_html( inpt, "reentrant" + str(n) ) for n, inpt in enumerate(inputs) ]
+       serial_graphs = [ PlumedToHTML.get_mermaid( "plumed", inpt, force ) for inpt, force in graphs ]
+
+       # Now do everything many times at once
+       with concurrent.futures.ThreadPoolExecutor( max_workers=8 ) as pool :
+            html = [ pool.submit( PlumedToHTML.test_and_get_html, inpt, "reentrant" + str(n) ) for n, inpt in enumerate(inputs) ]
+            mermaid = [ pool.submit( PlumedToHTML.get_mermaid, "plumed", inpt, force ) for inpt, force in 4*graphs ]
+            for n, future in enumerate(html) :
+                with self.subTest(input=inputs[n]) : self.assertTrue( future.result()==serial[n] )
+            for n, future in enumerate(mermaid) : self.assertTrue( future.result()==serial_graphs[n%len(graphs)] )
+
+       # Nothing should be left behind in the current directory
+       self.assertFalse( os.path.exists("mermaid_plumed.dat") or os.path.exists("mermaid.md") )
+       for n in range(len(inputs)) : self.assertFalse( os.path.exists("reentrant" + str(n) + ".dat.json") )
+
+   def testArtifactsNextToInput(self) :
+       # The badge links to the page with the stderr next to the input so it must be output there and not with the scratch files
+       with tempfile.TemporaryDirectory() as directory :
+            name = os.path.join( directory, "artifacts" )
+            html = PlumedToHTML.test_and_get_html( "d1: DISTANCE ATOMS=1,2\n", name )
+            self.assertTrue( 'href="' + name + '.dat.plumed.stderr"' in html )
+            self.assertTrue( os.path.exists( name + ".dat.plumed.stderr.md" ) and os.path.exists( name + ".dat.plumed.stdout.txt.zip" ) )
+            self.assertFalse( os.path.exists( name + ".dat" ) )
@@ -0,0 +1,101 @@
+from unittest import TestCase
+
+import io
+import os
+import re
+import json
+import PlumedToHTML
+
+class TestPlumedRenderer(TestCase):
+   def testSameAsFunctions(self) :
+       renderer = PlumedToHTML.Renderer( ("plumed",) )
+       # The command line tools should give the same output as the reference data
+       with open("tdata/cltooltests.json") as f : cltests = json.load(f)
+       for item in cltests["regtests"] :
+           with self.subTest(item=item):
+                out = renderer.render_cltool( item["input"], "rinp" + str(item["index"]) )
+                self.assertTrue( PlumedToHTML.compare_to_reference( out, item ) )
+       with open("tdata/clfiletests.json") as f : filetests = json.load(f)
+       for item in filetests["regtests"] :
+           with self.subTest(item=item):
+                out = renderer.render_clfile( item["input"], "rinp" + str(item["index"]) )
+                self.assertTrue( PlumedToHTML.compare_to_reference( out, item ) )
+
+   def testRenderInput(self) :
+       renderer = PlumedToHTML.Renderer( ("plumed",) )
+       lexer = renderer.plumed_lexer
+       for n in range(3) :
+           actions = set({})
+           out = renderer.render_input( "d1: DISTANCE ATOMS=1,2", "rend" + str(n), "rend" + str(n), ("master",), (False,), actions=actions )
+           self.assertTrue( actions==set({"DISTANCE"}) )
+           self.assertTrue( 'id="value_details_rend' + str(n) + '"' in out )
+       # The lexer should be reused between inputs
+       self.assertTrue( renderer.plumed_lexer is lexer )
+
+   def testStream(self) :
+       # Writing the html to a stream should give the same html as returning a string
+       with open("tdata/tests.json") as f : tests = json.load(f)
+       for item in tests["regtests"] :
+           with self.subTest(item=item):
+                name = "stream" + str(item["index"])
+                expected = PlumedToHTML.get_html( item["input"], name, name, ("master",), (False,), ("plumed",), usejson=False )
+                out = io.StringIO()
+                self.assertTrue( PlumedToHTML.get_html( item["input"], name, name, ("master",), (False,), ("plumed",), usejson=False, out=out ) is None )
+                self.assertTrue( out.getvalue()==expected )
+
+   def testLinearLexer(self) :
+       # The linear lexer should give the same html as the reference lexer
+       with open("tdata/tests.json") as f : tests = json.load(f)
+       renderer = PlumedToHTML.Renderer( ("plumed",), lexer="linear" )
+       for item in tests["regtests"] :
+           with self.subTest(item=item):
+                name = "linear" + str(item["index"])
+                expected = PlumedToHTML.get_html( item["input"], name, name, ("master",), (False,), ("plumed",), usejson=False )
+                self.assertTrue( PlumedToHTML.get_html( item["input"], name, name, ("master",), (False,), ("plumed",), usejson=False, lexer="linear" )==expected )
+                self.assertTrue( renderer.render_input( item["input"], name, name, ("master",), (False,), usejson=False )==expected )
+       with self.assertRaises(ValueError) : PlumedToHTML.Renderer( ("plumed",), lexer="fast" )
+
+   def testCompactTooltips(self) :
+       # The compact tooltips should show the same tokens as the classic tooltips and each description should be output once
+       with open("tdata/tests.json") as f : tests = json.load(f)
+       tooltips = {}
+       for item in tests["regtests"] :
+           with self.subTest(item=item):
+                name = "compact" + str(item["index"])
+                out = PlumedToHTML.get_html( item["input"], name, name, ("master",), (False,), ("plumed",), usejson=False, tooltips=tooltips )
+                self.assertFalse( '<span class="right">' in out )
+                classic = PlumedToHTML.get_html( item["input"], name, name, ("master",), (False,), ("plumed",), usejson=False )
+                self.assertTrue( out.count('class="plumedtooltip"')==classic.count('class="plumedtooltip"') )
+                for tid in re.findall( 'data-tooltip="([^"]*)"', out ) : self.assertTrue( tid in tooltips.values() )
+       table = PlumedToHTML.get_tooltip_table( tooltips )
+       self.assertTrue( table.count("<template")==len(tooltips) )
+       self.assertTrue( len(set(tooltips.values()))==len(tooltips) )
+
+   def testDelegatedHandlers(self) :
+       # The delegated handlers should replace every inline handler with data attributes that the listener on the container reads
+       with open("tdata/tests.json") as f : tests = json.load(f)
+       for item in tests["regtests"] :
+           with self.subTest(item=item):
+                name = "delegated" + str(item["index"])
+                out = PlumedToHTML.get_html( item["input"], name, name, ("master",), (False,), ("plumed",), usejson=False, validate="full", delegated=True )
+                self.assertFalse( "onclick" in out or "onmouse" in out )
+                self.assertTrue( 'data-plumed="' + name + '"' in out )
+                classic = PlumedToHTML.get_html( item["input"], name, name, ("master",), (False,), ("plumed",), usejson=False )
+                handlers = sum( out.count( attr + '="' ) for attr in ["data-toggle", "data-value", "data-modal", "data-close"] )
+                self.assertTrue( handlers==classic.count("onclick=") )
+                self.assertTrue( out.count("<b name=")==classic.count("<b name=") )
+       with open("tdata/cltooltests.json") as f : cltests = json.load(f)
+       out = PlumedToHTML.Renderer( ("plumed",) ).render_cltool( cltests["regtests"][0]["input"], "delegatedtool", delegated=True )
+       self.assertTrue( out.startswith('<div class="plumedInputContainer" data-plumed="delegatedtool">') and "onclick" not in out )
+
+   def testCLToolDispatcher(self) :
+       from PlumedToHTML.PlumedToHTML import CLToolDispatcher
+       dispatcher = CLToolDispatcher( { "driver": { "inputtype": "flags" }, "driver-float": { "inputtype": "flags" }, "pesmd": { "inputtype": "file" } } )
+       self.assertTrue( dispatcher.find( "plumed driver-float --plumed plumed.dat" )["tool"]=="driver-float" )
+       command = dispatcher.find( "mpirun -np 4 plumed --no-mpi driver --help" )
+       self.assertTrue( command["tool"]=="driver" and command["kind"]=="arg" and command["launcher"]=="mpirun -np 4" and command["nompi"] )
+       self.assertTrue( dispatcher.find( "#TOOL=pesmd\ntemperature 1\n" )["kind"]=="file" )
+       self.assertTrue( dispatcher.find( "plumed-runtime pesmd < in" )["program"]=="plumed-runtime" )
+       # Tools that are not in the dictionary and commands that do not start with plumed are not found
+       self.assertTrue( dispatcher.find( "plumed driverx" ) is None )
+       self.assertTrue( dispatcher.parse( "gmx mdrun -plumed plumed driver" ) is None )
@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+import os
+import zipfile
+import tempfile
+import PlumedToHTML
+
+class TestPlumedResultCache(TestCase):
+   def runCachedTest(self, cache, name, inpt) :
+       with open(name, "w") as f : f.write(inpt)
+       result = PlumedToHTML.test_plumed( "plumed", name, printjson=True, cache=cache )
+       outputs = {}
+       for ext in [".json", "_values.json", ".plumed.stderr.md"] :
+           with open(name + ext) as f : outputs[ext] = f.read()
+       with zipfile.ZipFile(name + ".plumed.stderr.txt.zip") as zf : outputs["stderr"] = zf.read(zf.namelist()[0])
+       with zipfile.ZipFile(name + ".plumed.stdout.txt.zip") as zf : outputs["stdout"] = zf.read(zf.namelist()[0])
+       return result, outputs
+
+   def testHitRestoresFiles(self) :
+       inpt = "d1: DISTANCE ATOMS=1,2\nrr: RESTRAINT ARG=d1 AT=1 KAPPA=1\n"
+       with tempfile.TemporaryDirectory() as cachedir, tempfile.TemporaryDirectory() as rundir :
+            cache, name = PlumedToHTML.ResultCache( cachedir ), os.path.join( rundir, "cachetest.dat" )
+            first = self.runCachedTest( cache, name, inpt )
+            self.assertTrue( cache.stats()["misses"]==1 and cache.stats()["hits"]==0 )
+            second = self.runCachedTest( cache, name, inpt )
+            self.assertTrue( cache.stats()["hits"]==1 and cache.stats()["entries"]==1 )
+            self.assertTrue( first==second )
+            # Changing an included file should change the key
+            with open( os.path.join( rundir, "cacheinclude.inc" ), "w") as f : f.write("d2: DISTANCE ATOMS=3,4\n")
+            self.runCachedTest( cache, name, inpt + "INCLUDE FILE=cacheinclude.inc\n" )
+            with open( os.path.join( rundir, "cacheinclude.inc" ), "w") as f : f.write("d2: DISTANCE ATOMS=5,6\n")
+            self.runCachedTest( cache, name, inpt + "INCLUDE FILE=cacheinclude.inc\n" )
+            self.assertTrue( cache.stats()["misses"]==3 )
+            # The size and number of results that are kept as results are stored should be the same as those found when the cache is opened
+            reopened = PlumedToHTML.ResultCache( cachedir ).stats()
+            self.assertTrue( reopened["entries"]==3 and reopened["entries"]==cache.stats()["entries"] and reopened["size"]==cache.stats()["size"] )
+
+   def testEviction(self) :
+       with tempfile.TemporaryDirectory() as cachedir, tempfile.TemporaryDirectory() as rundir :
+            cache = PlumedToHTML.ResultCache( cachedir, max_size=1 )
+            self.runCachedTest( cache, os.path.join( rundir, "cachetest.dat" ), "d1: DISTANCE ATOMS=1,2\n" )
+            self.runCachedTest( cache, os.path.join( rundir, "cachetest.dat" ), "d1: DISTANCE ATOMS=1,3\n" )
+            self.assertTrue( cache.stats()["entries"]==0 and cache.stats()["evictions"]==2 )
@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+import os
+import json
+import tempfile
+import PlumedToHTML
+from PlumedToHTML import PlumedToHTML as p2h
+
+class TestPlumedSyntaxCache(TestCase):
+   def testMemo(self) :
+       # The dictionary should only be read once for each installation
+       first = PlumedToHTML.getPlumedSyntax( ("plumed",) )
+       second = PlumedToHTML.getPlumedSyntax( ("plumed",) )
+       self.assertTrue( first is second )
+       self.assertTrue( "cltools" in first )
+
+   def testSnapshot(self) :
+       with tempfile.TemporaryDirectory() as cachedir :
+            reference = PlumedToHTML.getPlumedSyntax( ("plumed",) )
+            # Clear the in memory cache so we have to read the snapshot
+            p2h._syntax_cache.clear()
+            written = PlumedToHTML.getPlumedSyntax( ("plumed",), cachedir=cachedir )
+            snapshots = [f for f in os.listdir(cachedir) if f.endswith(".pickle")]
+            self.assertTrue( len(snapshots)==1 )
+            p2h._syntax_cache.clear()
+            fromsnapshot = PlumedToHTML.getPlumedSyntax( ("plumed",), cachedir=cachedir )
+            self.assertTrue( json.dumps(fromsnapshot, sort_keys=True)==json.dumps(reference, sort_keys=True) )
+            self.assertTrue( json.dumps(written, sort_keys=True)==json.dumps(reference, sort_keys=True) )
+
+   def testInvalidJSON(self) :
+       # A syntax.json file that is not valid json should give a clear error
+       with tempfile.TemporaryDirectory() as root :
+            os.makedirs( os.path.join( root, "json" ) )
+            with open( os.path.join( root, "json", "syntax.json" ), "w" ) as f : f.write("{ not json")
+            exe = os.path.join( root, "plumed" )
+            with open( exe, "w" ) as f : f.write("#!/bin/sh\necho " + root + "\n")
+            os.chmod( exe, 0o755 )
+            with self.assertRaises(p2h.InvalidJSONError) : PlumedToHTML.getPlumedSyntax( (exe,) )